@@ -20,6 +20,7 @@ import socketpool
 import traceback
 from time import sleep
 from json import dumps
+from struct import pack
 from adafruit_itertools import count
 
 # The Raspberry Pi data collector acts as a WIFI hotspot with
@@ -34,6 +35,15 @@ WIFI_SSID = os.getenv('WIFI_SSID')
 WIFI_PASSWORD = os.getenv('WIFI_PASSWORD')
 # CYCLE_SLEEP is in milliseconds
 CYCLE_SLEEP = float(os.getenv('CYCLE_SLEEP'))/1000.0
+# UDP_FORMAT is "json" (one datagram per sensor) or "binary" (one IMU frame datagram per sample)
+UDP_FORMAT = os.getenv('UDP_FORMAT') or "json"
+
+# Binary IMU frame, decoded by imu_logger.io.decode_imu_frame()
+#   magic, version, pad byte, record_number, x, y, z for acceleration, gravity, gyroscope,
+#   linear_acceleration and magnetometer, then rotation vector quaternion, all little endian
+IMU_FRAME_MAGIC = b'VI'
+IMU_FRAME_VERSION = 1
+IMU_FRAME_FORMAT = '<2sBxI19f'
 
 sequence_number = 1
 
@@ -43,6 +53,7 @@ print("CONNECTION_FAILED_SLEEP_TIME:", CONNECTION_FAILED_SLEEP_TIME)
 print("WIFI_SSID:", WIFI_SSID),
 print("WIFI_PASSWORD:", WIFI_PASSWORD)
 print("CYCLE_SLEEP:", CYCLE_SLEEP)
+print("UDP_FORMAT:", UDP_FORMAT)
 
 i2c = board.STEMMA_I2C()  # For using the built-in STEMMA QT connector on a microcontroller
 
@@ -87,6 +98,22 @@ while True:
         while True:
             i += 1
 
+            if UDP_FORMAT == "binary":
+                broadcast.sendto(
+                    pack(
+                        IMU_FRAME_FORMAT, IMU_FRAME_MAGIC, IMU_FRAME_VERSION, i,
+                        *bno.acceleration,
+                        *bno.gravity,
+                        *bno.gyro,
+                        *bno.linear_acceleration,
+                        *bno.magnetic,
+                        *bno.quaternion,
+                    ),
+                    (UDP_HOST,UDP_PORT)
+                )
+                sleep(CYCLE_SLEEP)
+                continue
+
             x, y, z = bno.acceleration
             broadcast.sendto(
                 bytes(dumps({
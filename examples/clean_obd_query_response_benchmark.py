@@ -0,0 +1,137 @@
+# telemetry-obd/examples/clean_obd_query_response_benchmark.py
+"""
+Micro-benchmark comparing telemetry_obd.obd_common_functions.clean_obd_query_response()
+with the implementation it replaced.
+
+Responses for a typical mix of OBD commands are decoded once by python-obd and then
+cleaned over and over by both implementations.  Outputs are checked for equality first.
+
+    python3.11 -m pip install obd pint
+    PYTHONPATH=src python3.11 examples/clean_obd_query_response_benchmark.py --repeat 20000
+"""
+from argparse import ArgumentParser
+from timeit import timeit
+import logging
+
+import obd
+from obd.protocols.protocol import Frame, Message
+from obd.protocols import ECU
+from obd.utils import BitArray
+from obd.codes import BASE_TESTS
+from obd.OBDResponse import Status
+
+from telemetry_obd.add_commands import ureg
+from telemetry_obd.obd_common_functions import (
+    OBD_ERROR_MESSAGES,
+    clean_obd_query_response,
+    compact_obd_query_response,
+    list_cleaner,
+    tuple_to_list_converter,
+)
+
+# command name, response data bytes (mode + 0x40, pid, data)
+SAMPLE_RESPONSES = [
+    ("RPM", [0x41, 0x0C, 0x1A, 0xF8]),
+    ("SPEED", [0x41, 0x0D, 0x32]),
+    ("THROTTLE_POS", [0x41, 0x11, 0x40]),
+    ("ENGINE_LOAD", [0x41, 0x04, 0x80]),
+    ("COOLANT_TEMP", [0x41, 0x05, 0x7B]),
+    ("MAF", [0x41, 0x10, 0x01, 0xF4]),
+    ("FUEL_LEVEL", [0x41, 0x2F, 0x99]),
+    ("O2_SENSORS", [0x41, 0x13, 0x33]),
+    ("FUEL_STATUS", [0x41, 0x03, 0x02, 0x00]),
+    ("STATUS", [0x41, 0x01, 0x00, 0x07, 0xE5, 0x00]),
+]
+
+def legacy_clean_obd_query_response(command_name:str, obd_response):
+    """clean_obd_query_response() before type dispatch and the precompiled error matcher."""
+    if not obd_response:
+        return None
+
+    if obd_response.is_null() or obd_response.value is None:
+        return "no response"
+
+    for message in obd_response.messages:
+        for obd_error_message, obd_error_description in OBD_ERROR_MESSAGES.items():
+            raw_message = message.raw()
+            if obd_error_message in raw_message:
+                return "no response"
+
+    if isinstance(obd_response.value, bytearray):
+        return obd_response.value.decode("utf-8")
+
+    if isinstance(obd_response.value, BitArray):
+        return list(obd_response.value)
+
+    if isinstance(obd_response.value, Status):
+        return [
+            str(obd_response.value.__dict__[base_test])
+            for base_test in BASE_TESTS
+        ]
+
+    if isinstance(obd_response.value, ureg.Quantity) or 'Quantity' in obd_response.value.__class__.__name__:
+        return str(obd_response.value)
+
+    if isinstance(obd_response.value, list):
+        return list_cleaner(command_name, obd_response.value)
+
+    if isinstance(obd_response.value, tuple):
+        return tuple_to_list_converter(obd_response.value)
+
+    return obd_response.value
+
+def get_sample_responses() -> list:
+    """Decode SAMPLE_RESPONSES with python-obd."""
+    responses = []
+    for command_name, data in SAMPLE_RESPONSES:
+        message = Message([Frame(" ".join(f"{b:02X}" for b in data))])
+        message.ecu = ECU.ENGINE
+        message.data = bytearray(data)
+        responses.append((command_name, obd.commands[command_name]([message])))
+    return responses
+
+def command_line_options()->dict:
+    parser = ArgumentParser(prog="clean_obd_query_response_benchmark", description="clean_obd_query_response() micro-benchmark")
+
+    parser.add_argument(
+        "--repeat",
+        help="Number of passes over the sample responses.  Default is 10000.",
+        default=10000,
+        type=int,
+    )
+
+    return vars(parser.parse_args())
+
+def main():
+    args = command_line_options()
+    repeat = args['repeat']
+
+    # keep logging.debug() calls cheap like they are in obd_logger
+    logging.basicConfig(level=logging.WARNING)
+
+    responses = get_sample_responses()
+
+    for command_name, obd_response in responses:
+        legacy = legacy_clean_obd_query_response(command_name, obd_response)
+        current = clean_obd_query_response(command_name, obd_response)
+        if legacy != current:
+            raise ValueError(f"{command_name}: legacy {legacy} != current {current}")
+        print(f"{command_name:<14} {str(current):<40} {compact_obd_query_response(command_name, obd_response)}")
+
+    results = {}
+    for name, function in [
+        ("legacy", legacy_clean_obd_query_response),
+        ("clean_obd_query_response", clean_obd_query_response),
+        ("compact_obd_query_response", compact_obd_query_response),
+    ]:
+        results[name] = timeit(
+            lambda: [function(command_name, obd_response) for command_name, obd_response in responses],
+            number=repeat
+        )
+
+    calls = repeat * len(responses)
+    for name, seconds in results.items():
+        print(f"{name:<28} {1e6 * seconds / calls:8.3f} microseconds per call, {results['legacy'] / seconds:6.2f}x legacy")
+
+if __name__ == "__main__":
+    main()
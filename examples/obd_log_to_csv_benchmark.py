@@ -0,0 +1,165 @@
+# telemetry-obd/examples/obd_log_to_csv_benchmark.py
+"""
+Benchmark comparing the obd_log_to_csv 'row' and 'column' conversion engines.
+
+A representative multi-hour obd_logger data file is generated: a startup section followed by
+a full cycle of engine, speed, temperature, fuel and O2 sensor commands with housekeeping
+commands mixed in, all with values formatted the way obd_logger writes them.  Both engines
+convert it to CSV.  Outputs are checked for equality first.
+
+    python3.11 -m pip install pint obd
+    PYTHONPATH=src python3.11 examples/obd_log_to_csv_benchmark.py --hours 3
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import json
+
+from obd_log_to_csv.obd_log_to_csv import cycle_through_input_files
+
+# seconds per OBD command round trip
+COMMAND_SECONDS = 0.05
+
+STARTUP_COMMANDS = ["ELM_VERSION", "ELM_VOLTAGE", "VIN", "ECU_NAME", ]
+HOUSEKEEPING_COMMANDS = ["AMBIANT_AIR_TEMP", "BAROMETRIC_PRESSURE", "FUEL_LEVEL", "CONTROL_MODULE_VOLTAGE", "STATUS", ]
+CYCLE_COMMANDS = [
+    "RPM", "SPEED", "ENGINE_LOAD", "THROTTLE_POS", "COOLANT_TEMP", "INTAKE_TEMP", "MAF",
+    "FUEL_RATE", "TIMING_ADVANCE", "SHORT_FUEL_TRIM_1", "LONG_FUEL_TRIM_1", "FUEL_STATUS",
+    "O2_SENSORS", "O2_B1S1", "ACCELERATOR_POS_D", "RELATIVE_THROTTLE_POS", "INTAKE_PRESSURE",
+]
+
+CSV_COMMANDS = [
+    "RPM", "SPEED", "ENGINE_LOAD", "THROTTLE_POS", "COOLANT_TEMP", "INTAKE_TEMP", "MAF",
+    "FUEL_RATE", "TIMING_ADVANCE", "SHORT_FUEL_TRIM_1", "LONG_FUEL_TRIM_1", "FUEL_STATUS-00",
+    "O2_SENSORS-01", "O2_B1S1", "ACCELERATOR_POS_D", "RELATIVE_THROTTLE_POS", "INTAKE_PRESSURE",
+    "AMBIANT_AIR_TEMP", "BAROMETRIC_PRESSURE", "FUEL_LEVEL",
+]
+
+def obd_response_value(command_name:str, t:float, random:Random):
+    """Value the way obd_logger writes it for command_name at t seconds into the drive."""
+    speed = max(0, int(60 + 50 * random.random() * (1 + (t % 600) / 600) - 40))
+    rpm = 700 + 25 * speed + random.randint(-50, 50)
+
+    if random.random() < 0.01:
+        return "no response"
+
+    if command_name == "RPM":
+        return f"{rpm / 4} revolutions_per_minute"
+    if command_name == "SPEED":
+        return f"{speed} kilometer_per_hour"
+    if command_name in ["ENGINE_LOAD", "THROTTLE_POS", "ACCELERATOR_POS_D", "RELATIVE_THROTTLE_POS", "FUEL_LEVEL", ]:
+        return f"{100 * random.randint(0, 255) / 255} percent"
+    if command_name in ["SHORT_FUEL_TRIM_1", "LONG_FUEL_TRIM_1", ]:
+        return f"{random.randint(-128, 127) * 100 / 128} percent"
+    if command_name in ["COOLANT_TEMP", "INTAKE_TEMP", "AMBIANT_AIR_TEMP", ]:
+        return f"{random.randint(20, 95)} degree_Celsius"
+    if command_name == "MAF":
+        return f"{random.randint(0, 65535) / 100} gram / second"
+    if command_name == "FUEL_RATE":
+        return f"{random.randint(0, 65535) / 20} liter / hour"
+    if command_name == "TIMING_ADVANCE":
+        return f"{random.randint(0, 255) / 2 - 64} degree"
+    if command_name in ["BAROMETRIC_PRESSURE", "INTAKE_PRESSURE", ]:
+        return f"{random.randint(30, 101)} kilopascal"
+    if command_name in ["CONTROL_MODULE_VOLTAGE", "ELM_VOLTAGE", ]:
+        return f"{random.randint(11000, 14500) / 1000} volt"
+    if command_name == "O2_B1S1":
+        return [f"{random.randint(0, 255) / 200} volt", f"{random.randint(-128, 127) * 100 / 128} percent"]
+    if command_name == "O2_SENSORS":
+        return [[False, False, False, False], [True, True, False, False]]
+    if command_name == "FUEL_STATUS":
+        return ["Closed loop, using oxygen sensor feedback to determine fuel mix", ""]
+    if command_name == "STATUS":
+        return ["Test Available", "Test Incomplete", "Test Available", "Test Complete"]
+    if command_name == "ELM_VERSION":
+        return "ELM327 v1.5"
+    if command_name == "VIN":
+        return "C4HJWCG5DL9999"
+    if command_name == "ECU_NAME":
+        return "ECM-EngineControl"
+
+    return "no response"
+
+def generate_obd_log(file_path:Path, hours:float, seed:int=0) -> int:
+    """Write a synthetic obd_logger data file covering hours of driving, returns the record count."""
+    random = Random(seed)
+    start = datetime(2023, 3, 24, 16, 0, 0, tzinfo=timezone.utc)
+    end = start + timedelta(hours=hours)
+    ts = start
+    record_count = 0
+
+    def command_names():
+        yield from STARTUP_COMMANDS
+        housekeeping = 0
+        while True:
+            yield from CYCLE_COMMANDS
+            yield HOUSEKEEPING_COMMANDS[housekeeping % len(HOUSEKEEPING_COMMANDS)]
+            housekeeping += 1
+
+    with open(file_path, "w", encoding='utf-8') as json_output:
+        for command_name in command_names():
+            if ts >= end:
+                break
+            iso_ts_pre = ts
+            ts += timedelta(seconds=COMMAND_SECONDS * (0.5 + random.random()))
+            t = (ts - start).total_seconds()
+            json_output.write(json.dumps({
+                'command_name': command_name,
+                'obd_response_value': obd_response_value(command_name, t, random),
+                'iso_ts_pre': datetime.isoformat(iso_ts_pre),
+                'iso_ts_post': datetime.isoformat(ts),
+            }) + "\n")
+            record_count += 1
+
+    return record_count
+
+def convert(json_input_file:Path, engine:str) -> tuple:
+    """Convert with one engine, returns (CSV output, seconds)."""
+    csv_output = StringIO(newline='')
+    start = perf_counter()
+    cycle_through_input_files([json_input_file, ], CSV_COMMANDS, True, csv_output, engine=engine)
+    return csv_output.getvalue(), perf_counter() - start
+
+def command_line_options()->dict:
+    parser = ArgumentParser(prog="obd_log_to_csv_benchmark", description="obd_log_to_csv conversion engine benchmark")
+
+    parser.add_argument(
+        "--hours",
+        help="Hours of driving in the generated OBD data file.  Default is 3.",
+        default=3.0,
+        type=float,
+    )
+
+    parser.add_argument(
+        "--seed",
+        help="Random number generator seed.  Default is 0.",
+        default=0,
+        type=int,
+    )
+
+    return vars(parser.parse_args())
+
+def main():
+    args = command_line_options()
+
+    with TemporaryDirectory() as temporary_directory:
+        json_input_file = Path(temporary_directory) / "benchmark-obd-C4HJWCG5DL9999-0000000001.json"
+        record_count = generate_obd_log(json_input_file, args['hours'], seed=args['seed'])
+        print(f"{record_count} records, {json_input_file.stat().st_size / 1e6:.1f} MB, {args['hours']} hours")
+
+        row_csv, row_seconds = convert(json_input_file, 'row')
+        column_csv, column_seconds = convert(json_input_file, 'column')
+
+    if row_csv != column_csv:
+        raise ValueError("row and column engine CSV output differ")
+
+    print(f"CSV output {len(row_csv.splitlines())} lines, identical")
+    print(f"row     {row_seconds:8.3f} seconds")
+    print(f"column  {column_seconds:8.3f} seconds, {row_seconds / column_seconds:6.2f}x row")
+
+if __name__ == "__main__":
+    main()
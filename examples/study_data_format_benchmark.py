@@ -0,0 +1,113 @@
+# telemetry-obd/examples/study_data_format_benchmark.py
+"""
+Benchmark comparing how long study data files take to load as CSV and as Parquet.
+
+A fuel study sized file (about 75 float columns plus row number, route and timestamps) is
+written in both formats, the same way telemetry_analysis.common.study_data_writer() writes them.
+Both are then read back with pandas, all columns and a single column.  DataFrames are
+checked for equality first.
+
+    python3.11 -m pip install pandas pyarrow
+    PYTHONPATH=src python3.11 examples/study_data_format_benchmark.py --rows 100000
+"""
+from argparse import ArgumentParser
+from csv import DictWriter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import pandas as pd
+
+from obd_log_to_csv.columnar import ParquetDictWriter, DATE_TIME_COLUMNS
+
+INT_COLUMNS = ['i', 'route', 'closest_gear', ]
+FLOAT_COLUMNS = [f"column_{n:02}" for n in range(75)]
+FIELDNAMES = INT_COLUMNS + FLOAT_COLUMNS + DATE_TIME_COLUMNS
+
+def generate_rows(row_count:int, seed:int=0):
+    """Rows of study data, about 1 in 10 float values missing."""
+    random = Random(seed)
+    iso_ts = datetime(2023, 3, 24, 16, 0, 0, tzinfo=timezone.utc)
+    for i in range(row_count):
+        row = {'i': i + 1, 'route': 1 + i // 10000, 'closest_gear': random.randint(0, 6), }
+        for column in FLOAT_COLUMNS:
+            row[column] = None if random.random() < 0.1 else random.uniform(-1000.0, 1000.0)
+        row['iso_ts_pre'] = iso_ts
+        iso_ts += timedelta(seconds=random.uniform(0.5, 1.5))
+        row['iso_ts_post'] = iso_ts
+        yield row
+
+def timed(function, repeat:int) -> tuple:
+    """Best of repeat runs, returns (function result, seconds)."""
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = function()
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+def command_line_options()->dict:
+    parser = ArgumentParser(prog="study_data_format_benchmark", description="CSV vs Parquet study data load benchmark")
+
+    parser.add_argument(
+        "--rows",
+        help="Rows in the generated study data file.  Default is 100000.",
+        default=100000,
+        type=int,
+    )
+
+    parser.add_argument(
+        "--repeat",
+        help="Number of times each file is read, the best time is reported.  Default is 3.",
+        default=3,
+        type=int,
+    )
+
+    return vars(parser.parse_args())
+
+def main():
+    args = command_line_options()
+
+    with TemporaryDirectory() as temporary_directory:
+        csv_file = Path(temporary_directory) / "study.csv"
+        parquet_file = Path(temporary_directory) / "study.parquet"
+
+        with open(csv_file, "w") as csv_output:
+            writer = DictWriter(csv_output, fieldnames=FIELDNAMES, escapechar="\\")
+            writer.writeheader()
+            writer.writerows(generate_rows(args['rows']))
+
+        with ParquetDictWriter(parquet_file, FIELDNAMES, int_columns=INT_COLUMNS) as writer:
+            writer.writerows(generate_rows(args['rows']))
+
+        print(f"{args['rows']} rows, {len(FIELDNAMES)} columns")
+        print(f"CSV     {csv_file.stat().st_size / 1e6:8.1f} MB")
+        print(f"Parquet {parquet_file.stat().st_size / 1e6:8.1f} MB")
+
+        results = {}
+        for name, function in [
+            ("CSV all columns", lambda: pd.read_csv(csv_file, parse_dates=DATE_TIME_COLUMNS, date_format='ISO8601')),
+            ("Parquet all columns", lambda: pd.read_parquet(parquet_file)),
+            ("CSV one column", lambda: pd.read_csv(csv_file, usecols=[FLOAT_COLUMNS[0], ])),
+            ("Parquet one column", lambda: pd.read_parquet(parquet_file, columns=[FLOAT_COLUMNS[0], ])),
+        ]:
+            results[name] = timed(function, args['repeat'])
+
+    csv_df = results["CSV all columns"][0]
+    parquet_df = results["Parquet all columns"][0]
+    for column in DATE_TIME_COLUMNS:
+        # CSV timestamps come back with a fixed +00:00 offset, Parquet ones in microseconds UTC
+        csv_df[column] = csv_df[column].dt.tz_convert('UTC')
+        parquet_df[column] = parquet_df[column].astype('datetime64[ns, UTC]')
+    pd.testing.assert_frame_equal(csv_df, parquet_df, check_exact=False)
+
+    for columns in ["all columns", "one column", ]:
+        csv_seconds = results[f"CSV {columns}"][1]
+        parquet_seconds = results[f"Parquet {columns}"][1]
+        print(f"{columns:<12} CSV {csv_seconds:7.3f} seconds, Parquet {parquet_seconds:7.3f} seconds, {csv_seconds / parquet_seconds:6.2f}x CSV")
+
+if __name__ == "__main__":
+    main()
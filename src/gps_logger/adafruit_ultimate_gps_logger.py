@@ -6,9 +6,7 @@ GPS Logger
 from argparse import ArgumentParser
 import logging
 from sys import stdout, stderr
-from os import fsync
 from datetime import datetime, timezone
-import json
 from serial import Serial
 from serial.tools.list_ports import comports
 from pathlib import Path
@@ -20,6 +18,18 @@ from tcounter.common import (
     get_next_application_counter_value,
     BASE_PATH
 )
+from tcounter.log_writer import (
+    DurableLogWriter,
+    exit_on_sigterm,
+    DEFAULT_COMMIT_RECORDS,
+    DEFAULT_COMMIT_INTERVAL,
+)
+from tcounter.binary_log import (
+    BinaryRecordEncoder,
+    json_lines_encoder,
+    BINARY_LOG_FILE_SUFFIX,
+    JSON_LOG_FILE_SUFFIX,
+)
 
 from .__init__ import __version__
 
@@ -108,21 +118,25 @@ def parsed_data_to_dict(parsed_data) -> dict:
 
     return return_value
 
-def get_log_file_handle(base_path=BASE_PATH):
-    """return a file handle opened for writing to a log file"""
-    full_path = get_output_file_name('gps', base_path=base_path)
+def get_log_file_handle(base_path=BASE_PATH, binary:bool=False):
+    """return a file handle opened for writing to a JSON lines or binary log file"""
+    file_suffix = BINARY_LOG_FILE_SUFFIX if binary else JSON_LOG_FILE_SUFFIX
+    full_path = get_output_file_name('gps', base_path=base_path, file_suffix=file_suffix)
 
     logger.info(f"log file full path: {full_path}")
 
     try:
         # open for exclusive creation, failing if the file already exists
-        log_file_handle = open(full_path, mode='x', encoding='utf-8')
+        if binary:
+            log_file_handle = open(full_path, mode='xb')
+        else:
+            log_file_handle = open(full_path, mode='x', encoding='utf-8')
 
     except FileExistsError:
         logger.error(f"get_log_file_handle(): FileExistsError: {full_path}")
         gps_counter = get_next_application_counter_value('gps')
         logger.error(f"get_log_file_handle(): Incremented 'gps' counter to {gps_counter}")
-        return get_log_file_handle(base_path=BASE_PATH)
+        return get_log_file_handle(base_path=BASE_PATH, binary=binary)
 
     return log_file_handle
 
@@ -170,6 +184,27 @@ def argument_parsing()-> dict:
         help=f"Full path to the serial device where the GPS can be found, defaults to {DEFAULT_SERIAL_DEVICE}"
     )
 
+    parser.add_argument(
+        "--commit_records",
+        default=DEFAULT_COMMIT_RECORDS,
+        type=int,
+        help=f"Maximum number of records buffered before being committed (fsync) to disk. Default is {DEFAULT_COMMIT_RECORDS}."
+    )
+
+    parser.add_argument(
+        "--commit_interval",
+        default=DEFAULT_COMMIT_INTERVAL,
+        type=float,
+        help=f"Maximum number of seconds a record waits before being committed (fsync) to disk. 0 commits every record. Default is {DEFAULT_COMMIT_INTERVAL}."
+    )
+
+    parser.add_argument(
+        "--binary",
+        default=False,
+        action='store_true',
+        help="Write compact binary (.vtsb) log files instead of JSON lines (.json) log files. Default is False."
+    )
+
     parser.add_argument(
         "--verbose",
         default=False,
@@ -205,13 +240,18 @@ def main():
     logging_level = logging.DEBUG if verbose else logging.INFO
 
     logging.basicConfig(stream=stderr, level=logging_level)
+    exit_on_sigterm()
 
     logging.debug(f"main(): argument --verbose: {verbose}")
 
     logging.info(f"main(): base path: {base_path}")
 
-    log_file_handle = get_log_file_handle(base_path=base_path)
-    logging.info(f"main(): log file name: {log_file_handle.name}")
+    commit_records = args['commit_records']
+    commit_interval = args['commit_interval']
+    logging.info(f"main(): commit records {commit_records}, commit interval {commit_interval}")
+
+    binary = args['binary']
+    logging.info(f"main(): binary: {binary}")
 
     io_handle = Serial(serial_device)
 
@@ -220,32 +260,43 @@ def main():
 
     logging.debug("main(): NMEAReader active.")
 
+    log_file_handle = DurableLogWriter(
+        get_log_file_handle(base_path=base_path, binary=binary),
+        commit_records=commit_records,
+        commit_interval=commit_interval,
+        encoder=BinaryRecordEncoder() if binary else json_lines_encoder,
+        repair_application_id='gps',
+    )
+    logging.info(f"main(): log file name: {log_file_handle.name}")
+
     iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-    for (raw_data, parsed_data) in gps_reader:
-        data_dict = parsed_data_to_dict(parsed_data)
+    try:
+        for (raw_data, parsed_data) in gps_reader:
+            data_dict = parsed_data_to_dict(parsed_data)
 
-        logging.debug(f"main(): GPS data {data_dict}")
+            logging.debug(f"main(): GPS data {data_dict}")
 
-        if data_dict['Message_Type'] != "NMEA":
-            # "Skipping UBX and RTM messages"
-            logging.debug(f"main(): skipping Message_Type {data_dict['Message_Type']}")
-            iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
-            continue
+            if data_dict['Message_Type'] != "NMEA":
+                # "Skipping UBX and RTM messages"
+                logging.debug(f"main(): skipping Message_Type {data_dict['Message_Type']}")
+                iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
+                continue
 
-        log_value = dict_to_log_format(data_dict)
+            log_value = dict_to_log_format(data_dict)
 
-        log_value['iso_ts_pre'] = iso_ts_pre
-        log_value['iso_ts_post'] = datetime.isoformat(datetime.now(tz=timezone.utc))
+            log_value['iso_ts_pre'] = iso_ts_pre
+            log_value['iso_ts_post'] = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-        logging.debug(f"main(): logging: {log_value}")
+            logging.debug(f"main(): logging: {log_value}")
 
-        if log_file_handle:
-            log_file_handle.write(json.dumps(log_value) + "\n")
-            log_file_handle.flush()
-            fsync(log_file_handle.fileno())
+            log_file_handle.write_record(log_value)
+
+            iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-        iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
+    finally:
+        # commits waiting records and removes the tail marker
+        log_file_handle.close()
 
 if __name__ == "__main__":
     main()
@@ -15,6 +15,10 @@ from tcounter.common import (
     get_next_application_counter_value,
     BASE_PATH
 )
+from tcounter.binary_log import (
+    BINARY_LOG_FILE_SUFFIX,
+    JSON_LOG_FILE_SUFFIX,
+)
 
 logger = logging.getLogger("gps_logger")
 
@@ -212,20 +216,24 @@ def gps_hardware_version(io_handle:Serial):
 
     io_handle.write(msg.serialize())
 
-def get_log_file_handle(base_path=BASE_PATH):
-    """return a file handle opened for writing to a log file"""
-    full_path = get_output_file_name('gps', base_path=base_path)
+def get_log_file_handle(base_path=BASE_PATH, binary:bool=False):
+    """return a file handle opened for writing to a JSON lines or binary log file"""
+    file_suffix = BINARY_LOG_FILE_SUFFIX if binary else JSON_LOG_FILE_SUFFIX
+    full_path = get_output_file_name('gps', base_path=base_path, file_suffix=file_suffix)
 
     logger.info(f"log file full path: {full_path}")
 
     try:
         # open for exclusive creation, failing if the file already exists
-        log_file_handle = open(full_path, mode='x', encoding='utf-8')
+        if binary:
+            log_file_handle = open(full_path, mode='xb')
+        else:
+            log_file_handle = open(full_path, mode='x', encoding='utf-8')
 
     except FileExistsError:
         logger.error(f"get_log_file_handle(): FileExistsError: {full_path}")
         gps_counter = get_next_application_counter_value('gps')
         logger.error(f"get_log_file_handle(): Incremented 'gps' counter to {gps_counter}")
-        return get_log_file_handle(base_path=BASE_PATH)
+        return get_log_file_handle(base_path=BASE_PATH, binary=binary)
 
     return log_file_handle
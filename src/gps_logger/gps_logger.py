@@ -5,9 +5,7 @@ GPS Logger
 from argparse import ArgumentParser
 import logging
 from sys import stdout, stderr
-from os import fsync
 from datetime import datetime, timezone
-import json
 
 from pyubx2 import UBXReader
 
@@ -24,6 +22,16 @@ from .usb_devices import get_serial_device_name
 from tcounter.common import (
     BASE_PATH
 )
+from tcounter.log_writer import (
+    DurableLogWriter,
+    exit_on_sigterm,
+    DEFAULT_COMMIT_RECORDS,
+    DEFAULT_COMMIT_INTERVAL,
+)
+from tcounter.binary_log import (
+    BinaryRecordEncoder,
+    json_lines_encoder,
+)
 
 DEFAULT_SERIAL_DEVICE=get_serial_device_name()
 TIMEOUT=1.0
@@ -56,6 +64,27 @@ def argument_parsing()-> dict:
         help=f"Full path to the serial device where the GPS can be found, defaults to {DEFAULT_SERIAL_DEVICE}"
     )
 
+    parser.add_argument(
+        "--commit_records",
+        default=DEFAULT_COMMIT_RECORDS,
+        type=int,
+        help=f"Maximum number of records buffered before being committed (fsync) to disk. Default is {DEFAULT_COMMIT_RECORDS}."
+    )
+
+    parser.add_argument(
+        "--commit_interval",
+        default=DEFAULT_COMMIT_INTERVAL,
+        type=float,
+        help=f"Maximum number of seconds a record waits before being committed (fsync) to disk. 0 commits every record. Default is {DEFAULT_COMMIT_INTERVAL}."
+    )
+
+    parser.add_argument(
+        "--binary",
+        default=False,
+        action='store_true',
+        help="Write compact binary (.vtsb) log files instead of JSON lines (.json) log files. Default is False."
+    )
+
     parser.add_argument(
         "--verbose",
         default=False,
@@ -89,13 +118,18 @@ def main():
     logging_level = logging.DEBUG if verbose else logging.INFO
 
     logging.basicConfig(stream=stderr, level=logging_level)
+    exit_on_sigterm()
 
     logging.debug(f"main(): argument --verbose: {verbose}")
 
     logging.info(f"main(): base path: {base_path}")
 
-    log_file_handle = get_log_file_handle(base_path=base_path)
-    logging.info(f"main(): log file name: {log_file_handle.name}")
+    commit_records = args['commit_records']
+    commit_interval = args['commit_interval']
+    logging.info(f"main(): commit records {commit_records}, commit interval {commit_interval}")
+
+    binary = args['binary']
+    logging.info(f"main(): binary: {binary}")
 
     io_handle = initialize_gps(serial_device, message_rate)
 
@@ -104,40 +138,52 @@ def main():
 
     logging.debug("main(): gps_reader active.")
 
+    log_file_handle = DurableLogWriter(
+        get_log_file_handle(base_path=base_path, binary=binary),
+        commit_records=commit_records,
+        commit_interval=commit_interval,
+        encoder=BinaryRecordEncoder() if binary else json_lines_encoder,
+        repair_application_id='gps',
+    )
+    logging.info(f"main(): log file name: {log_file_handle.name}")
+
     iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-    for (raw_data, parsed_data) in gps_reader:
-        data_dict = parsed_data_to_dict(parsed_data)
+    try:
+        for (raw_data, parsed_data) in gps_reader:
+            data_dict = parsed_data_to_dict(parsed_data)
 
-        logging.debug(f"main(): GPS data {data_dict}")
+            logging.debug(f"main(): GPS data {data_dict}")
 
-        if 'umsg_name' in data_dict and data_dict['umsg_name'] == 'MON-VER':
-            gps_software = data_dict
-            logging.info(f"main(): GPS SOFTWARE: {data_dict}")
+            if 'umsg_name' in data_dict and data_dict['umsg_name'] == 'MON-VER':
+                gps_software = data_dict
+                logging.info(f"main(): GPS SOFTWARE: {data_dict}")
 
-        if 'umsg_name' in data_dict and data_dict['umsg_name'] == 'MON-HW':
-            gps_hardware = data_dict
-            logging.info(f"main(): GPS HARDWARE: {data_dict}")
+            if 'umsg_name' in data_dict and data_dict['umsg_name'] == 'MON-HW':
+                gps_hardware = data_dict
+                logging.info(f"main(): GPS HARDWARE: {data_dict}")
 
-        if data_dict['Message_Type'] != "NMEA":
-            # "Skipping UBX and RTM messages"
-            logging.debug(f"main(): skipping Message_Type {data_dict['Message_Type']}")
-            iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
-            continue
+            if data_dict['Message_Type'] != "NMEA":
+                # "Skipping UBX and RTM messages"
+                logging.debug(f"main(): skipping Message_Type {data_dict['Message_Type']}")
+                iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
+                continue
 
-        log_value = dict_to_log_format(data_dict)
+            log_value = dict_to_log_format(data_dict)
 
-        log_value['iso_ts_pre'] = iso_ts_pre
-        log_value['iso_ts_post'] = datetime.isoformat(datetime.now(tz=timezone.utc))
+            log_value['iso_ts_pre'] = iso_ts_pre
+            log_value['iso_ts_post'] = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-        logging.debug(f"main(): logging: {log_value}")
+            logging.debug(f"main(): logging: {log_value}")
 
-        if log_file_handle:
-            log_file_handle.write(json.dumps(log_value) + "\n")
-            log_file_handle.flush()
-            fsync(log_file_handle.fileno())
+            if log_file_handle:
+                log_file_handle.write_record(log_value)
+
+            iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-        iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
+    finally:
+        # commits waiting records and removes the tail marker
+        log_file_handle.close()
 
 if __name__ == "__main__":
     main()
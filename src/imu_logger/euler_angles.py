@@ -0,0 +1,58 @@
+# telemetry-imu/imu_logger/euler_angles.py
+"""
+Deferred Euler Angles
+
+imu_logger --defer_euler_angles logs 'rotation_vector' records with only the raw quaternion
+('vector') to keep its receive loop thin.  Roll, pitch and yaw are added here afterwards,
+vectorized with NumPy over blocks of records, when log files are read by
+obd_log_to_csv.vin_data_integrator.  The results match imu_logger.quaternion_to_euler().
+"""
+from itertools import islice
+
+import numpy as np
+
+EULER_ANGLES_BLOCK_SIZE = 10000     # records converted at a time
+
+def quaternions_to_euler(vectors) -> tuple:
+    """
+    Vectorized imu_logger.quaternion_to_euler().
+    vectors is an (n, 4) array-like of quaternions direct from hardware
+    returns roll, pitch, yaw NumPy arrays in radians
+    """
+    v = np.asarray(vectors, dtype=np.float64).reshape(-1, 4)
+    v0, v1, v2, v3 = v[:, 0], v[:, 1], v[:, 2], v[:, 3]
+    v0_2, v1_2, v2_2, v3_2 = v0 * v0, v1 * v1, v2 * v2, v3 * v3
+
+    roll = np.arctan2(2 * ((v2 * v3) + (v0 * v1)), v0_2 - v1_2 - v2_2 + v3_2)
+    # rounding can take the argument just past +/-1
+    pitch = np.arcsin(np.clip(2 * ((v1 * v3) - (v0 * v2)), -1.0, 1.0))
+    yaw = np.arctan2(2 * ((v1 * v2) + (v0 * v3)), v0_2 + v1_2 - v2_2 - v3_2)
+
+    return roll, pitch, yaw
+
+def needs_euler_angles(record:dict) -> bool:
+    """True for 'rotation_vector' records logged without roll, pitch and yaw."""
+    return (
+        record.get('command_name') == 'rotation_vector' and
+        isinstance(record.get('obd_response_value'), dict) and
+        'roll' not in record['obd_response_value'] and
+        len(record['obd_response_value'].get('vector') or ()) == 4
+    )
+
+def add_deferred_euler_angles(records, block_size:int=EULER_ANGLES_BLOCK_SIZE):
+    """
+    Generator yielding records (any iterable of log records) in order, with roll, pitch and
+    yaw added to 'rotation_vector' records logged without them.  Other records pass through.
+    """
+    records = iter(records)
+    while block := list(islice(records, block_size)):
+        deferred = [record['obd_response_value'] for record in block if needs_euler_angles(record)]
+
+        if deferred:
+            roll, pitch, yaw = quaternions_to_euler([value['vector'] for value in deferred])
+            for value, value_roll, value_pitch, value_yaw in zip(deferred, roll.tolist(), pitch.tolist(), yaw.tolist()):
+                value['roll'] = value_roll
+                value['pitch'] = value_pitch
+                value['yaw'] = value_yaw
+
+        yield from block
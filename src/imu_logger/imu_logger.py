@@ -4,19 +4,30 @@ from argparse import ArgumentParser
 from math import atan2, asin
 import logging
 from sys import stdout, stderr
-from os import fsync
 from datetime import datetime, timezone
-import json
 
 from tcounter.common import (
     get_output_file_name,
     get_next_application_counter_value,
     BASE_PATH
 )
+from tcounter.log_writer import (
+    DurableLogWriter,
+    exit_on_sigterm,
+    DEFAULT_COMMIT_RECORDS,
+    DEFAULT_COMMIT_INTERVAL,
+)
+from tcounter.binary_log import (
+    BinaryRecordEncoder,
+    json_lines_encoder,
+    BINARY_LOG_FILE_SUFFIX,
+    JSON_LOG_FILE_SUFFIX,
+)
 
 from .usb_devices import get_serial_device_name
 from .io import (
     DEFAULT_LOCAL_HOST_UDP_PORT_NUMBER,
+    RECEIVE_BUFFER_SIZE,
     UDP_Reader,
     Serial_Reader,
 )
@@ -44,21 +55,36 @@ def quaternion_to_euler(v:list) -> tuple:
                 )
     return (roll, pitch, yaw)
 
-def get_log_file_handle(base_path=BASE_PATH):
-    """return a file handle opened for writing to a log file"""
-    full_path = get_output_file_name('imu', base_path=base_path)
+def add_euler_angles(record:dict) -> dict:
+    """Add roll, pitch and yaw to 'rotation_vector' records.  Returns record."""
+    if record['command_name'] == 'rotation_vector':
+        # "vector": [-0.646912, -0.262695, 0.230164, 0.677856],
+        roll, pitch, yaw = quaternion_to_euler(record['obd_response_value']['vector'])
+        record['obd_response_value']['roll'] = roll
+        record['obd_response_value']['pitch'] = pitch
+        record['obd_response_value']['yaw'] = yaw
+
+    return record
+
+def get_log_file_handle(base_path=BASE_PATH, binary:bool=False):
+    """return a file handle opened for writing to a JSON lines or binary log file"""
+    file_suffix = BINARY_LOG_FILE_SUFFIX if binary else JSON_LOG_FILE_SUFFIX
+    full_path = get_output_file_name('imu', base_path=base_path, file_suffix=file_suffix)
 
     logger.info(f"log file full path: {full_path}")
 
     # open for exclusive creation, failing if the file already exists
     try:
-        log_file_handle = open(full_path, mode='x', encoding='utf-8')
+        if binary:
+            log_file_handle = open(full_path, mode='xb')
+        else:
+            log_file_handle = open(full_path, mode='x', encoding='utf-8')
 
     except FileExistsError:
         logger.error(f"get_log_file_handle(): FileExistsError: {full_path}")
         imu_counter = get_next_application_counter_value('imu')
         logger.error(f"get_log_file_handle(): Incremented 'imu' counter to {imu_counter}")
-        return get_log_file_handle(base_path=BASE_PATH)
+        return get_log_file_handle(base_path=BASE_PATH, binary=binary)
 
     return log_file_handle
 
@@ -103,6 +129,41 @@ def argument_parsing()-> dict:
         help=f"TCP/IP UDP port number for receiving datagrams. Defaults to '{DEFAULT_LOCAL_HOST_UDP_PORT_NUMBER}'"
     )
 
+    parser.add_argument(
+        "--udp_receive_buffer_size",
+        type=int,
+        default=RECEIVE_BUFFER_SIZE,
+        help=f"Bytes asked for as the UDP socket receive buffer, limited by the kernel's net.core.rmem_max. Defaults to {RECEIVE_BUFFER_SIZE}."
+    )
+
+    parser.add_argument(
+        "--commit_records",
+        default=DEFAULT_COMMIT_RECORDS,
+        type=int,
+        help=f"Maximum number of records buffered before being committed (fsync) to disk. Default is {DEFAULT_COMMIT_RECORDS}."
+    )
+
+    parser.add_argument(
+        "--commit_interval",
+        default=DEFAULT_COMMIT_INTERVAL,
+        type=float,
+        help=f"Maximum number of seconds a record waits before being committed (fsync) to disk. 0 commits every record. Default is {DEFAULT_COMMIT_INTERVAL}."
+    )
+
+    parser.add_argument(
+        "--defer_euler_angles",
+        default=False,
+        action='store_true',
+        help="Log raw rotation vector quaternions without roll, pitch and yaw, which are added later by obd_log_to_csv.vin_data_integrator. Default is False."
+    )
+
+    parser.add_argument(
+        "--binary",
+        default=False,
+        action='store_true',
+        help="Write compact binary (.vtsb) log files instead of JSON lines (.json) log files. Default is False."
+    )
+
     parser.add_argument(
         "--verbose",
         default=False,
@@ -131,6 +192,7 @@ def main():
     logging_level = logging.DEBUG if verbose else logging.INFO
 
     logging.basicConfig(stream=stderr, level=logging_level)
+    exit_on_sigterm()
     logger.debug(f"argument --verbose: {verbose}")
 
     base_path = args['base_path']
@@ -151,37 +213,58 @@ def main():
         logger.info("WIFI enabled")
         udp_port_number = args['udp_port_number']
         logger.info("argument --udp_port_number: {udp_port_number}")
-        io_iterator = UDP_Reader(logger, local_host_udp_port_number=udp_port_number)
-
-    log_file_handle = get_log_file_handle(base_path=base_path)
+        udp_receive_buffer_size = args['udp_receive_buffer_size']
+        logger.info(f"argument --udp_receive_buffer_size: {udp_receive_buffer_size}")
+        io_iterator = UDP_Reader(
+            logger,
+            local_host_udp_port_number=udp_port_number,
+            receive_buffer_size=udp_receive_buffer_size,
+        )
+
+    commit_records = args['commit_records']
+    commit_interval = args['commit_interval']
+    logger.info(f"argument --commit_records: {commit_records}")
+    logger.info(f"argument --commit_interval: {commit_interval}")
+
+    binary = args['binary']
+    logger.info(f"argument --binary: {binary}")
+
+    defer_euler_angles = args['defer_euler_angles']
+    logger.info(f"argument --defer_euler_angles: {defer_euler_angles}")
+
+    log_file_handle = DurableLogWriter(
+        get_log_file_handle(base_path=base_path, binary=binary),
+        commit_records=commit_records,
+        commit_interval=commit_interval,
+        encoder=BinaryRecordEncoder() if binary else json_lines_encoder,
+        repair_application_id='imu',
+    )
     logger.info(f"log file name: {log_file_handle.name}")
 
     iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-    for record_count, record in enumerate(io_iterator, start=1):
-        logger.debug(f"json encoded record {record_count}: {record}")
+    try:
+        for record_count, record in enumerate(io_iterator, start=1):
+            logger.debug(f"json encoded record {record_count}: {record}")
 
-        if record:
-            # check record validity
-            # reorganize data as required
+            if record:
+                # check record validity
+                # reorganize data as required
+                if not defer_euler_angles:
+                    add_euler_angles(record)
 
-            if record['command_name'] == 'rotation_vector':
-                # "vector": [-0.646912, -0.262695, 0.230164, 0.677856],
-                roll, pitch, yaw = quaternion_to_euler(record['obd_response_value']['vector'])
-                record['obd_response_value']['roll'] = roll
-                record['obd_response_value']['pitch'] = pitch
-                record['obd_response_value']['yaw'] = yaw
+                record['iso_ts_pre'] = iso_ts_pre
+                record['iso_ts_post'] = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-            record['iso_ts_pre'] = iso_ts_pre
-            record['iso_ts_post'] = datetime.isoformat(datetime.now(tz=timezone.utc))
+                logger.debug(f"logging json record {record_count}: {record}")
 
-            logger.debug(f"logging json record {record_count}: {record}")
+                log_file_handle.write_record(record)
 
-            log_file_handle.write(json.dumps(record) + "\n")
-            log_file_handle.flush()
-            fsync(log_file_handle.fileno())
+            iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-        iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
+    finally:
+        # commits waiting records and removes the tail marker
+        log_file_handle.close()
 
 if __name__ == "__main__":
     main()
@@ -6,24 +6,77 @@ Implements server for client CircuitPython Analog to Digital Converter
 found at telemetry-imu/CircuitPython/code.py
 """
 from serial import Serial
-from time import sleep
+from time import sleep, monotonic
+from collections import deque
 import socket
+import struct
 import logging
 import json
 
 DEFAULT_LOCAL_HOST_INTERFACE_ADDRESS = "0.0.0.0"
 DEFAULT_LOCAL_HOST_UDP_PORT_NUMBER   = 50219
 BUFFER_SIZE  = 8193
+RECEIVE_BUFFER_SIZE = 4194304   # bytes asked for as the socket receive buffer, capped by net.core.rmem_max
+MAX_BATCH_SIZE = 512            # most datagrams taken from the socket per wakeup
+DROP_REPORT_INTERVAL = 60.0     # seconds between dropped record warnings
+
+# Binary IMU frame, one datagram per sample carrying all six sensors (see CircuitPython/motion/wifi_code.py)
+#   magic (2 bytes), version (unsigned byte), pad byte, record_number (unsigned 32 bit int),
+#   x, y, z (32 bit floats) for each of IMU_FRAME_SENSORS, then rotation vector quaternion (4 32 bit floats)
+# all little endian.  JSON datagrams start with '{' and never with IMU_FRAME_MAGIC.
+IMU_FRAME_MAGIC = b'VI'
+IMU_FRAME_VERSION = 1
+IMU_FRAME = struct.Struct('<2sBxI19f')
+IMU_FRAME_SENSORS = ('acceleration', 'gravity', 'gyroscope', 'linear_acceleration', 'magnetometer', )
 
 logger = logging.getLogger("imu_logger")
 
+def decode_imu_frame(message:bytes) -> list:
+    """
+    Decode a binary IMU frame into the records the JSON datagrams carry, one per sensor.
+    Raises ValueError for unknown versions and struct.error for frames of the wrong size.
+    """
+    if len(message) > 2 and message[2] != IMU_FRAME_VERSION:
+        raise ValueError(f"unsupported IMU frame version {message[2]}")
+
+    magic, version, record_number, *values = IMU_FRAME.unpack(message)
+    # 32 bit floats carry about 7 significant digits, more only adds noise to the logs
+    values = [float(f"{value:.7g}") for value in values]
+
+    records = [
+        {
+            'command_name': command_name,
+            'obd_response_value': {
+                'record_number': record_number,
+                'x': values[3 * i],
+                'y': values[3 * i + 1],
+                'z': values[3 * i + 2],
+            },
+        }
+        for i, command_name in enumerate(IMU_FRAME_SENSORS)
+    ]
+    records.append({
+        'command_name': 'rotation_vector',
+        'obd_response_value': {
+            'record_number': record_number,
+            'vector': values[15:19],
+        },
+    })
+
+    return records
+
 class UDP_Reader(object):
     """
     Listen on UDP port for IMU records.
 
-    Parse JSON encoded records and return dictionary
+    Parse JSON encoded records or binary IMU frames and return dictionaries, one per sensor
+
+    The IMU sends six JSON datagrams (one per sensor) or one binary frame per sample.  To keep up at its full rate, each
+    wakeup drains every datagram waiting in a large socket receive buffer, and records the kernel
+    or network dropped are counted from gaps in each sensor's 'record_number' sequence.
     """
     message_count = 0
+    dropped_record_count = 0
     logger = None
     trailer_connector = None
 
@@ -32,13 +85,29 @@ class UDP_Reader(object):
         logger,
         local_host_interface_address=DEFAULT_LOCAL_HOST_INTERFACE_ADDRESS,
         local_host_udp_port_number=DEFAULT_LOCAL_HOST_UDP_PORT_NUMBER,
+        receive_buffer_size=RECEIVE_BUFFER_SIZE,
     ):
         self.local_host_interface_address = local_host_interface_address
         self.local_host_udp_port_number = local_host_udp_port_number
         self.trailer_connector = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        self.trailer_connector.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer_size)
         self.trailer_connector.bind((local_host_interface_address, local_host_udp_port_number))
         self.logger = logger
         self.logger.info(f"UDP client ready on {local_host_interface_address} port {local_host_udp_port_number}")
+        self.logger.info(
+            f"UDP receive buffer {self.trailer_connector.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes"
+        )
+
+        # datagrams received but not yet decoded, as (message, ip_address_info)
+        self.pending = deque()
+        # records decoded but not yet returned
+        self.records = deque()
+
+        # per sensor (command_name) last record_number seen and number of records dropped
+        self.last_record_numbers = {}
+        self.dropped_records = {}
+        self.reported_dropped_record_count = 0
+        self.drops_reported = monotonic()
 
     def __iter__(self):
         """Start iterator."""
@@ -48,29 +117,102 @@ class UDP_Reader(object):
         """
         Get the next iterable.   Returns raw data dictionary. 
         """
-        # message is type bytes, JSON encoded
+        # message is type bytes, JSON encoded or binary IMU frame
         # ip_address_info is list [Sender IP Address:str, Sender Port Number int]
-        message, ip_address_info = self.trailer_connector.recvfrom(BUFFER_SIZE)
+        while not self.records:
+            if not self.pending:
+                self.pending.extend(self.receive_batch())
+            message, ip_address_info = self.pending.popleft()
+            self.records.extend(self.decode(message, ip_address_info))
+        return self.records.popleft()
+
+    def receive_batch(self) -> list:
+        """
+        Wait for the next datagram, then take the datagrams already waiting (up to MAX_BATCH_SIZE)
+        without waiting.  Returns list of (message, ip_address_info).
+        """
+        batch = [self.trailer_connector.recvfrom(BUFFER_SIZE)]
+        try:
+            while len(batch) < MAX_BATCH_SIZE:
+                batch.append(self.trailer_connector.recvfrom(BUFFER_SIZE, socket.MSG_DONTWAIT))
+        except BlockingIOError:
+            pass
+        return batch
+
+    def decode(self, message:bytes, ip_address_info) -> list:
+        """
+        Decode one received message, JSON encoded or binary IMU frame.
+        Returns list of raw data dictionaries, empty when the message can't be decoded.
+        """
         self.message_count += 1
 
         self.logger.debug(f"{self.message_count} address: {ip_address_info}")
         self.logger.debug(f"{self.message_count} message: {message}")
 
+        if message[:len(IMU_FRAME_MAGIC)] == IMU_FRAME_MAGIC:
+            try:
+                raw_records = decode_imu_frame(message)
+
+            except (ValueError, struct.error) as e:
+                self.logger.error(f"{self.message_count}: Corrupted IMU frame {message}\n{e}")
+                return []
+
+        else:
+            try:
+                # if weird decode errors, then use 'ignore' in: message.decode('utf-8', 'ignore')
+                # raw_record = json.loads(message.decode('utf-8'))
+                raw_record = json.loads(message)
+
+            except json.decoder.JSONDecodeError as e:
+                # improperly closed JSON record
+                self.logger.error(f"{self.message_count}: Corrupted JSON info in message {message}\n{e}")
+                return []
+
+            if not isinstance(raw_record, dict):
+                self.logger.error(f"{self.message_count}: JSON decode didn't return a dict: {message}")
+                return []
+
+            raw_records = [raw_record, ]
+
+        for raw_record in raw_records:
+            self.count_dropped_records(raw_record)
+
+        return raw_records
+
+    def count_dropped_records(self, raw_record:dict):
+        """
+        Count the records dropped before reaching this reader from gaps in each sensor's 'record_number'.
+        A record number that doesn't increase means the IMU restarted (or a datagram arrived out of order).
+        """
         try:
-            # if weird decode errors, then use 'ignore' in: message.decode('utf-8', 'ignore')
-            # raw_record = json.loads(message.decode('utf-8'))
-            raw_record = json.loads(message)
+            command_name = raw_record['command_name']
+            record_number = int(raw_record['obd_response_value']['record_number'])
+        except (KeyError, TypeError, ValueError):
+            return
 
-        except json.decoder.JSONDecodeError as e:
-            # improperly closed JSON record
-            self.logger.error(f"{self.message_count}: Corrupted JSON info in message {message}\n{e}")
-            return None
+        last_record_number = self.last_record_numbers.get(command_name)
+        self.last_record_numbers[command_name] = record_number
+
+        if last_record_number is None:
+            return
 
-        if not isinstance(raw_record, dict):
-            self.logger.error(f"{self.message_count}: JSON decode didn't return a dict: {message}")
-            return None
+        if record_number <= last_record_number:
+            self.logger.info(f"{command_name}: record_number {record_number} after {last_record_number}, IMU restarted?")
+        elif gap := record_number - last_record_number - 1:
+            self.dropped_records[command_name] = self.dropped_records.get(command_name, 0) + gap
+            self.dropped_record_count += gap
 
-        return raw_record
+        if (
+            self.dropped_record_count > self.reported_dropped_record_count and
+            monotonic() - self.drops_reported >= DROP_REPORT_INTERVAL
+        ):
+            self.log_dropped_records()
+
+    def log_dropped_records(self):
+        """Log the number of records dropped so far, by sensor."""
+        self.logger.warning(f"{self.dropped_record_count} dropped records by sensor: {self.dropped_records}")
+        self.reported_dropped_record_count = self.dropped_record_count
+        self.drops_reported = monotonic()
 
 class Serial_Reader(object):
     serial_device_name = None
@@ -81,6 +223,7 @@ class Serial_Reader(object):
     def __init__(self, logger, serial_device_name:str):
         """initialize serial IMU connection"""
         self.serial_device_name = serial_device_name
+        self.logger = logger
 
         self.io_handle = Serial(port=serial_device_name, baudrate=115200, write_timeout=4.0, timeout=4.0)
         self.logger.debug("initialize_imu(): Serial device open.")
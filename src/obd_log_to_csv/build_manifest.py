@@ -0,0 +1,234 @@
+# telemetry-obd_log_to_csv/obd_log_to_csv/build_manifest.py
+"""
+Build Manifest
+
+Keeps an SQLite record of what each generated file (integrated JSON file, per route CSV or
+Parquet file, study file) was built from, so each step of the pipeline
+
+    data files -> integrated files -> per route CSV files -> study files
+
+only rebuilds the outputs whose inputs or build parameters changed.
+
+For every target the manifest holds its build parameters (e.g. the columns written) and the
+size, modification time and SHA-256 hash of each input file.  An input whose size and
+modification time are unchanged is taken as unchanged.  Otherwise its hash is compared, so
+files that were only touched or copied don't cause rebuilds.  Targets changed or removed
+outside the pipeline are rebuilt too.
+
+Each input can also carry build details (e.g. where its rows end in a study file), used by
+steps that add to a target rather than rebuild it.
+
+The manifest is saved in the directory given to BuildManifest() as MANIFEST_FILE_NAME.
+"""
+
+import json
+import sqlite3
+from hashlib import sha256
+from os import path as os_path
+from pathlib import Path
+
+MANIFEST_FILE_NAME = ".build_manifest.sqlite3"
+MANIFEST_TIMEOUT = 60.0         # seconds to wait for another process updating the manifest
+HASH_BLOCK_SIZE = 1048576       # bytes read at a time when hashing files
+
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    path TEXT PRIMARY KEY,
+    parameters TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sources TEXT
+);
+"""
+
+def file_hash(file_path) -> str:
+    """SHA-256 hash of a file's contents as a hex string."""
+    file_hash = sha256()
+    with open(file_path, "rb") as input_file:
+        while block := input_file.read(HASH_BLOCK_SIZE):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def file_stamp(file_path, previous_stamp:dict=None) -> dict:
+    """
+    Dictionary of a file's absolute path, size, mtime_ns and sha256.  The hash is reused from
+    previous_stamp when size and mtime_ns are unchanged.
+    """
+    stat = Path(file_path).stat()
+    stamp = {'path': os_path.abspath(file_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, }
+    if previous_stamp and previous_stamp['size'] == stamp['size'] and previous_stamp['mtime_ns'] == stamp['mtime_ns']:
+        stamp['sha256'] = previous_stamp['sha256']
+    else:
+        stamp['sha256'] = file_hash(file_path)
+    return stamp
+
+def normalized_parameters(parameters) -> str:
+    """Build parameters as comparable JSON text."""
+    return json.dumps(parameters, sort_keys=True, default=str)
+
+class BuildManifest():
+    """SQLite record of the inputs and parameters each target file was built from."""
+
+    def __init__(self, directory, verbose=False):
+        """Init function."""
+        self.directory = Path(directory)
+        self.manifest_file_path = self.directory / MANIFEST_FILE_NAME
+        self.verbose = verbose
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.manifest_file_path, timeout=MANIFEST_TIMEOUT)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(MANIFEST_SCHEMA)
+
+    def target_key(self, target) -> str:
+        """Targets are stored by absolute path."""
+        return os_path.abspath(target)
+
+    def entry(self, target) -> dict:
+        """
+        Return the recorded build of target as a dictionary of 'parameters' and 'sources' (list of
+        file_stamp() dictionaries with any build details), None when target isn't recorded or was
+        changed or removed since.
+        """
+        row = self.connection.execute(
+            "SELECT * FROM targets WHERE path = ?", (self.target_key(target), )
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        try:
+            stat = Path(target).stat()
+        except FileNotFoundError:
+            return None
+
+        if stat.st_size != row['size'] or stat.st_mtime_ns != row['mtime_ns']:
+            if self.verbose:
+                print(f"BuildManifest: {target} changed outside the build")
+            return None
+
+        return {'parameters': row['parameters'], 'sources': json.loads(row['sources']), }
+
+    def unchanged_sources(self, target, entry:dict, sources:list) -> int:
+        """
+        Number of leading sources (file paths) matching, in order, unchanged recorded sources of
+        target's entry.  Recorded sizes and modification times of sources found unchanged by their
+        hash are brought up to date so they aren't hashed again.
+        """
+        count = 0
+        refreshed = False
+        for recorded, source in zip(entry['sources'], sources):
+            if recorded['path'] != os_path.abspath(source):
+                break
+            try:
+                stamp = file_stamp(source, recorded)
+            except FileNotFoundError:
+                break
+            if stamp['sha256'] != recorded['sha256']:
+                break
+            if stamp['size'] != recorded['size'] or stamp['mtime_ns'] != recorded['mtime_ns']:
+                recorded.update(stamp)
+                refreshed = True
+            count += 1
+
+        if refreshed:
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE targets SET sources = ? WHERE path = ?",
+                    (json.dumps(entry['sources']), self.target_key(target))
+                )
+
+        return count
+
+    def is_current(self, target, sources:list, parameters=None, adopt=True) -> bool:
+        """
+        True when target exists and was built from sources (file paths) with parameters, none of
+        which changed since.
+        With adopt, a target built before the manifest existed (not recorded) is taken as current
+        when it's newer than all of its sources, the way it used to be, and is recorded.
+        """
+        entry = self.entry(target)
+
+        if entry is None:
+            if adopt and not self.is_recorded(target) and Path(target).is_file():
+                target_mtime_ns = Path(target).stat().st_mtime_ns
+                if all(Path(source).stat().st_mtime_ns <= target_mtime_ns for source in sources):
+                    self.record(target, sources, parameters)
+                    return True
+            return False
+
+        return (
+            entry['parameters'] == normalized_parameters(parameters) and
+            len(entry['sources']) == len(sources) and
+            self.unchanged_sources(target, entry, sources) == len(sources)
+        )
+
+    def source_stamps(self, target, sources:list) -> list:
+        """
+        file_stamp() of each of target's sources (file paths).  Hashes of sources unchanged since
+        target was last recorded are reused.
+        Builds take the stamps before reading their sources and pass them to record(), so that a
+        source still being written isn't recorded with content the build never read.
+        """
+        row = self.connection.execute(
+            "SELECT sources FROM targets WHERE path = ?", (self.target_key(target), )
+        ).fetchone()
+        previous_stamps = {stamp['path']: stamp for stamp in json.loads(row['sources'])} if row else {}
+
+        return [file_stamp(source, previous_stamps.get(os_path.abspath(source))) for source in sources]
+
+    def record(self, target, sources:list, parameters=None, details:list=None):
+        """
+        Record target as built from sources with parameters.  sources are source_stamps() taken
+        before the build or file paths, stamped now.
+        details is an optional list, one dictionary per source, of build details kept with the source.
+        """
+        if all(isinstance(source, dict) for source in sources):
+            stamps = [dict(source) for source in sources]
+        else:
+            stamps = self.source_stamps(target, sources)
+
+        for stamp, detail in zip(stamps, details or []):
+            stamp.update(detail)
+
+        stat = Path(target).stat()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO targets VALUES (?, ?, ?, ?, ?)",
+                (
+                    self.target_key(target), normalized_parameters(parameters),
+                    stat.st_size, stat.st_mtime_ns, json.dumps(stamps),
+                )
+            )
+
+    def forget(self, target):
+        """Remove target from the manifest."""
+        with self.connection:
+            self.connection.execute("DELETE FROM targets WHERE path = ?", (self.target_key(target), ))
+
+    def is_recorded(self, target) -> bool:
+        """True when target is in the manifest, changed since or not."""
+        return self.connection.execute(
+            "SELECT 1 FROM targets WHERE path = ?", (self.target_key(target), )
+        ).fetchone() is not None
+
+    def close(self):
+        """Close the manifest database."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+# manifests opened in this process, by directory
+build_manifests = {}
+
+def get_build_manifest(directory, verbose=False) -> BuildManifest:
+    """Return the build manifest kept in directory.  Each manifest is opened once per process."""
+    key = str(Path(directory).resolve())
+    if key not in build_manifests:
+        build_manifests[key] = BuildManifest(directory, verbose=verbose)
+    return build_manifests[key]
@@ -0,0 +1,219 @@
+# telemetry-obd_log_to_csv/obd_log_to_csv/columnar.py
+"""
+Columnar Output
+
+Typed Parquet (Apache Arrow) alternative to the CSV files written by obd_log_to_csv and
+the analysis studies.  Numbers are stored as int64 or float64, timestamps as UTC timestamps
+and everything else as strings, so readers get typed columns back without re-parsing text
+and can read only the columns they need.
+
+Parquet support needs pyarrow, which is optional:
+
+    python3.11 -m pip install pyarrow
+"""
+
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+OUTPUT_FORMATS = ['csv', 'parquet', ]
+CSV_FILE_SUFFIX = ".csv"
+PARQUET_FILE_SUFFIX = ".parquet"
+PARQUET_BLOCK_ROWS = 65536      # rows per Parquet row group written by ParquetDictWriter
+PARTIAL_FILE_SUFFIX = ".partial"    # added to Parquet files being rewritten by ParquetDictWriter
+DATE_TIME_COLUMNS = ['iso_ts_pre', 'iso_ts_post', ]
+
+def require_pyarrow():
+    """Raise ImportError when pyarrow isn't installed."""
+    if pa is None:
+        raise ImportError("Parquet output requires pyarrow: python3.11 -m pip install pyarrow")
+
+def is_parquet_file(file_path) -> bool:
+    """True when file_path names a Parquet file."""
+    return str(file_path).endswith(PARQUET_FILE_SUFFIX)
+
+def output_file_suffix(output_format:str) -> str:
+    """File name suffix for an OUTPUT_FORMATS value."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"unknown output format {output_format}, expected one of {OUTPUT_FORMATS}")
+    return PARQUET_FILE_SUFFIX if output_format == 'parquet' else CSV_FILE_SUFFIX
+
+def timestamp_type():
+    """Arrow type used for timestamp columns."""
+    return pa.timestamp('us', tz='UTC')
+
+def column_to_arrow(values:list):
+    """
+    Typed Arrow array for a column of pint_to_value_type() values.
+    Columns holding only booleans, integers, numbers or datetimes get bool, int64, float64
+    or timestamp types.  Anything else is stored as the strings a CSV file would hold.
+    """
+    value_types = {type(value) for value in values if value is not None}
+
+    try:
+        if not value_types:
+            return pa.array(values, type=pa.float64())
+        if value_types == {bool}:
+            return pa.array(values, type=pa.bool_())
+        if value_types == {int}:
+            return pa.array(values, type=pa.int64())
+        if value_types <= {int, float}:
+            return pa.array(values, type=pa.float64())
+        if value_types == {datetime}:
+            return pa.array(values, type=timestamp_type())
+    except (OverflowError, pa.ArrowException):
+        # e.g. integers too big for int64
+        pass
+
+    return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+def write_parquet_columns(file_path, columns:dict):
+    """Write a Parquet file from a dictionary of column name: list of values."""
+    require_pyarrow()
+    table = pa.table({column_name: column_to_arrow(values) for column_name, values in columns.items()})
+    pq.write_table(table, file_path)
+
+class ParquetDictWriter():
+    """
+    csv.DictWriter look-alike writing rows to a Parquet file with a fixed schema.
+
+    Columns named in int_columns are int64, those in timestamp_columns are UTC timestamps
+    and all others are float64.  Missing dictionary keys are written as nulls.
+    Rows are written in row groups of PARQUET_BLOCK_ROWS.  close() must be called
+    (or use the writer as a context manager) to complete the file.
+
+    resume_rows keeps that many rows of the existing file (see checkpoint()) and writes
+    after them.  The file is rewritten next to the existing one and replaces it on close().
+    """
+    def __init__(self, file_path, fieldnames:list, int_columns:list=(), timestamp_columns:list=DATE_TIME_COLUMNS,
+                 resume_rows:int=None):
+        """Init function."""
+        require_pyarrow()
+        self.file_path = Path(file_path)
+        self.fieldnames = fieldnames
+        self.schema = pa.schema([
+            (
+                fieldname,
+                pa.int64() if fieldname in int_columns else
+                timestamp_type() if fieldname in timestamp_columns else
+                pa.float64()
+            )
+            for fieldname in fieldnames
+        ])
+        self.rows = []
+        self.row_count = 0
+
+        if resume_rows is None:
+            self.partial_file_path = None
+            self.writer = pq.ParquetWriter(file_path, self.schema)
+            return
+
+        self.partial_file_path = self.file_path.with_name(self.file_path.name + PARTIAL_FILE_SUFFIX)
+        self.writer = pq.ParquetWriter(self.partial_file_path, self.schema)
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=PARQUET_BLOCK_ROWS):
+            if self.row_count >= resume_rows:
+                break
+            batch = batch.slice(0, resume_rows - self.row_count)
+            self.writer.write_table(pa.Table.from_batches([batch, ]).cast(self.schema))
+            self.row_count += batch.num_rows
+
+    def writeheader(self):
+        """Nothing to do, column names are part of the Parquet schema."""
+        return
+
+    def writerow(self, row:dict):
+        """Buffer one row, writing a row group when PARQUET_BLOCK_ROWS are waiting."""
+        self.rows.append(row)
+        if len(self.rows) >= PARQUET_BLOCK_ROWS:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def writecolumns(self, columns:dict):
+        """
+        Write a dictionary of column name: sequence of values (all the same length) as a
+        row group.  Columns not in the dictionary are written as nulls.
+        """
+        self.flush()
+        row_count = len(next(iter(columns.values()))) if columns else 0
+        if row_count == 0:
+            return
+        self.row_count += row_count
+        self.writer.write_table(pa.table(
+            {
+                field.name: (
+                    pa.array(columns[field.name], type=field.type) if field.name in columns else
+                    pa.nulls(row_count, type=field.type)
+                )
+                for field in self.schema
+            },
+            schema=self.schema
+        ))
+
+    def checkpoint(self) -> int:
+        """Rows written so far, for resume_rows."""
+        self.flush()
+        return self.row_count
+
+    def flush(self):
+        """Write waiting rows as a row group."""
+        if not self.rows:
+            return
+        self.row_count += len(self.rows)
+        self.writer.write_table(pa.table(
+            {
+                field.name: pa.array([row.get(field.name) for row in self.rows], type=field.type)
+                for field in self.schema
+            },
+            schema=self.schema
+        ))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.partial_file_path is not None:
+            self.partial_file_path.replace(self.file_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def read_parquet_rows(file_path, columns:list=None):
+    """Generator returning a Parquet file's rows as dictionaries, one row group at a time."""
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(file_path)
+    for row_group in range(parquet_file.num_row_groups):
+        yield from parquet_file.read_row_group(row_group, columns=columns).to_pylist()
+
+def read_parquet_columns(file_path, columns:list) -> dict:
+    """Dictionary of column name: list of values for those of columns in a Parquet file."""
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(file_path)
+    file_columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+    table = parquet_file.read(columns=file_columns)
+    return {column: table.column(column).to_pylist() for column in file_columns}
+
+def read_parquet_data_frames(file_path, columns:list=None, batch_rows:int=PARQUET_BLOCK_ROWS):
+    """Generator returning a Parquet file's rows as pandas DataFrames of up to batch_rows rows."""
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(file_path)
+    for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+        yield batch.to_pandas()
+
+def get_parquet_column_names(file_path):
+    """Returns sequence of list of column names and number of rows in a Parquet file."""
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(file_path)
+    return parquet_file.schema_arrow.names, parquet_file.metadata.num_rows
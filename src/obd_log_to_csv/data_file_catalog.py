@@ -0,0 +1,471 @@
+# telemetry-obd_log_to_csv/obd_log_to_csv/data_file_catalog.py
+"""
+Data File Catalog
+
+Keeps an SQLite catalog of every data file under a base path so that tools looking for
+data files by VIN, application, hostname or boot count don't need to walk the whole data
+tree every time they run.  The catalog holds what the file names say (see
+get_info_from_json_file_name()) along with each file's size and first and last record
+timestamps.
+
+The catalog is brought up to date incrementally.  A directory is only listed again when
+its modification time has changed (files were added, removed or renamed) and a file is
+only read again when its size or modification time has changed.  Files still being written
+by a logger (those with a tail marker, see tcounter.log_writer) are checked every time.
+
+The catalog is saved in the base path directory as CATALOG_FILE_NAME.
+"""
+
+import json
+import sqlite3
+from os import scandir, path as os_path
+from pathlib import Path
+from argparse import ArgumentParser
+
+from .__init__ import __version__
+from tcounter.common import BASE_PATH
+from tcounter.binary_log import (
+    LOG_FILE_SUFFIXES,
+    is_binary_log_file,
+    read_log_records,
+    strip_log_file_suffix,
+)
+from tcounter.log_writer import TAIL_MARKER_SUFFIX
+
+CATALOG_FILE_NAME = ".data_file_catalog.sqlite3"
+CATALOG_TIMEOUT = 60.0      # seconds to wait for another process updating the catalog
+TAIL_READ_SIZE = 65536      # bytes read from the end of JSON files to find the last record
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT,
+    name TEXT,
+    flavor TEXT,
+    hostname TEXT,
+    boot_count_string TEXT,
+    application TEXT,
+    vin TEXT,
+    application_count_string TEXT,
+    integrated INTEGER,
+    size INTEGER,
+    mtime_ns INTEGER,
+    is_open INTEGER,
+    iso_ts_first TEXT,
+    iso_ts_last TEXT
+);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+CREATE INDEX IF NOT EXISTS files_vin ON files (vin);
+CREATE INDEX IF NOT EXISTS files_hostname_boot_count ON files (hostname, boot_count_string);
+"""
+
+# files table columns usable as DataFileCatalog.entries() criteria
+CRITERIA = ['flavor', 'hostname', 'boot_count_string', 'application', 'vin', 'application_count_string', ]
+
+def get_info_from_json_file_name(json_file_name, verbose=False):
+    # sourcery skip: hoist-statement-from-if
+    """parse json file name to determine flavor, hostname, application, boot_count_string, application_count_string, and vin"""
+
+    vin = None
+    application_count_string = None
+    boot_count_string = None
+    application = None
+    hostname = None
+    flavor = None
+
+    # remove .json (or .vtsb) from json_file_name, break json_file_name into sections
+    base_name = strip_log_file_suffix(json_file_name)
+    sections = base_name.split('-')
+
+    # ORIGINAL
+    #   <vin>-<YYYYmmddHHMMSS>-utc.json
+    #   C4HJWCG5DL9999-20230112133422-utc.json
+    #   C4HJWCG5DL9999-TEST-20230112133422-utc.json
+    #
+    #   <application_name>-<YYYYmmddHHMMSS>-utc.json
+    #   NMEA-20220610172050-utc.json
+    if 'utc' in base_name:
+        flavor = 'original'
+        if 'NMEA' in base_name:
+            application = 'gps'
+        else:
+            application = 'obd'
+            vin = sections[0]
+
+        boot_count_string = sections[2] if 'TEST' in base_name else sections[1]
+
+    # INTERIM
+    #   <vin>-<boot_count>.json
+    #   3FTTW8F97PRA99999-0000000007.json
+    #   3FTTW8F97PRA99999-TEST-0000000007.json
+    #
+    #   <application_name>-<boot_count>.json
+    #   NMEA-0000000032.json
+    elif len(sections) == 2 or (len(sections) == 3 and sections[1] == 'TEST'):
+        flavor = 'interim'
+
+        if 'NMEA' in base_name:
+            application = 'gps'
+        else:
+            # 3FTTW8F97PRA99999-TEST-0000000001.json
+            application = 'obd'
+            vin = sections[0]
+
+        boot_count_string = sections[1] if len(sections) == 2 else sections[2]
+
+    # COUNTER (CURRENT)
+    #   <hostname>-<boot_count>-<application_name>-<vin>-<application_count>.json
+    #   telemetry2-0000000072-obd-C4HJWCG9DL9999-0000000039.json
+    #
+    #   <hostname>-<boot_count>-<application_name>-<application_count>.json
+    #   telemetry2-0000000072-gps-0000000114.json
+    #   telemetry2-0000000072-imu-0000000078.json
+    #   telemetry2-0000000072-wthr-0000000066.json
+    else:
+        flavor = 'counter'
+        hostname = sections[0]            
+        boot_count_string = sections[1]
+        application = sections[2]
+        if len(sections) == 5:
+            vin = sections[3]
+            application_count_string = sections[4]
+        elif len(sections) == 4:
+            application_count_string = sections[3]
+        else:
+            raise ValueError(f"len(sections) <{len(sections)}> doesn't match flavor {flavor} sections {sections}")
+
+    return flavor, hostname, application, boot_count_string, application_count_string, vin
+
+def get_data_file_info(file_name:str) -> dict:
+    """
+    File name information for the catalog.  File names not following any naming convention
+    get None values.  Integrated files have application 'integrated' and their VIN.
+    """
+    info = {
+        'flavor': None,
+        'hostname': None,
+        'boot_count_string': None,
+        'application': None,
+        'vin': None,
+        'application_count_string': None,
+        'integrated': 'integrated' in file_name,
+    }
+
+    try:
+        (
+            info['flavor'], info['hostname'], info['application'],
+            info['boot_count_string'], info['application_count_string'], info['vin']
+        ) = get_info_from_json_file_name(file_name)
+    except (ValueError, IndexError):
+        return info
+
+    if info['application'] == 'integrated':
+        # <hostname>-<boot_count>-integrated-<vin>.json
+        info['vin'] = info['application_count_string']
+        info['application_count_string'] = None
+
+    return info
+
+def get_file_timestamps(file_path) -> tuple:
+    """
+    Return (first record iso_ts_pre, last record iso_ts_post) for a data file, None when missing.
+    JSON files only have their first line and last few lines read.
+    """
+    iso_ts_first = None
+    iso_ts_last = None
+
+    if is_binary_log_file(file_path):
+        for record in read_log_records(file_path):
+            if iso_ts_first is None:
+                iso_ts_first = record.get('iso_ts_pre')
+            iso_ts_last = record.get('iso_ts_post', iso_ts_last)
+        return iso_ts_first, iso_ts_last
+
+    with open(file_path, "rb") as json_input:
+        try:
+            iso_ts_first = json.loads(json_input.readline()).get('iso_ts_pre')
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError, AttributeError):
+            return None, None
+
+        file_size = json_input.seek(0, 2)
+        json_input.seek(max(0, file_size - TAIL_READ_SIZE))
+        lines = json_input.read().split(b"\n")
+
+    # the last line may be incomplete (improperly closed file) and the first one partial
+    for line in reversed(lines):
+        try:
+            record = json.loads(line)
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+            continue
+        if isinstance(record, dict) and 'iso_ts_post' in record:
+            iso_ts_last = record['iso_ts_post']
+            break
+
+    return iso_ts_first, iso_ts_last
+
+class DataFileCatalog():
+    """SQLite catalog of the data files under a base path."""
+
+    def __init__(self, base_path=BASE_PATH, catalog_file_path=None, verbose=False):
+        """Init function."""
+        self.base_path = Path(base_path)
+        self.catalog_file_path = Path(catalog_file_path) if catalog_file_path else self.base_path / CATALOG_FILE_NAME
+        self.verbose = verbose
+
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.catalog_file_path, timeout=CATALOG_TIMEOUT)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(CATALOG_SCHEMA)
+
+    def relative_path(self, full_path) -> str:
+        """Catalog paths are relative to the base path."""
+        return os_path.relpath(full_path, self.base_path)
+
+    def update(self, rebuild=False) -> dict:
+        """
+        Bring the catalog up to date with the file system.
+        rebuild forgets everything in the catalog first.
+        Returns counts of files added, updated and removed.
+        """
+        counts = {'added': 0, 'updated': 0, 'removed': 0, }
+        seen_directories = set()
+
+        with self.connection:
+            if rebuild:
+                self.connection.execute("DELETE FROM directories")
+                self.connection.execute("DELETE FROM files")
+
+            self.update_directory(self.base_path, None, seen_directories, counts)
+
+            # directories (and their files) that have gone away
+            for row in self.connection.execute("SELECT path FROM directories").fetchall():
+                if row['path'] not in seen_directories:
+                    counts['removed'] += self.connection.execute(
+                        "DELETE FROM files WHERE directory = ?", (row['path'], )
+                    ).rowcount
+                    self.connection.execute("DELETE FROM directories WHERE path = ?", (row['path'], ))
+
+        if self.verbose:
+            print(f"DataFileCatalog.update(): {self.base_path} {counts}")
+
+        return counts
+
+    def update_directory(self, directory:Path, parent:str, seen_directories:set, counts:dict):
+        """Update the catalog for one directory and its subdirectories."""
+        relative_directory = self.relative_path(directory)
+        try:
+            mtime_ns = directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        seen_directories.add(relative_directory)
+
+        row = self.connection.execute(
+            "SELECT mtime_ns FROM directories WHERE path = ?", (relative_directory, )
+        ).fetchone()
+
+        if row and row['mtime_ns'] == mtime_ns:
+            # Nothing added, removed or renamed.  Only files still being written can have changed.
+            for file_row in self.connection.execute(
+                "SELECT name FROM files WHERE directory = ? AND is_open = 1", (relative_directory, )
+            ).fetchall():
+                self.update_file(directory, file_row['name'], counts)
+
+            subdirectories = [
+                self.base_path / subdirectory_row['path']
+                for subdirectory_row in self.connection.execute(
+                    "SELECT path FROM directories WHERE parent = ?", (relative_directory, )
+                ).fetchall()
+            ]
+
+        else:
+            file_names = set()
+            subdirectories = []
+
+            with scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(Path(entry.path))
+                    elif entry.name.endswith(tuple(LOG_FILE_SUFFIXES)) and entry.is_file():
+                        file_names.add(entry.name)
+                        self.update_file(directory, entry.name, counts)
+
+            for file_row in self.connection.execute(
+                "SELECT path, name FROM files WHERE directory = ?", (relative_directory, )
+            ).fetchall():
+                if file_row['name'] not in file_names:
+                    self.connection.execute("DELETE FROM files WHERE path = ?", (file_row['path'], ))
+                    counts['removed'] += 1
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO directories (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                (relative_directory, parent, mtime_ns)
+            )
+
+        for subdirectory in subdirectories:
+            self.update_directory(subdirectory, relative_directory, seen_directories, counts)
+
+    def update_file(self, directory:Path, file_name:str, counts:dict):
+        """Add or update one file when it is new or has changed."""
+        full_path = directory / file_name
+        relative_path = self.relative_path(full_path)
+        try:
+            stat = full_path.stat()
+        except FileNotFoundError:
+            return
+
+        row = self.connection.execute(
+            "SELECT size, mtime_ns FROM files WHERE path = ?", (relative_path, )
+        ).fetchone()
+
+        if row and row['size'] == stat.st_size and row['mtime_ns'] == stat.st_mtime_ns:
+            return
+
+        info = get_data_file_info(file_name)
+        iso_ts_first, iso_ts_last = get_file_timestamps(full_path)
+        is_open = (directory / (file_name + TAIL_MARKER_SUFFIX)).is_file()
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                relative_path, self.relative_path(directory), file_name,
+                info['flavor'], info['hostname'], info['boot_count_string'], info['application'],
+                info['vin'], info['application_count_string'], info['integrated'],
+                stat.st_size, stat.st_mtime_ns, is_open, iso_ts_first, iso_ts_last,
+            )
+        )
+
+        counts['updated' if row else 'added'] += 1
+
+    def entries(self, integrated=False, **criteria) -> list:
+        """
+        Return catalog entries (dictionaries) in path order matching all criteria, e.g.
+        entries(vin="C4HJWCG9DL9999") or entries(hostname="telemetry2", boot_count_string="0000000072").
+        Criteria are CRITERIA columns.  integrated is False for data files only, True for integrated
+        files only and None for both.  Entry 'path' values are full paths.
+        """
+        conditions = []
+        parameters = []
+
+        for column, value in criteria.items():
+            if column not in CRITERIA:
+                raise ValueError(f"unknown catalog criteria {column}")
+            conditions.append(f"{column} = ?")
+            parameters.append(value)
+
+        if integrated is not None:
+            conditions.append("integrated = ?")
+            parameters.append(bool(integrated))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        entries = []
+        for row in self.connection.execute(f"SELECT * FROM files {where} ORDER BY path", parameters):
+            entry = dict(row)
+            entry['path'] = self.base_path / entry['path']
+            entries.append(entry)
+
+        return entries
+
+    def files(self, integrated=False, **criteria) -> list:
+        """Return full paths to the files matching all criteria, see entries()."""
+        return [entry['path'] for entry in self.entries(integrated=integrated, **criteria)]
+
+    def close(self):
+        """Close the catalog database."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+# catalogs already brought up to date in this process, by base path
+data_file_catalogs = {}
+
+def get_data_file_catalog(base_path=BASE_PATH, update=True, verbose=False) -> DataFileCatalog:
+    """
+    Return the up to date catalog for base_path.  The catalog is opened once per process.
+    update=False skips bringing an already open catalog up to date, for callers looking up
+    many files in a row while nothing new is expected.
+    """
+    key = str(Path(base_path).resolve())
+    if key not in data_file_catalogs:
+        data_file_catalogs[key] = DataFileCatalog(base_path, verbose=verbose)
+        update = True
+
+    if update:
+        data_file_catalogs[key].update()
+
+    return data_file_catalogs[key]
+
+def reset_data_file_catalogs():
+    """
+    Forget the catalogs opened in this process.  Used as the ProcessPoolExecutor initializer
+    so forked worker processes open their own SQLite connections instead of using the
+    connections inherited from the parent process.
+    """
+    data_file_catalogs.clear()
+
+def command_line_options()->dict:
+    parser = ArgumentParser(prog="data_file_catalog", description="Telemetry Data File Catalog")
+
+    parser.add_argument(
+        "--base_path",
+        help=f"BASE_PATH directory variable.  Defaults to {BASE_PATH}",
+        default=BASE_PATH,
+    )
+
+    parser.add_argument(
+        "--rebuild",
+        help="Rebuild the catalog from scratch instead of updating it.  Default is off.",
+        default=False,
+        action='store_true',
+    )
+
+    parser.add_argument(
+        "--vin",
+        help="List the data files for this VIN.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--version",
+        help="Returns version and exit.",
+        default=False,
+        action='store_true',
+    )
+
+    parser.add_argument(
+        "--verbose",
+        help="Turn verbose output on. Default is off.",
+        default=False,
+        action='store_true',
+    )
+
+    return vars(parser.parse_args())
+
+def main():
+    args = command_line_options()
+
+    if args['version']:
+        print(f"Version {__version__}")
+        exit(0)
+
+    with DataFileCatalog(args['base_path'], verbose=args['verbose']) as data_file_catalog:
+        counts = data_file_catalog.update(rebuild=args['rebuild'])
+        print(f"{data_file_catalog.catalog_file_path}: {counts['added']} added, {counts['updated']} updated, {counts['removed']} removed")
+
+        if args['vin']:
+            for entry in data_file_catalog.entries(vin=args['vin'], integrated=None):
+                print(f"{entry['path']}\t{entry['size']}\t{entry['iso_ts_first']}\t{entry['iso_ts_last']}")
+
+if __name__ == "__main__":
+    main()
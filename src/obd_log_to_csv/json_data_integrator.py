@@ -19,6 +19,8 @@ from .__init__ import __version__
 from tcounter.common import (
     BASE_PATH,
 )
+from tcounter.binary_log import glob_log_files, read_log_records
+from imu_logger.euler_angles import add_deferred_euler_angles
 
 def write_json_data_to_integrated_file(records:list, base_path:str, hostname:str, boot_count:int, vin:str, verbose=False):
     if vin is None:
@@ -50,7 +52,7 @@ def get_json_file_list(base_path:str, hostname:str, boot_count:int, verbose=Fals
     """
     file_list = []
     data_directory = f"{base_path}/{hostname}"
-    for json_data_file_path in (Path(data_directory).glob(f"{hostname}*.json")):
+    for json_data_file_path in (glob_log_files(data_directory, f"{hostname}*")):
         file_name_parts = json_data_file_path.name.split('-')
         if boot_count == int(file_name_parts[1]) and "integrated" not in json_data_file_path.name:
             if verbose:
@@ -139,18 +141,9 @@ def main(args=None, base_path=BASE_PATH, hostname=None, boot_count=None, verbose
     for file in get_json_file_list(base_path, hostname, boot_count, verbose=verbose):
         if verbose:
             print(f"file {file.name}")
-        with open(file,  "r") as json_input:
-            for line_number, json_record in enumerate(json_input, start=1):
-                try:
-                    input_record = json.loads(json_record)
-
-                except json.decoder.JSONDecodeError as e:
-                    # improperly closed JSON file
-                    if verbose:
-                        print(f"Corrupted JSON info {file.name} line {line_number}:\n{e}")
-                    break
-
-                sortable_list.append(input_record)
+        # stops at the first corrupted record (improperly closed file)
+        # adds roll, pitch and yaw to IMU records logged without them
+        sortable_list.extend(add_deferred_euler_angles(read_log_records(file, verbose=verbose)))
 
     # Sort using key "<iso_ts_pre><iso_ts_post><command_name>"
     if verbose:
@@ -7,6 +7,8 @@ obd_log_to_csv package.
 """
 
 import contextlib
+import re
+from functools import lru_cache
 from sys import stderr
 from pint import UnitRegistry, UndefinedUnitError, OffsetUnitCalculusError
 from obd.commands import __mode1__, __mode9__
@@ -32,6 +34,13 @@ unit_registry.define("lph = liter / hour = LPH = liters_per_hour")
 unit_registry.define("ppm = count / 1000000 = PPM = parts_per_million")
 # unit_registry.define("degC = Centigrade")
 
+UNIT_CACHE_SIZE = 256       # unit strings remembered by parse_unit_string()
+
+# numbers the way str() writes int and float values
+NUMBER_PATTERN = re.compile(r"-?[0-9]+(\.[0-9]*)?([eE][-+]?[0-9]+)?")
+# unit names multiplied or divided, e.g. "kilometer_per_hour" or "gram / second"
+UNIT_STRING_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(( ?[*/] ?| )[A-Za-z_][A-Za-z0-9_]*)*")
+
 date_time_fields = ['iso_ts_pre', 'iso_ts_post', 'duration', ]
 
 COMMANDS_RETURNING_LIST_RESULTS = {
@@ -838,6 +847,14 @@ def pint_to_value_type(obd_response_value:str, verbose:bool=False):
             return obd_response_value.replace(chr(0), ''), None
         return obd_response_value, None
 
+    # Fast path: {number}<SPACE>{unit string} with the unit string parsed once
+    if isinstance(obd_response_value, str):
+        number_string, _, unit_string = obd_response_value.partition(' ')
+        if NUMBER_PATTERN.fullmatch(number_string):
+            unit_parse = parse_unit_string(unit_string)
+            if unit_parse is not None:
+                return unit_parse_to_value_type(obd_response_value, number_string, unit_parse, verbose)
+
     try:
         pint_value = unit_registry(obd_response_value)
     except UndefinedUnitError:
@@ -875,6 +892,62 @@ def pint_to_value_type(obd_response_value:str, verbose:bool=False):
 
     return (value, 'dimensionless') if len(units) == 0 else (value, units[0][0])
 
+@lru_cache(maxsize=UNIT_CACHE_SIZE)
+def parse_unit_string(unit_string:str):
+    """
+    Parse the unit string part of "{number} {unit string}" values once with pint.
+    Returns one of
+        ('units', multiplier, units) for regular units, e.g. ('units', 1, 'kilometer_per_hour')
+        ('offset', error message) for offset units like degree_Celsius
+        ('undefined', ) for unit strings pint doesn't know
+        None when values with this unit string need a full pint parse.
+    """
+    if not UNIT_STRING_PATTERN.fullmatch(unit_string):
+        return None
+
+    try:
+        pint_value = unit_registry(f"1 {unit_string}")
+    except UndefinedUnitError:
+        return ('undefined', )
+    except OffsetUnitCalculusError as e:
+        return ('offset', str(e))
+    except (ValueError, AttributeError):
+        return None
+
+    try:
+        multiplier, units = pint_value.to_tuple()
+    except AttributeError:
+        return None
+
+    # units that scale the number, e.g. "count / 1000000", need a full parse
+    if multiplier != 1:
+        return None
+
+    return ('units', multiplier, 'dimensionless' if len(units) == 0 else units[0][0])
+
+def unit_parse_to_value_type(obd_response_value:str, number_string:str, unit_parse:tuple, verbose:bool=False):
+    """pint_to_value_type() return value for "{number} {unit string}" values given parse_unit_string() output."""
+    try:
+        number = int(number_string)
+    except ValueError:
+        number = float(number_string)
+
+    if unit_parse[0] == 'units':
+        # same int to float promotion pint does, e.g. for "35 gram / second"
+        value = number * unit_parse[1]
+        if verbose:
+            print(f"response_value {obd_response_value} value {value} units {unit_parse[2]}", file=stderr)
+        return value, unit_parse[2]
+
+    if unit_parse[0] == 'offset':
+        if verbose:
+            print(f"Pint unit_registry error on {obd_response_value}. " +
+                f"Returning \"{(obd_response_value.split())[0]}\" as value. " +
+                f"OffsetUnitCalculusError: {unit_parse[1]}", file=stderr)
+        return number, obd_response_value.split()[1]
+
+    return obd_response_value, None
+
 def command_name_to_mode_pid_mapping():
     """
     creates mapping between command names and mode/pid pairs
@@ -1,12 +1,12 @@
 # OBD Log Evaluation
 # telemetry-obd-log-to-csv/obd_log_to_csv/obd_log_evaluation.py
-import json
 import csv
 from sys import stdout, stderr
 from argparse import ArgumentParser
 from rich.console import Console
 from rich.table import Table
 from .obd_log_common import get_list_command_name, pint_to_value_type, get_mode_pid_from_command_name
+from tcounter.binary_log import read_log_records
 
 def csv_print(raw_data:dict, verbose=False):
     field_names = [
@@ -118,12 +118,13 @@ def rich_output(raw_data:dict, title=None, width=None, verbose=False):
 def get_data_type(data)->str:
     if isinstance(data, str):
         return 'string'
+    # bool before int, bool is a subclass of int
+    if isinstance(data, bool):
+        return 'bool'
     if isinstance(data, int):
         return 'integer'
     if isinstance(data, float):
         return 'float'
-    if isinstance(data, bool):
-        return 'bool'
     return None
 
 def command_name_in_raw_data(command_name:str, raw_data:dict):
@@ -167,6 +168,10 @@ def input_record_single_value(input_record:dict, raw_data:dict, verbose=False):
 
     pint_to_raw_data(command_name, obd_response_value, raw_data, verbose=verbose)
 
+    if input_record.get('obd_response_units'):
+        # obd_logger --compact_values records keep units separate from the value
+        raw_data[command_name]['units'] = input_record['obd_response_units']
+
 def input_record_list(input_record:dict, raw_data:dict, verbose=False):
     """
     process an obd_response_value of type list
@@ -217,24 +222,15 @@ def input_file(json_input_files:list, verbose=False)->dict:
     for json_input_file_name in json_input_files:
         if verbose:
             print(f"processing input file {json_input_file_name}", file=stderr)
-        with open(json_input_file_name, "r") as json_input:
-            for json_record in json_input:
-                try:
-                    input_record = json.loads(json_record)
-                except json.decoder.JSONDecodeError as e:
-                    # improperly closed JSON file
-                    if verbose:
-                        print(f"Corrupted JSON info:\n{e}", file=stderr)
-                    break
-
-                obd_response_value = input_record['obd_response_value']
-
-                if isinstance(obd_response_value, dict):
-                    input_record_dict(input_record, raw_data, verbose=verbose)
-                elif isinstance(obd_response_value, list):
-                    input_record_list(input_record, raw_data, verbose=verbose)
-                else:
-                    input_record_single_value(input_record, raw_data, verbose=verbose)
+        for input_record in read_log_records(json_input_file_name, verbose=verbose):
+            obd_response_value = input_record['obd_response_value']
+
+            if isinstance(obd_response_value, dict):
+                input_record_dict(input_record, raw_data, verbose=verbose)
+            elif isinstance(obd_response_value, list):
+                input_record_list(input_record, raw_data, verbose=verbose)
+            else:
+                input_record_single_value(input_record, raw_data, verbose=verbose)
 
     return raw_data
 
@@ -1,6 +1,5 @@
 # OBD Log To CSV
 # obd_log_to_csv/obd_log_to_csv.py
-import json
 import csv
 import itertools
 from sys import stdout, stderr
@@ -8,17 +7,56 @@ from argparse import ArgumentParser
 from datetime import datetime
 from time import sleep
 from io import TextIOWrapper
+from typing import Iterable
+from tcounter.binary_log import read_log_records, load_log_records
 from pint import UnitRegistry, UndefinedUnitError, OffsetUnitCalculusError
 from .obd_log_common import (
     get_list_command_name,
     pint_to_value_type,
+    parse_unit_string,
+    unit_parse_to_value_type,
+    NUMBER_PATTERN,
     get_base_command_name,
     csv_header,
 )
+from .columnar import OUTPUT_FORMATS, require_pyarrow, write_parquet_columns
 
-def input_file(json_input:TextIOWrapper, commands:list, csv_output:TextIOWrapper,
+ENGINES = ['row', 'column', ]
+CSV_BLOCK_ROWS = 10000      # rows per csv.writer.writerows() call in the column engine
+
+class CachedValueConverter():
+    """
+    pint_to_value_type() for the column engine.
+
+    Values like "35 kilometer_per_hour" go straight to the shared unit string parser
+    (see obd_log_common.parse_unit_string()) skipping the checks pint_to_value_type()
+    makes first.  Everything else goes through pint_to_value_type(), cached per value string.
+    """
+    def __init__(self, verbose=False):
+        """Init function."""
+        self.verbose = verbose
+        # value string: pint_to_value_type() result
+        self.values = {}
+
+    def __call__(self, obd_response_value):
+        """Same return value as pint_to_value_type(obd_response_value)."""
+        if not isinstance(obd_response_value, str) or ' ' not in obd_response_value:
+            return pint_to_value_type(obd_response_value, self.verbose)
+
+        number_string, _, unit_string = obd_response_value.partition(' ')
+        if NUMBER_PATTERN.fullmatch(number_string):
+            unit_parse = parse_unit_string(unit_string)
+            if unit_parse is not None:
+                return unit_parse_to_value_type(obd_response_value, number_string, unit_parse, self.verbose)
+
+        if obd_response_value not in self.values:
+            self.values[obd_response_value] = pint_to_value_type(obd_response_value, self.verbose)
+
+        return self.values[obd_response_value]
+
+def input_file(input_records:Iterable[dict], commands:list, csv_output:TextIOWrapper,
                 header:bool=True, verbose:bool=False) -> None:
-    """process input file given an open file handle for input,
+    """process input file given its log records (see tcounter.binary_log.read_log_records()),
         a list of OBD commands to include in the output and
         an output file handle for the CSV output file.
     """
@@ -46,15 +84,7 @@ def input_file(json_input:TextIOWrapper, commands:list, csv_output:TextIOWrapper
     if header:
         writer.writeheader()
 
-    for line_number, json_record in enumerate(json_input, start=1):
-        try:
-            input_record = json.loads(json_record)
-        except json.decoder.JSONDecodeError as e:
-            # improperly closed JSON file
-            if verbose:
-                print(f"Corrupted JSON info:\n{e}", file=stderr)
-            return
-
+    for input_record in input_records:
         base_command_name = get_base_command_name(input_record['command_name'])
         if base_command_name not in base_commands:
             # This is NOT a command name we are looking for so get the NEXT input_record
@@ -108,12 +138,140 @@ def input_file(json_input:TextIOWrapper, commands:list, csv_output:TextIOWrapper
 
     return
 
-def cycle_through_input_files(json_input_files:list, commands:list, header:bool, csv_output_file:TextIOWrapper, verbose=False):
+def input_file_to_columns(input_records:list, commands:list, verbose:bool=False,
+                converter:CachedValueConverter=None) -> dict:
+    """
+    Column engine conversion of one input file's log records to a dictionary of
+    output column name: list of values, in csv_header(commands) order without duplicates.
+
+    The first pass over the input records only works out which output row and column each
+    value belongs to.  Values are then converted a column at a time with cached unit parsing.
+    """
+    if converter is None:
+        converter = CachedValueConverter(verbose=verbose)
+
+    fieldnames = csv_header(list(commands))
+    field_name_set = set(fieldnames)
+    base_commands = {get_base_command_name(command) for command in commands}
+
+    # field name: [(row number, input value), ...]
+    cells = {field_name: [] for field_name in field_name_set}
+    row_iso_ts_pre = []
+    row_iso_ts_post = []
+
+    # base command names in the row being assembled
+    row_base_commands = set()
+    iso_ts_pre = None
+
+    for input_record in input_records:
+        base_command_name = get_base_command_name(input_record['command_name'])
+        if base_command_name not in base_commands:
+            continue
+
+        if base_command_name in row_base_commands:
+            # the current row is complete, this input record starts the next one
+            row_iso_ts_pre.append(iso_ts_pre)
+            row_iso_ts_post.append(input_record['iso_ts_pre'])
+            row_base_commands = set()
+            iso_ts_pre = None
+
+        if not iso_ts_pre:
+            iso_ts_pre = input_record['iso_ts_pre']
+
+        row = len(row_iso_ts_pre)
+        row_base_commands.add(base_command_name)
+        if base_command_name in field_name_set:
+            cells[base_command_name].append((row, True))
+
+        obd_response_value = input_record['obd_response_value']
+        if isinstance(obd_response_value, dict):
+            for field_name, field_value in obd_response_value.items():
+                command_name = f"{input_record['command_name']}-{field_name}"
+                if command_name in field_name_set:
+                    cells[command_name].append((row, field_value))
+        elif isinstance(obd_response_value, list):
+            for obd_response_index, field_value in enumerate(obd_response_value, start=0):
+                command_name = get_list_command_name(input_record['command_name'], obd_response_index)
+                if command_name in field_name_set:
+                    cells[command_name].append((row, field_value))
+        elif input_record['command_name'] in field_name_set:
+            cells[input_record['command_name']].append((row, obd_response_value))
+
+    # like input_file(), the last row is only written when a following input record completes it
+    row_count = len(row_iso_ts_pre)
+
+    columns = {}
+    for field_name, field_cells in cells.items():
+        column = [None] * row_count
+        for row, field_value in field_cells:
+            if row < row_count:
+                column[row] = converter(field_value)[0]
+        columns[field_name] = column
+
+    iso_ts_pre_column = [datetime.fromisoformat(iso_ts) for iso_ts in row_iso_ts_pre]
+    iso_ts_post_column = [datetime.fromisoformat(iso_ts) for iso_ts in row_iso_ts_post]
+    columns['iso_ts_pre'] = iso_ts_pre_column
+    columns['iso_ts_post'] = iso_ts_post_column
+    columns['duration'] = [
+        (iso_ts_post - iso_ts_pre).total_seconds()
+        for iso_ts_pre, iso_ts_post in zip(iso_ts_pre_column, iso_ts_post_column)
+    ]
+
+    return {field_name: columns[field_name] for field_name in fieldnames}
+
+def input_file_columns(input_records:list, commands:list, csv_output:TextIOWrapper,
+                header:bool=True, verbose:bool=False, converter:CachedValueConverter=None) -> None:
+    """
+    Column engine version of input_file(), writing the same CSV output.
+    Rows are written in blocks of CSV_BLOCK_ROWS.
+    """
+    fieldnames = csv_header(list(commands))
+    columns = input_file_to_columns(input_records, commands, verbose=verbose, converter=converter)
+
+    writer = csv.writer(csv_output, escapechar="\\")
+
+    if header:
+        writer.writerow(fieldnames)
+
+    rows = zip(*[columns[field_name] for field_name in fieldnames])
+    while block := list(itertools.islice(rows, CSV_BLOCK_ROWS)):
+        writer.writerows(block)
+
+    return
+
+def input_files_to_parquet(json_input_files:list, commands:list, parquet_output_file_name:str, verbose=False):
+    """
+    Convert input files with the column engine into one Parquet file with typed columns
+    holding the same rows as the CSV output.
+    """
+    require_pyarrow()
+    converter = CachedValueConverter(verbose=verbose)
+    columns = {field_name: [] for field_name in csv_header(list(commands))}
+
     for json_input_file_name in json_input_files:
         if verbose:
             print(f"processing input file {json_input_file_name}", file=stderr)
-        with open(json_input_file_name, "r") as json_input:
-            input_file(json_input, commands, csv_output_file,
+        file_columns = input_file_to_columns(load_log_records(json_input_file_name, verbose=verbose), commands,
+                                    verbose=verbose, converter=converter)
+        for field_name, values in file_columns.items():
+            columns[field_name].extend(values)
+
+    write_parquet_columns(parquet_output_file_name, columns)
+
+    return
+
+def cycle_through_input_files(json_input_files:list, commands:list, header:bool, csv_output_file:TextIOWrapper,
+                                verbose=False, engine='row'):
+    converter = CachedValueConverter(verbose=verbose)
+
+    for json_input_file_name in json_input_files:
+        if verbose:
+            print(f"processing input file {json_input_file_name}", file=stderr)
+        if engine == 'column':
+            input_file_columns(load_log_records(json_input_file_name, verbose=verbose), commands, csv_output_file,
+                        header=header, verbose=verbose, converter=converter)
+        else:
+            input_file(read_log_records(json_input_file_name, verbose=verbose), commands, csv_output_file,
                         header=header, verbose=verbose)
         header = False
 
@@ -150,6 +308,27 @@ def command_line_options()->dict:
         action='store_true'
     )
 
+    parser.add_argument(
+        "--engine",
+        help="""Conversion engine, 'row' or 'column'.  Both produce the same CSV output.
+                The 'column' engine is faster but holds a whole input file in memory.
+                Default is 'row'.
+        """,
+        choices=ENGINES,
+        default='row',
+    )
+
+    parser.add_argument(
+        "--output_format",
+        help="""Output file format, 'csv' or 'parquet'.
+                'parquet' writes the same rows to a Parquet file with typed columns
+                using the 'column' engine.  It needs the --csv option and the pyarrow package.
+                Default is 'csv'.
+        """,
+        choices=OUTPUT_FORMATS,
+        default='csv',
+    )
+
     parser.add_argument(
         "--verbose",
         help="Turn verbose output on. Default is off.",
@@ -169,7 +348,8 @@ def command_line_options()->dict:
     return vars(parser.parse_args())
 
 
-def main(json_input_files=None, csv_output_file_name='stdout', header=True, verbose=False, commands=None):
+def main(json_input_files=None, csv_output_file_name='stdout', header=True, verbose=False, commands=None, engine='row',
+            output_format='csv'):
     if json_input_files is None:
         args = command_line_options()
 
@@ -178,6 +358,8 @@ def main(json_input_files=None, csv_output_file_name='stdout', header=True, verb
         header = not args['no_header']
         verbose = args['verbose']
         commands = (args['commands']).split(sep=',')
+        engine = args['engine']
+        output_format = args['output_format']
     else:
         args = {
             'json_input_files': json_input_files,
@@ -185,6 +367,8 @@ def main(json_input_files=None, csv_output_file_name='stdout', header=True, verb
             'header': header,
             'verbose': verbose,
             'commands': commands,
+            'engine': engine,
+            'output_format': output_format,
         }
 
     if not commands:
@@ -196,12 +380,18 @@ def main(json_input_files=None, csv_output_file_name='stdout', header=True, verb
         print(f"header: {header}", file=stderr)
         print(f"files: {json_input_files}", file=stderr)
         print(f"csv: {csv_output_file_name}", file=stderr)
+        print(f"engine: {engine}", file=stderr)
+        print(f"output_format: {output_format}", file=stderr)
 
-    if csv_output_file_name != "stdout":
+    if output_format == 'parquet':
+        if csv_output_file_name == "stdout":
+            raise ValueError("Parquet output needs an output file name (--csv)")
+        input_files_to_parquet(json_input_files, commands, csv_output_file_name, verbose=verbose)
+    elif csv_output_file_name != "stdout":
         with open(csv_output_file_name, "w", newline='') as csv_output_file:
-            cycle_through_input_files(json_input_files, commands, header, csv_output_file, verbose=verbose)
+            cycle_through_input_files(json_input_files, commands, header, csv_output_file, verbose=verbose, engine=engine)
     else:
-        cycle_through_input_files(json_input_files, commands, header, stdout, verbose=verbose)
+        cycle_through_input_files(json_input_files, commands, header, stdout, verbose=verbose, engine=engine)
 
 if __name__ == "__main__":
     main()
@@ -13,9 +13,16 @@ Data comes from these data sources:
 
 Starting with a VIN, obd_logger generated files are identified and used to find other
 related sources of JSON data created at the same time.  See JSON_DATA_INTEGRATOR.md.
+
+IMU 'rotation_vector' records logged without roll, pitch and yaw (imu_logger --defer_euler_angles)
+get them added while being integrated.
 """
 
 import json
+from os import cpu_count
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from heapq import heappush, heappop, merge
+from operator import itemgetter
 from datetime import datetime, timezone
 from pathlib import Path
 from argparse import ArgumentParser
@@ -23,9 +30,19 @@ from rich.console import Console
 
 from .__init__ import __version__
 from tcounter.common import  BASE_PATH
+from tcounter.binary_log import read_log_records
+from imu_logger.euler_angles import add_deferred_euler_angles
+from .data_file_catalog import get_data_file_catalog, get_info_from_json_file_name, reset_data_file_catalogs
+from .build_manifest import get_build_manifest
 
 console = Console(width=140)
 
+# records an input file may be out of sort_key() order by and still be merged while streaming
+REORDER_WINDOW = 1000
+
+class OutOfOrderRecords(Exception):
+    """Raised when an input file is too far out of sort_key() order to be merged while streaming."""
+
 def get_output_file_path(base_path:Path, obd_file_name:str)->Path:
     flavor, hostname, application, boot_count_string, application_count_string, vin = get_info_from_json_file_name(obd_file_name)
 
@@ -66,8 +83,8 @@ def get_original_strategy_files(base_path:str, obd_timestamp:str)->list:
     path_list = []
 
     #   <application_name>-<YYYYmmddHHMMSS>-utc.json
-    for p in Path(base_path).glob("**/*-utc.json"):
-        if 'interim' in str(p):
+    for p in get_data_file_catalog(base_path, update=False).files(flavor='original'):
+        if 'interim' in str(p) or not p.name.endswith('-utc.json'):
             continue
 
         parts = p.name.split('-')
@@ -90,86 +107,15 @@ def get_original_strategy_files(base_path:str, obd_timestamp:str)->list:
 def get_interim_strategy_files(base_path:str, application_name:str, boot_count_string:str) -> list:
     """Get list of 'interim' naming strategy files with the same boot count string"""
     #   <application_name>-<boot_count>.json
-    return [p for p in Path(base_path).glob(f"**/{application_name}-{boot_count_string}.json") if 'integrated' not in str(p)]
+    return [
+        p for p in get_data_file_catalog(base_path, update=False).files(flavor='interim', boot_count_string=boot_count_string)
+        if p.name == f"{application_name}-{boot_count_string}.json"
+    ]
 
 def get_counter_strategy_files(base_path:str, hostname:str, vin:str, boot_count_string:str)->list:
     """Get list of 'counter' strategy files with same hostname and boot count string"""
-    #   <hostname>-<boot_count>-<application_name>-<application_count>.json
-    return [p for p in Path(base_path).glob(f"**/{hostname}-{boot_count_string}-*-*.json") if 'integrated' not in str(p)]
-
-def get_info_from_json_file_name(json_file_name, verbose=False):
-    # sourcery skip: hoist-statement-from-if
-    """parse json file name to determine flavor, hostname, application, boot_count_string, application_count_string, and vin"""
-
-    vin = None
-    application_count_string = None
-    boot_count_string = None
-    application = None
-    hostname = None
-    flavor = None
-
-    # remove .json from json_file_name, break json_file_name into sections
-    base_name = json_file_name.replace('.json', '')
-    sections = base_name.split('-')
-
-    # ORIGINAL
-    #   <vin>-<YYYYmmddHHMMSS>-utc.json
-    #   C4HJWCG5DL9999-20230112133422-utc.json
-    #   C4HJWCG5DL9999-TEST-20230112133422-utc.json
-    #
-    #   <application_name>-<YYYYmmddHHMMSS>-utc.json
-    #   NMEA-20220610172050-utc.json
-    if 'utc' in base_name:
-        flavor = 'original'
-        if 'NMEA' in base_name:
-            application = 'gps'
-        else:
-            application = 'obd'
-            vin = sections[0]
-
-        boot_count_string = sections[2] if 'TEST' in base_name else sections[1]
-
-    # INTERIM
-    #   <vin>-<boot_count>.json
-    #   3FTTW8F97PRA99999-0000000007.json
-    #   3FTTW8F97PRA99999-TEST-0000000007.json
-    #
-    #   <application_name>-<boot_count>.json
-    #   NMEA-0000000032.json
-    elif len(sections) == 2 or (len(sections) == 3 and sections[1] == 'TEST'):
-        flavor = 'interim'
-
-        if 'NMEA' in base_name:
-            application = 'gps'
-        else:
-            # 3FTTW8F97PRA99999-TEST-0000000001.json
-            application = 'obd'
-            vin = sections[0]
-
-        boot_count_string = sections[1] if len(sections) == 2 else sections[2]
-
-    # COUNTER (CURRENT)
-    #   <hostname>-<boot_count>-<application_name>-<vin>-<application_count>.json
-    #   telemetry2-0000000072-obd-C4HJWCG9DL9999-0000000039.json
-    #
-    #   <hostname>-<boot_count>-<application_name>-<application_count>.json
-    #   telemetry2-0000000072-gps-0000000114.json
-    #   telemetry2-0000000072-imu-0000000078.json
-    #   telemetry2-0000000072-wthr-0000000066.json
-    else:
-        flavor = 'counter'
-        hostname = sections[0]            
-        boot_count_string = sections[1]
-        application = sections[2]
-        if len(sections) == 5:
-            vin = sections[3]
-            application_count_string = sections[4]
-        elif len(sections) == 4:
-            application_count_string = sections[3]
-        else:
-            raise ValueError(f"len(sections) <{len(sections)}> doesn't match flavor {flavor} sections {sections}")
-
-    return flavor, hostname, application, boot_count_string, application_count_string, vin
+    #   <hostname>-<boot_count>-<application_name>-<application_count>.json (or .vtsb)
+    return get_data_file_catalog(base_path, update=False).files(flavor='counter', hostname=hostname, boot_count_string=boot_count_string)
 
 def get_companion_json_file_list(base_path:str, obd_file_name:str, verbose=False)->list:
     """
@@ -193,17 +139,22 @@ def get_companion_json_file_list(base_path:str, obd_file_name:str, verbose=False
 
     return []
 
-def write_json_data_to_integrated_file(records, output_file_path, verbose=True)->Path:
-    """write output file to integrated file"""
+def write_json_data_to_integrated_file(records, output_file_path, verbose=True)->int:
+    """write records (any iterable) to integrated file, returns the number of records written"""
     if verbose:
-        console.print(f"writing {len(records)} records of integrated JSON data to {output_file_path}")
+        console.print(f"writing integrated JSON data to {output_file_path}")
+
+    record_count = 0
 
     # truncate file on open for write
     with open(output_file_path, "w", encoding='utf-8') as output_file:
-        for record in records:
+        for record_count, record in enumerate(records, start=1):
             output_file.write(json.dumps(record) + "\n")
 
-    return
+    if verbose:
+        console.print(f"wrote {record_count} records of integrated JSON data to {output_file_path}")
+
+    return record_count
 
 def sort_key(json_data_record:dict):
     """
@@ -213,12 +164,119 @@ def sort_key(json_data_record:dict):
     """
     return json_data_record["iso_ts_pre"] + json_data_record["iso_ts_post"] + json_data_record["command_name"]
 
+def time_ordered_records(records, window=REORDER_WINDOW):
+    """
+    Generator yielding (sort_key(record), record) in sort_key() order from records that are
+    already close to that order, like the records in a logger output file.  Records sharing
+    timestamps (e.g. multi-PID OBD responses) can be out of command_name order and are put
+    back in order using a reorder buffer of window records.  Raises OutOfOrderRecords when
+    records are further out of order than that, e.g. after a system clock change.
+    """
+    reorder_buffer = []
+    last_key = None
+
+    def pop():
+        nonlocal last_key
+        key, _, record = heappop(reorder_buffer)
+        if last_key is not None and key < last_key:
+            raise OutOfOrderRecords(f"{key} after {last_key}")
+        last_key = key
+        return key, record
+
+    # sequence keeps records with the same key in input order
+    for sequence, record in enumerate(records):
+        heappush(reorder_buffer, (sort_key(record), sequence, record))
+        if len(reorder_buffer) > window:
+            yield pop()
+
+    while reorder_buffer:
+        yield pop()
+
+def un_duplicate_records(keyed_records):
+    """
+    Generator removing duplicates from sorted (sort_key(record), record) pairs.
+    Of the records sharing a key, the last one is kept.
+    """
+    previous_key = None
+    previous_record = None
+
+    for key, record in keyed_records:
+        if previous_record is not None and key != previous_key:
+            yield previous_record
+        previous_key = key
+        previous_record = record
+
+    if previous_record is not None:
+        yield previous_record
+
+def read_input_records(input_file, verbose=False):
+    """Generator yielding an input file's records, with any deferred IMU Euler angles added."""
+    return add_deferred_euler_angles(read_log_records(input_file, verbose=verbose))
+
+def merge_log_files(input_files:list, verbose=False):
+    """
+    Generator yielding the un-duplicated records from all input files in sort_key() order.
+    Input files are streamed through a k-way merge so only a few records per file are held
+    in memory.  Records with the same key are taken in input_files order.
+    """
+    return un_duplicate_records(merge(
+        *[time_ordered_records(read_input_records(input_file, verbose=verbose)) for input_file in input_files],
+        key=itemgetter(0)
+    ))
+
+def sort_log_files(input_files:list, verbose=False):
+    """In memory equivalent of merge_log_files() for input files that aren't in time order."""
+    sortable_list = []
+    for input_file in input_files:
+        sortable_list.extend(read_input_records(input_file, verbose=verbose))
+
+    # stable sort keeps records with the same key in input_files order
+    sortable_list.sort(key=sort_key)
+
+    return un_duplicate_records((sort_key(record), record) for record in sortable_list)
+
+def get_integration_input_files(base_path:str, obd_file:Path, verbose=False)->list:
+    """Return the OBD file followed by its companion files."""
+    input_files = [obd_file, ]
+
+    for companion_file in get_companion_json_file_list(base_path, obd_file.name, verbose=verbose):
+        if companion_file == obd_file:
+            continue
+        if verbose:
+            console.print(f"OBD file {obd_file.name} companion file {companion_file.name}")
+        input_files.append(companion_file)
+
+    return input_files
+
+def integrate_obd_file(base_path:str, obd_file:Path, output_file_path:Path, input_files:list=None, verbose=False)->tuple:
+    """
+    Integrate one OBD file with its companion files (input_files, found when None) into output_file_path.
+    Runs in worker processes with --jobs.  Returns (obd_file, output_file_path, record_count).
+    """
+    if input_files is None:
+        input_files = get_integration_input_files(base_path, obd_file, verbose=verbose)
+
+    # Merge on key "<iso_ts_pre><iso_ts_post><command_name>", removing duplicate records.
+    # Input files stop at the first corrupted record (improperly closed file).
+    try:
+        record_count = write_json_data_to_integrated_file(
+            merge_log_files(input_files, verbose=verbose), output_file_path, verbose=verbose
+        )
+    except OutOfOrderRecords as e:
+        if verbose:
+            console.print(f"input files out of time order ({e}), sorting in memory")
+        record_count = write_json_data_to_integrated_file(
+            sort_log_files(input_files, verbose=verbose), output_file_path, verbose=verbose
+        )
+
+    return obd_file, output_file_path, record_count
+
 def get_json_vin_file_list(base_path:str, vin:str, verbose=False) -> list:
     """Return a list of file paths to OBD files for a VIN."""
     if verbose:
         console.print(f"base path {base_path}, vin {vin}")
 
-    file_list = [file_path for file_path in list((Path(base_path).glob(f"**/*{vin}*.json"))) if 'integrated' not in file_path.name]
+    file_list = get_data_file_catalog(base_path, verbose=verbose).files(vin=vin)
 
     if verbose:
         console.print(f"input {vin} file_list {file_list}")
@@ -242,11 +300,18 @@ def command_line_options()->dict:
 
     parser.add_argument(
         "--skip",
-        help="Skip processing if output file already exists.",
+        help="Skip processing if output file is up to date with its OBD and companion files.",
         default=False,
         action='store_true',
     )
 
+    parser.add_argument(
+        "--jobs",
+        help="Number of OBD files integrated in parallel by worker processes.  0 uses every CPU core.  Default is 1.",
+        default=1,
+        type=int,
+    )
+
     parser.add_argument(
         "--version",
         help="Returns version and exit.",
@@ -263,7 +328,7 @@ def command_line_options()->dict:
 
     return vars(parser.parse_args())
 
-def main(args=None, base_path=BASE_PATH, vin=None, skip=False, verbose=False):
+def main(args=None, base_path=BASE_PATH, vin=None, skip=False, verbose=False, jobs=1):
     if args is not None:
         # Called from command line
         if args['version']:
@@ -275,6 +340,7 @@ def main(args=None, base_path=BASE_PATH, vin=None, skip=False, verbose=False):
         vin = args['vin']
         verbose = args['verbose']
         skip = args['skip']
+        jobs = args['jobs']
 
     elif vin is None:
         # External call to main, required args not provided.
@@ -283,74 +349,67 @@ def main(args=None, base_path=BASE_PATH, vin=None, skip=False, verbose=False):
     if verbose:
         console.print(f"base_path {base_path}")
         console.print(f"vin {vin}")
+        console.print(f"jobs {jobs}")
 
     skipped_files = 0
     written_files = 0
 
-    sortable_list = []
-    for obd_file in get_json_vin_file_list(base_path, vin, verbose=verbose):
+    # output file path: OBD file
+    integrations = {}
+
+    # inputs of each integrated file, see obd_log_to_csv.build_manifest
+    manifest = get_build_manifest(base_path)
+
+    # sorted so that output and progress reports come out the same every run
+    for obd_file in sorted(get_json_vin_file_list(base_path, vin, verbose=verbose)):
 
         output_file_path = get_output_file_path(base_path, obd_file.name)
 
         if verbose:
             console.print(f"Input OBD file {obd_file.name}, Output integrated file {output_file_path.name}")
 
-        if output_file_path.exists() and skip:
-            skipped_files += 1
+        if output_file_path in integrations:
+            # OBD files from the same boot share an output file, the last one wins as it always has
             if verbose:
-                console.print(f"skipping input {obd_file.name} output {output_file_path.name}")
-            continue
-
-        written_files += 1
-        with open(obd_file,  "r") as json_input:
-            for line_number, json_record in enumerate(json_input, start=1):
-                try:
-                    input_record = json.loads(json_record)
+                console.print(f"replacing {integrations[output_file_path].name} with {obd_file.name} for output {output_file_path.name}")
+        integrations[output_file_path] = obd_file
 
-                except json.decoder.JSONDecodeError as e:
-                    # improperly closed JSON file
-                    if verbose:
-                        print(f"Corrupted JSON info {obd_file.name} line {line_number}:\n{e}")
-                    break
+    # output file path: (input files, manifest stamps of the input files)
+    integration_inputs = {}
 
-                sortable_list.append(input_record)
-
-        for companion_file in get_companion_json_file_list(base_path, obd_file.name, verbose=verbose):
+    for output_file_path, obd_file in list(integrations.items()):
+        input_files = get_integration_input_files(base_path, obd_file)
+        if skip and manifest.is_current(output_file_path, input_files):
+            skipped_files += 1
             if verbose:
-                console.print(f"OBD file {obd_file.name} companion file {companion_file.name}")
-
-            with open (companion_file, "r") as json_input:
-                for line_number, json_record in enumerate(json_input, start=1):
-                    try:
-                        input_record = json.loads(json_record)
-                        sortable_list.append(input_record)
-
-                    except json.decoder.JSONDecodeError as e:
-                        # improperly closed JSON file
-                        if verbose:
-                            print(f"Corrupted JSON info {companion_file.name} line {line_number}:\n{e}")
-                        break
-
-        # Sort using key "<iso_ts_pre><iso_ts_post><command_name>"
-        if verbose:
-            console.print(f"sorting {len(sortable_list)}")
-        sortable_list.sort(key=sort_key)
-
-        # Remove duplicate records
-        if verbose:
-            console.print(f"sorted list {len(sortable_list)} before un-duplicating")
-
-        un_duplicate_list = {sort_key(record): record for record in sortable_list}
-        un_duplicate_list = [record for k, record in un_duplicate_list.items()]
-
-        if verbose:
-            print(f"sorted list {len(un_duplicate_list)} after un-duplicating")
-
-        # write sorted_list to file
-        if verbose:
-            console.print("writing sorted list")
-
-        write_json_data_to_integrated_file(un_duplicate_list, output_file_path, verbose=verbose)
+                console.print(f"skipping input {obd_file.name} output {output_file_path.name}")
+            del integrations[output_file_path]
+        else:
+            written_files += 1
+            # stamped before integrating, inputs still being written are integrated again next time
+            integration_inputs[output_file_path] = (input_files, manifest.source_stamps(output_file_path, input_files))
+
+    if jobs == 0:
+        jobs = cpu_count()
+
+    if jobs > 1 and len(integrations) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=reset_data_file_catalogs) as executor:
+            futures = [
+                executor.submit(
+                    integrate_obd_file, base_path, obd_file, output_file_path,
+                    input_files=integration_inputs[output_file_path][0], verbose=verbose
+                )
+                for output_file_path, obd_file in integrations.items()
+            ]
+            for completed_count, future in enumerate(as_completed(futures), start=1):
+                obd_file, output_file_path, record_count = future.result()
+                manifest.record(output_file_path, integration_inputs[output_file_path][1])
+                console.print(f"{completed_count}/{len(futures)} {obd_file.name}: {record_count} records written to {output_file_path.name}")
+    else:
+        for output_file_path, obd_file in integrations.items():
+            input_files, input_stamps = integration_inputs[output_file_path]
+            integrate_obd_file(base_path, obd_file, output_file_path, input_files=input_files, verbose=verbose)
+            manifest.record(output_file_path, input_stamps)
 
     if verbose:
         console.print(f"Integrated Files Written {written_files}, Files Skipped {skipped_files}")
@@ -0,0 +1,2 @@
+# telemetry-sensor-collector/sensor_collector/__init__.py
+__version__ = "0.5.0"
@@ -0,0 +1,487 @@
+# telemetry-sensor-collector/sensor_collector/sensor_collector.py
+"""
+Sensor Collector
+
+Optional replacement for running gps_logger, imu_logger, wthr_logger and trlr_logger as
+separate processes.  One process collects from all of them on one asyncio event loop:
+
+- UDP sources (WeatherReports, TrailerConnector, UDP_Reader) are read by the event loop
+  through datagram endpoints on the same sockets the loggers use.
+- Serial sources (Adafruit NMEA or u-blox UBX GPS, Serial_Reader USB IMU) block in pyserial,
+  which has no asyncio interface, so each is read by one small thread handing its records to
+  the event loop.  A source that fails is reopened after --restart_delay seconds.
+
+Each application still writes its own data file, named by tcounter.common.get_output_file_name()
+just as the separate loggers name theirs, with the same records.  Group commits (flush/fsync)
+for all data files are driven by one event loop task instead of one thread per file.
+"""
+from argparse import ArgumentParser
+import asyncio
+import logging
+import signal
+from sys import stdout, stderr
+from datetime import datetime, timezone
+from functools import partial
+from threading import Thread
+
+from tcounter.common import (
+    get_output_file_name,
+    get_next_application_counter_value,
+    BASE_PATH,
+)
+from tcounter.log_writer import (
+    DurableLogWriter,
+    DEFAULT_COMMIT_RECORDS,
+    DEFAULT_COMMIT_INTERVAL,
+)
+from tcounter.binary_log import (
+    BinaryRecordEncoder,
+    json_lines_encoder,
+    BINARY_LOG_FILE_SUFFIX,
+    JSON_LOG_FILE_SUFFIX,
+)
+from wthr_logger.udp import WeatherReports, WEATHER_REPORT_EXCLUDE_LIST
+from wthr_logger.udp import DEFAULT_LOCAL_HOST_UDP_PORT_NUMBER as DEFAULT_WTHR_UDP_PORT_NUMBER
+from wthr_logger.wthr_logger import dict_to_log_format as wthr_dict_to_log_format
+from trlr_logger.udp import TrailerConnector
+from trlr_logger.udp import DEFAULT_LOCAL_HOST_UDP_PORT_NUMBER as DEFAULT_TRLR_UDP_PORT_NUMBER
+from trlr_logger.trlr_logger import dict_to_log_format as trlr_dict_to_log_format
+from imu_logger.io import UDP_Reader, Serial_Reader
+from imu_logger.io import DEFAULT_LOCAL_HOST_UDP_PORT_NUMBER as DEFAULT_IMU_UDP_PORT_NUMBER
+from imu_logger.imu_logger import add_euler_angles
+
+from .__init__ import __version__
+
+APPLICATIONS = ['gps', 'imu', 'wthr', 'trlr', ]
+GPS_RECEIVERS = ['adafruit', 'ublox', ]
+DEFAULT_GPS_RECEIVER = 'adafruit'
+DEFAULT_GPS_MESSAGE_RATE = 1
+DEFAULT_RESTART_DELAY = 5.0     # seconds before reopening a failed serial source
+
+logger = logging.getLogger("sensor_collector")
+
+def iso_ts_now() -> str:
+    return datetime.isoformat(datetime.now(tz=timezone.utc))
+
+def get_log_file_handle(application_id:str, base_path=BASE_PATH, binary:bool=False):
+    """return a file handle opened for writing to an application's JSON lines or binary log file"""
+    file_suffix = BINARY_LOG_FILE_SUFFIX if binary else JSON_LOG_FILE_SUFFIX
+    full_path = get_output_file_name(application_id, base_path=base_path, file_suffix=file_suffix)
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+
+    logger.info(f"{application_id} log file full path: {full_path}")
+
+    try:
+        # open for exclusive creation, failing if the file already exists
+        if binary:
+            return open(full_path, mode='xb')
+        return open(full_path, mode='x', encoding='utf-8')
+
+    except FileExistsError:
+        logger.error(f"get_log_file_handle(): FileExistsError: {full_path}")
+        counter = get_next_application_counter_value(application_id)
+        logger.error(f"get_log_file_handle(): Incremented '{application_id}' counter to {counter}")
+        return get_log_file_handle(application_id, base_path=base_path, binary=binary)
+
+class ApplicationLog():
+    """
+    One application's data file.  Adds 'iso_ts_pre' (when the application started waiting for
+    a record) and 'iso_ts_post' (when the record arrived) the way the separate loggers do.
+    Commits are left to commit_logs().  Records written after close(), e.g. handed over by a
+    serial reader thread still blocked in its device, are dropped.
+    """
+    def __init__(
+        self,
+        application_id:str,
+        base_path=BASE_PATH,
+        binary:bool=False,
+        commit_records:int=DEFAULT_COMMIT_RECORDS,
+        commit_interval:float=DEFAULT_COMMIT_INTERVAL,
+    ):
+        """Init function."""
+        self.application_id = application_id
+
+        # each run is a new application startup, as when bin/vts.user.profile starts a logger
+        get_next_application_counter_value(application_id)
+
+        self.writer = DurableLogWriter(
+            get_log_file_handle(application_id, base_path=base_path, binary=binary),
+            commit_records=commit_records,
+            commit_interval=commit_interval,
+            encoder=BinaryRecordEncoder() if binary else json_lines_encoder,
+            background_commit=False,
+            repair_application_id=application_id,
+        )
+        logger.info(f"{application_id} log file name: {self.writer.name}")
+
+        self.closed = False
+        self.iso_ts_pre = iso_ts_now()
+
+    def write(self, log_value:dict):
+        """Log log_value, None for messages that aren't logged."""
+        if self.closed:
+            return
+
+        if log_value is not None:
+            log_value['iso_ts_pre'] = self.iso_ts_pre
+            log_value['iso_ts_post'] = iso_ts_now()
+
+            logger.debug(f"{self.application_id} logging: {log_value}")
+
+            self.writer.write_record(log_value)
+
+        self.iso_ts_pre = iso_ts_now()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.writer.close()
+
+# UDP message to log values conversions, empty lists for messages that aren't logged
+
+def weather_log_values(weather_reports:WeatherReports, message:bytes, ip_address_info) -> list:
+    raw_weather_report, weather_report = weather_reports.decode(message, ip_address_info)
+    if not weather_report or weather_report['type'] in WEATHER_REPORT_EXCLUDE_LIST:
+        return []
+    return [wthr_dict_to_log_format(weather_report), ]
+
+def trailer_log_values(trailer_connector:TrailerConnector, message:bytes, ip_address_info) -> list:
+    raw_record, record = trailer_connector.decode(message, ip_address_info)
+    return [trlr_dict_to_log_format(record), ] if record else []
+
+def imu_log_values(imu_reader:UDP_Reader, defer_euler_angles:bool, message:bytes, ip_address_info) -> list:
+    # binary IMU frames hold one record per sensor
+    records = imu_reader.decode(message, ip_address_info)
+    return records if defer_euler_angles else [add_euler_angles(record) for record in records]
+
+# Serial sources, generators of log values (None for messages that aren't logged) run in threads
+
+def adafruit_gps_log_values(serial_device:str):
+    from serial import Serial
+    from pynmeagps import NMEAReader
+    from gps_logger.adafruit_ultimate_gps_logger import parsed_data_to_dict, dict_to_log_format
+
+    for (raw_data, parsed_data) in NMEAReader(Serial(serial_device)):
+        yield dict_to_log_format(parsed_data_to_dict(parsed_data))
+
+def ublox_gps_log_values(serial_device:str, message_rate:int):
+    from pyubx2 import UBXReader
+    from gps_logger.connection import initialize_gps, dict_to_log_format
+    from gps_logger.gps_config import parsed_data_to_dict
+
+    for (raw_data, parsed_data) in UBXReader(initialize_gps(serial_device, message_rate)):
+        data_dict = parsed_data_to_dict(parsed_data)
+        # "Skipping UBX and RTM messages"
+        yield dict_to_log_format(data_dict) if data_dict['Message_Type'] == "NMEA" else None
+
+def serial_imu_log_values(serial_device_name:str, defer_euler_angles:bool):
+    for record in Serial_Reader(logger, serial_device_name):
+        yield add_euler_angles(record) if record and not defer_euler_angles else record
+
+class DatagramSource(asyncio.DatagramProtocol):
+    """Logs the datagrams received on a UDP socket, converted by to_log_values(message, ip_address_info)."""
+    def __init__(self, log:ApplicationLog, to_log_values):
+        self.log = log
+        self.to_log_values = to_log_values
+
+    def datagram_received(self, data:bytes, addr):
+        try:
+            for log_value in self.to_log_values(data, addr):
+                self.log.write(log_value)
+        except Exception as e:
+            # one bad message doesn't stop the other sources
+            logger.error(f"{self.log.application_id}: {type(e).__name__} {e} in message {data}")
+
+    def error_received(self, exc):
+        logger.error(f"{self.log.application_id}: {exc}")
+
+async def start_udp_source(log:ApplicationLog, udp_socket, to_log_values) -> asyncio.DatagramTransport:
+    """Log the datagrams received on udp_socket (already bound) from the event loop.  Returns the transport."""
+    transport, protocol = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: DatagramSource(log, to_log_values), sock=udp_socket
+    )
+    return transport
+
+def call_in_loop(loop, callback, *args) -> bool:
+    """Call callback(*args) in loop's thread from another thread.  False once loop is closed."""
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        return False
+    return True
+
+def set_future_outcome(future:asyncio.Future, exception:BaseException=None):
+    if future.done():
+        return
+    if exception is None:
+        future.set_result(None)
+    else:
+        future.set_exception(exception)
+
+def read_serial_source(loop, log:ApplicationLog, log_values, finished:asyncio.Future):
+    """Thread handing each log value from log_values() to log.write() in the event loop."""
+    try:
+        for log_value in log_values():
+            if not call_in_loop(loop, log.write, log_value):
+                return
+    except Exception as e:
+        call_in_loop(loop, set_future_outcome, finished, e)
+    else:
+        call_in_loop(loop, set_future_outcome, finished)
+
+async def run_serial_source(log:ApplicationLog, log_values, restart_delay:float=DEFAULT_RESTART_DELAY):
+    """
+    Log the log values from the generator returned by log_values(), which opens a blocking
+    serial device.  When the device fails or its input ends, it's reopened after restart_delay seconds.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        finished = loop.create_future()
+        Thread(
+            target=read_serial_source, args=(loop, log, log_values, finished),
+            name=f"{log.application_id}_reader", daemon=True,
+        ).start()
+
+        try:
+            await finished
+            logger.warning(f"{log.application_id}: input ended")
+        except Exception as e:
+            logger.error(f"{log.application_id}: {type(e).__name__} {e}")
+
+        logger.info(f"{log.application_id}: reopening in {restart_delay} seconds")
+        await asyncio.sleep(restart_delay)
+
+async def commit_logs(logs:list, commit_interval:float):
+    """Commit each log's waiting records once they have waited commit_interval seconds."""
+    while True:
+        await asyncio.sleep(commit_interval / 2)
+        for log in logs:
+            log.writer.commit_if_due()
+
+async def collect(args:dict):
+    """Collect from the sources for args['applications'] until cancelled or sent SIGTERM."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+    logs = {}
+    tasks = []
+    transports = []
+
+    try:
+        for application_id in args['applications']:
+            logs[application_id] = ApplicationLog(
+                application_id,
+                base_path=args['base_path'],
+                binary=args['binary'],
+                commit_records=args['commit_records'],
+                commit_interval=args['commit_interval'],
+            )
+
+        if 'wthr' in logs:
+            weather_reports = WeatherReports(logger, local_host_udp_port_number=args['wthr_udp_port_number'])
+            transports.append(await start_udp_source(logs['wthr'], weather_reports.weather_station, partial(weather_log_values, weather_reports)))
+
+        if 'trlr' in logs:
+            trailer_connector = TrailerConnector(logger, local_host_udp_port_number=args['trlr_udp_port_number'])
+            transports.append(await start_udp_source(logs['trlr'], trailer_connector.trailer_connector, partial(trailer_log_values, trailer_connector)))
+
+        if 'imu' in logs and args['imu_usb']:
+            serial_device_name = args['imu_serial_device_name']
+            if serial_device_name is None:
+                from imu_logger.usb_devices import get_serial_device_name
+                serial_device_name = get_serial_device_name()
+            logger.info(f"imu serial device: {serial_device_name}")
+            tasks.append(asyncio.create_task(run_serial_source(
+                logs['imu'], partial(serial_imu_log_values, serial_device_name, args['imu_defer_euler_angles']), restart_delay=args['restart_delay']
+            )))
+        elif 'imu' in logs:
+            imu_reader = UDP_Reader(logger, local_host_udp_port_number=args['imu_udp_port_number'])
+            transports.append(await start_udp_source(logs['imu'], imu_reader.trailer_connector, partial(imu_log_values, imu_reader, args['imu_defer_euler_angles'])))
+
+        if 'gps' in logs:
+            serial_device = args['gps_serial']
+            if args['gps_receiver'] == 'ublox':
+                if serial_device is None:
+                    from gps_logger.usb_devices import get_serial_device_name
+                    serial_device = get_serial_device_name()
+                log_values = partial(ublox_gps_log_values, serial_device, args['gps_message_rate'])
+            else:
+                if serial_device is None:
+                    from gps_logger.adafruit_ultimate_gps_logger import get_serial_device_name
+                    serial_device = get_serial_device_name()
+                log_values = partial(adafruit_gps_log_values, serial_device)
+            logger.info(f"gps {args['gps_receiver']} serial device: {serial_device}")
+            tasks.append(asyncio.create_task(run_serial_source(
+                logs['gps'], log_values, restart_delay=args['restart_delay']
+            )))
+
+        if args['commit_interval'] > 0:
+            tasks.append(asyncio.create_task(commit_logs(list(logs.values()), args['commit_interval'])))
+
+        await stop.wait()
+        logger.info("SIGTERM received, stopping")
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        for transport in transports:
+            transport.close()
+        # serial reader threads can't be stopped while blocked in their devices,
+        # records they hand over from now on are dropped by the closed logs
+        for log in logs.values():
+            log.close()
+
+def argument_parsing()-> dict:
+    """Argument parsing"""
+    parser = ArgumentParser(description="Telemetry Sensor Collector")
+
+    parser.add_argument(
+        "base_path",
+        nargs='?',
+        metavar="base_path",
+        default=BASE_PATH,
+        help=f"Relative or absolute output data directory. Defaults to '{BASE_PATH}'."
+    )
+
+    parser.add_argument(
+        "--applications",
+        nargs='+',
+        choices=APPLICATIONS,
+        default=APPLICATIONS,
+        help=f"Applications (sensors) to collect data for. Defaults to {' '.join(APPLICATIONS)}."
+    )
+
+    parser.add_argument(
+        "--gps_receiver",
+        choices=GPS_RECEIVERS,
+        default=DEFAULT_GPS_RECEIVER,
+        help=f"GPS hardware, 'adafruit' (Adafruit Ultimate GPS, adafruit_ultimate_gps_logger) or 'ublox' (u-blox, gps_logger). Defaults to {DEFAULT_GPS_RECEIVER}."
+    )
+
+    parser.add_argument(
+        "--gps_serial",
+        default=None,
+        help="Full path to the serial device where the GPS can be found. Defaults to the USB device found for --gps_receiver."
+    )
+
+    parser.add_argument(
+        "--gps_message_rate",
+        default=DEFAULT_GPS_MESSAGE_RATE,
+        type=int,
+        help=f"Number of whole seconds between each u-blox GPS fix.  Defaults to {DEFAULT_GPS_MESSAGE_RATE}."
+    )
+
+    parser.add_argument(
+        "--imu_usb",
+        default=False,
+        action='store_true',
+        help="CircuitPython IMU microcontroller connects via USB instead of WIFI (UDP). Default is False.",
+    )
+
+    parser.add_argument(
+        "--imu_serial_device_name",
+        default=None,
+        help="Name for the hardware IMU serial device with --imu_usb. Defaults to the USB device found.",
+    )
+
+    parser.add_argument(
+        "--imu_defer_euler_angles",
+        default=False,
+        action='store_true',
+        help="Log raw IMU rotation vector quaternions without roll, pitch and yaw, which are added later by obd_log_to_csv.vin_data_integrator. Default is False.",
+    )
+
+    parser.add_argument(
+        "--imu_udp_port_number",
+        type=int,
+        default=DEFAULT_IMU_UDP_PORT_NUMBER,
+        help=f"UDP port number for receiving IMU datagrams. Defaults to '{DEFAULT_IMU_UDP_PORT_NUMBER}'"
+    )
+
+    parser.add_argument(
+        "--wthr_udp_port_number",
+        type=int,
+        default=DEFAULT_WTHR_UDP_PORT_NUMBER,
+        help=f"UDP port number for receiving weather datagrams. Defaults to '{DEFAULT_WTHR_UDP_PORT_NUMBER}'"
+    )
+
+    parser.add_argument(
+        "--trlr_udp_port_number",
+        type=int,
+        default=DEFAULT_TRLR_UDP_PORT_NUMBER,
+        help=f"UDP port number for receiving trailer connector datagrams. Defaults to '{DEFAULT_TRLR_UDP_PORT_NUMBER}'"
+    )
+
+    parser.add_argument(
+        "--restart_delay",
+        default=DEFAULT_RESTART_DELAY,
+        type=float,
+        help=f"Seconds to wait before reopening a failed serial device. Default is {DEFAULT_RESTART_DELAY}."
+    )
+
+    parser.add_argument(
+        "--commit_records",
+        default=DEFAULT_COMMIT_RECORDS,
+        type=int,
+        help=f"Maximum number of records buffered before being committed (fsync) to disk. Default is {DEFAULT_COMMIT_RECORDS}."
+    )
+
+    parser.add_argument(
+        "--commit_interval",
+        default=DEFAULT_COMMIT_INTERVAL,
+        type=float,
+        help=f"Maximum number of seconds a record waits before being committed (fsync) to disk. 0 commits every record. Default is {DEFAULT_COMMIT_INTERVAL}."
+    )
+
+    parser.add_argument(
+        "--binary",
+        default=False,
+        action='store_true',
+        help="Write compact binary (.vtsb) log files instead of JSON lines (.json) log files. Default is False."
+    )
+
+    parser.add_argument(
+        "--verbose",
+        default=False,
+        action='store_true',
+        help="Turn DEBUG logging on. Default is off."
+    )
+
+    parser.add_argument(
+        "--version",
+        default=False,
+        action='store_true',
+        help="Print version number and exit."
+    )
+
+    return vars(parser.parse_args())
+
+def main():
+    """Run main function."""
+
+    args = argument_parsing()
+
+    if args['version']:
+        print(f"Version {__version__}", file=stdout)
+        exit(0)
+
+    verbose = args['verbose']
+    logging_level = logging.DEBUG if verbose else logging.INFO
+
+    logging.basicConfig(stream=stderr, level=logging_level)
+
+    logger.debug(f"argument --verbose: {verbose}")
+    logger.info(f"base path: {args['base_path']}")
+    logger.info(f"applications: {args['applications']}")
+    logger.info(f"commit records {args['commit_records']}, commit interval {args['commit_interval']}")
+    logger.info(f"argument --binary: {args['binary']}")
+
+    try:
+        asyncio.run(collect(args))
+    except KeyboardInterrupt:
+        logger.info("KeyboardInterrupt, stopped")
+
+if __name__ == "__main__":
+    main()
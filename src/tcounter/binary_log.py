@@ -0,0 +1,407 @@
+"""telemetry-counter/tcounter/binary_log.py: compact binary log file format and log file readers"""
+
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from sys import stderr
+
+# Compact binary alternative to JSON lines log files.
+#
+# File layout
+#   header: b"VTSB" + format version byte
+#   entries, each starting with a one byte entry tag:
+#   - NAME_ENTRY:   uint16 name id, uint16 length, UTF-8 bytes
+#                   Interns a command name or dictionary key.  Written just before first use.
+#   - RECORD_ENTRY: uint16 command name id,
+#                   int64 iso_ts_pre and int64 iso_ts_post as microseconds since 1970-01-01 UTC,
+#                   obd_response_value (typed value),
+#                   extra record fields (typed value, dictionary or None)
+#
+# Typed values start with a one byte type code followed by
+#   NONE, FALSE, TRUE:  nothing
+#   INT:                int64
+#   FLOAT:              float64
+#   STRING, BIG_INT:    uint32 length, UTF-8 bytes
+#   LIST:               uint32 count, typed values
+#   DICT:               uint32 count, (uint16 key name id, typed value) pairs
+#
+# All integers are little endian.  Log files are only appended to, so a crash leaves at most
+# one incomplete entry at the end of the file.  Readers stop there, just like they stop at the
+# first corrupted line of a JSON lines file.
+
+BINARY_LOG_MAGIC = b"VTSB"
+BINARY_LOG_VERSION = 1
+BINARY_LOG_HEADER = BINARY_LOG_MAGIC + bytes([BINARY_LOG_VERSION])
+BINARY_LOG_FILE_SUFFIX = ".vtsb"
+JSON_LOG_FILE_SUFFIX = ".json"
+LOG_FILE_SUFFIXES = [JSON_LOG_FILE_SUFFIX, BINARY_LOG_FILE_SUFFIX, ]
+
+NAME_ENTRY = 0x01
+RECORD_ENTRY = 0x02
+
+NONE = 0x00
+FALSE = 0x01
+TRUE = 0x02
+INT = 0x03
+FLOAT = 0x04
+STRING = 0x05
+LIST = 0x06
+DICT = 0x07
+BIG_INT = 0x08
+
+MAX_NAME_ID = 0xFFFF
+NO_TIMESTAMP = -(2**63)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+TIMESTAMP_FIELDS = ['iso_ts_pre', 'iso_ts_post', ]
+
+name_entry_struct = struct.Struct("<BHH")
+record_entry_struct = struct.Struct("<BHqq")
+type_struct = struct.Struct("<B")
+int_struct = struct.Struct("<Bq")
+float_struct = struct.Struct("<Bd")
+length_struct = struct.Struct("<BI")
+name_id_struct = struct.Struct("<H")
+u32_struct = struct.Struct("<I")
+i64_struct = struct.Struct("<q")
+f64_struct = struct.Struct("<d")
+
+class IncompleteEntry(Exception):
+    """Raised when an entry runs past the end of the available data."""
+
+def json_lines_encoder(record:dict) -> str:
+    """Encode a log record as a JSON lines record."""
+    return json.dumps(record) + "\n"
+
+def iso_timestamp_to_microseconds(iso_ts):
+    """Convert an ISO format UTC timestamp string to microseconds since the epoch or None when not possible."""
+    if not isinstance(iso_ts, str):
+        return None
+    try:
+        ts = datetime.fromisoformat(iso_ts)
+    except ValueError:
+        return None
+    if ts.utcoffset() != timedelta(0):
+        # naive and non-UTC timestamps don't survive the round trip
+        return None
+    microseconds = (ts - EPOCH) // ONE_MICROSECOND
+    if microseconds_to_iso_timestamp(microseconds) != iso_ts:
+        # e.g. "Z" instead of "+00:00"
+        return None
+    return microseconds
+
+def microseconds_to_iso_timestamp(microseconds:int) -> str:
+    """Convert microseconds since the epoch to an ISO format UTC timestamp string."""
+    return datetime.isoformat(EPOCH + timedelta(microseconds=microseconds))
+
+class BinaryRecordEncoder():
+    """
+    Encode log records (dictionaries) into the binary log format.
+
+    Encoders are stateful: names are interned the first time they are seen and the file
+    header comes out with the first record.  Use one encoder per output file.
+    """
+    def __init__(self):
+        """Init function."""
+        self.names = {}
+        self.header_written = False
+
+    def name_id(self, name:str, parts:list) -> int:
+        """Return the id for name, adding a name entry to parts the first time name is seen."""
+        try:
+            return self.names[name]
+        except KeyError:
+            pass
+
+        name_id = len(self.names)
+        if name_id > MAX_NAME_ID:
+            raise ValueError(f"more than {MAX_NAME_ID + 1} distinct names")
+
+        encoded_name = name.encode('utf-8')
+        parts.append(name_entry_struct.pack(NAME_ENTRY, name_id, len(encoded_name)))
+        parts.append(encoded_name)
+        self.names[name] = name_id
+
+        return name_id
+
+    def encode_value(self, value, parts:list, values:list):
+        """Encode a typed value.  Name entries go to parts, the value itself to values."""
+        if value is None:
+            values.append(type_struct.pack(NONE))
+        elif value is True:
+            values.append(type_struct.pack(TRUE))
+        elif value is False:
+            values.append(type_struct.pack(FALSE))
+        elif isinstance(value, int):
+            if -(2**63) <= value < 2**63:
+                values.append(int_struct.pack(INT, value))
+            else:
+                encoded_value = str(value).encode('utf-8')
+                values.append(length_struct.pack(BIG_INT, len(encoded_value)))
+                values.append(encoded_value)
+        elif isinstance(value, float):
+            values.append(float_struct.pack(FLOAT, value))
+        elif isinstance(value, str):
+            encoded_value = value.encode('utf-8')
+            values.append(length_struct.pack(STRING, len(encoded_value)))
+            values.append(encoded_value)
+        elif isinstance(value, (list, tuple)):
+            values.append(length_struct.pack(LIST, len(value)))
+            for item in value:
+                self.encode_value(item, parts, values)
+        elif isinstance(value, dict):
+            values.append(length_struct.pack(DICT, len(value)))
+            for key, item in value.items():
+                values.append(name_id_struct.pack(self.name_id(str(key), parts)))
+                self.encode_value(item, parts, values)
+        else:
+            raise TypeError(f"can't encode {type(value)} value {value}")
+
+    def __call__(self, record:dict) -> bytes:
+        """Encode one log record."""
+        parts = []
+        if not self.header_written:
+            parts.append(BINARY_LOG_HEADER)
+            self.header_written = True
+
+        extras = {}
+        timestamps = []
+        for field in TIMESTAMP_FIELDS:
+            microseconds = iso_timestamp_to_microseconds(record.get(field))
+            if microseconds is None:
+                microseconds = NO_TIMESTAMP
+                if field in record:
+                    extras[field] = record[field]
+            timestamps.append(microseconds)
+
+        for key, value in record.items():
+            if key not in ('command_name', 'obd_response_value', 'iso_ts_pre', 'iso_ts_post'):
+                extras[key] = value
+
+        command_name_id = self.name_id(record['command_name'], parts)
+
+        values = [record_entry_struct.pack(RECORD_ENTRY, command_name_id, timestamps[0], timestamps[1])]
+        self.encode_value(record.get('obd_response_value'), parts, values)
+        self.encode_value(extras if extras else None, parts, values)
+
+        return b"".join(parts + values)
+
+class BinaryRecordDecoder():
+    """Decode binary log format entries back into the log records (dictionaries) that were encoded."""
+
+    def __init__(self):
+        """Init function."""
+        self.names = []
+
+    def decode_value(self, data, offset:int) -> tuple:
+        """Decode the typed value at offset, returns (value, next offset)."""
+        if offset >= len(data):
+            raise IncompleteEntry()
+
+        type_code = data[offset]
+        offset += 1
+
+        if type_code == NONE:
+            return None, offset
+        if type_code == TRUE:
+            return True, offset
+        if type_code == FALSE:
+            return False, offset
+        if type_code == INT:
+            return self.unpack(i64_struct, data, offset)[0], offset + 8
+        if type_code == FLOAT:
+            return self.unpack(f64_struct, data, offset)[0], offset + 8
+        if type_code in (STRING, BIG_INT):
+            length = self.unpack(u32_struct, data, offset)[0]
+            offset += 4
+            if offset + length > len(data):
+                raise IncompleteEntry()
+            value = bytes(data[offset:offset + length]).decode('utf-8')
+            return (int(value) if type_code == BIG_INT else value), offset + length
+        if type_code == LIST:
+            count = self.unpack(u32_struct, data, offset)[0]
+            offset += 4
+            value = []
+            for _ in range(count):
+                item, offset = self.decode_value(data, offset)
+                value.append(item)
+            return value, offset
+        if type_code == DICT:
+            count = self.unpack(u32_struct, data, offset)[0]
+            offset += 4
+            value = {}
+            for _ in range(count):
+                name_id = self.unpack(name_id_struct, data, offset)[0]
+                item, offset = self.decode_value(data, offset + 2)
+                value[self.names[name_id]] = item
+            return value, offset
+
+        raise ValueError(f"unknown value type code {type_code} at offset {offset - 1}")
+
+    def unpack(self, entry_struct, data, offset:int) -> tuple:
+        """struct.unpack_from() raising IncompleteEntry when data runs out."""
+        if offset + entry_struct.size > len(data):
+            raise IncompleteEntry()
+        return entry_struct.unpack_from(data, offset)
+
+    def decode_entry(self, data, offset:int) -> tuple:
+        """Decode the entry at offset, returns (record or None for name entries, next offset)."""
+        entry_tag = data[offset]
+
+        if entry_tag == NAME_ENTRY:
+            _, name_id, length = self.unpack(name_entry_struct, data, offset)
+            offset += name_entry_struct.size
+            if offset + length > len(data):
+                raise IncompleteEntry()
+            if name_id != len(self.names):
+                raise ValueError(f"name id {name_id} out of sequence at offset {offset}")
+            self.names.append(bytes(data[offset:offset + length]).decode('utf-8'))
+            return None, offset + length
+
+        if entry_tag == RECORD_ENTRY:
+            _, command_name_id, ts_pre, ts_post = self.unpack(record_entry_struct, data, offset)
+            obd_response_value, offset = self.decode_value(data, offset + record_entry_struct.size)
+            extras, offset = self.decode_value(data, offset)
+
+            record = {
+                'command_name': self.names[command_name_id],
+                'obd_response_value': obd_response_value,
+            }
+            if ts_pre != NO_TIMESTAMP:
+                record['iso_ts_pre'] = microseconds_to_iso_timestamp(ts_pre)
+            if ts_post != NO_TIMESTAMP:
+                record['iso_ts_post'] = microseconds_to_iso_timestamp(ts_post)
+            if extras:
+                record.update(extras)
+
+            return record, offset
+
+        raise ValueError(f"unknown entry tag {entry_tag} at offset {offset}")
+
+def read_binary_log(binary_input, verbose:bool=False, chunk_size:int=1048576):
+    """
+    Generator yielding log records from a binary log file opened in binary mode.
+    Stops at the first incomplete or corrupted entry.
+    """
+    header = binary_input.read(len(BINARY_LOG_HEADER))
+    if header != BINARY_LOG_HEADER:
+        if verbose:
+            print(f"Not a version {BINARY_LOG_VERSION} binary log file: header {header}", file=stderr)
+        return
+
+    decoder = BinaryRecordDecoder()
+    data = b""
+
+    while chunk := binary_input.read(chunk_size):
+        data = data + chunk if data else chunk
+        offset = 0
+
+        while offset < len(data):
+            try:
+                record, next_offset = decoder.decode_entry(data, offset)
+            except IncompleteEntry:
+                break
+            except (ValueError, IndexError, UnicodeDecodeError) as e:
+                if verbose:
+                    print(f"Corrupted binary log info:\n{e}", file=stderr)
+                return
+
+            offset = next_offset
+            if record is not None:
+                yield record
+
+        data = data[offset:]
+
+    if data and verbose:
+        print(f"Incomplete binary log entry at end of file ({len(data)} bytes)", file=stderr)
+
+def get_binary_log_valid_length(log_file_path) -> int:
+    """Return the number of bytes at the start of a binary log file holding complete entries."""
+    with open(log_file_path, "rb") as binary_input:
+        data = binary_input.read()
+
+    if not data.startswith(BINARY_LOG_HEADER):
+        return 0
+
+    decoder = BinaryRecordDecoder()
+    offset = len(BINARY_LOG_HEADER)
+    while offset < len(data):
+        try:
+            _, offset = decoder.decode_entry(data, offset)
+        except (IncompleteEntry, ValueError, IndexError, UnicodeDecodeError):
+            break
+
+    return offset
+
+def is_binary_log_file(log_file_path) -> bool:
+    """True when the file starts with the binary log file magic number."""
+    with open(log_file_path, "rb") as log_file:
+        return log_file.read(len(BINARY_LOG_MAGIC)) == BINARY_LOG_MAGIC
+
+def read_json_log(json_input, verbose:bool=False):
+    """
+    Generator yielding log records from a JSON lines log file opened in text mode.
+    Stops at the first corrupted line.
+    """
+    for line_number, json_record in enumerate(json_input, start=1):
+        try:
+            record = json.loads(json_record)
+        except json.decoder.JSONDecodeError as e:
+            # improperly closed JSON file
+            if verbose:
+                print(f"Corrupted JSON info line {line_number}:\n{e}", file=stderr)
+            return
+
+        yield record
+
+def read_log_records(log_file_path, verbose:bool=False):
+    """
+    Generator yielding log records (dictionaries) from JSON lines or binary log files.
+    Stops at the first corrupted record, e.g. an improperly closed file.
+    """
+    if is_binary_log_file(log_file_path):
+        with open(log_file_path, "rb") as binary_input:
+            yield from read_binary_log(binary_input, verbose=verbose)
+    else:
+        with open(log_file_path, "r") as json_input:
+            yield from read_json_log(json_input, verbose=verbose)
+
+def load_log_records(log_file_path, verbose:bool=False) -> list:
+    """
+    read_log_records() as a list.  JSON lines files are parsed with a single json.loads() call
+    instead of one call per line, falling back to line by line parsing to find where a
+    corrupted file stops.
+    """
+    if is_binary_log_file(log_file_path):
+        return list(read_log_records(log_file_path, verbose=verbose))
+
+    with open(log_file_path, "r") as json_input:
+        lines = json_input.read().split("\n")
+
+    if lines and not lines[-1]:
+        # line feed at the end of the last record
+        lines.pop()
+
+    try:
+        return json.loads("[" + ",".join(lines) + "]")
+    except json.decoder.JSONDecodeError:
+        return list(read_json_log(lines, verbose=verbose))
+
+def strip_log_file_suffix(log_file_name:str) -> str:
+    """Remove the .json or .vtsb suffix from a log file name."""
+    for suffix in LOG_FILE_SUFFIXES:
+        if log_file_name.endswith(suffix):
+            return log_file_name[:-len(suffix)]
+    return log_file_name
+
+def glob_log_files(path, pattern:str) -> list:
+    """
+    Path(path).glob() for log files in any format.
+    pattern leaves out the suffix, e.g. "**/*{vin}*" instead of "**/*{vin}*.json".
+    """
+    return [
+        log_file_path
+        for suffix in LOG_FILE_SUFFIXES
+        for log_file_path in Path(path).glob(pattern + suffix)
+    ]
@@ -112,19 +112,19 @@ def get_next_application_counter_value(application_id:str)->int:
 def get_next_boot_counter_value()->int:
     return get_next_application_counter_value(SYSTEM_BOOT_COUNT_APPLICATION_NAME)
 
-def get_output_file_name(application_id:str, vin:str=None, base_path=BASE_PATH) -> Path:
+def get_output_file_name(application_id:str, vin:str=None, base_path=BASE_PATH, file_suffix:str=".json") -> Path:
     # sourcery skip: collection-into-set
-    """Create output file name."""
+    """Create output file name.  file_suffix is ".vtsb" for binary log files."""
     application_counter_value = get_application_counter_value(application_id)
     boot_count_string =  (f"{get_boot_count():10d}").replace(' ', '0')
     counter_string = (f"{application_counter_value:10d}").replace(' ', '0')
 
     # - for telemetry-obd data
     if vin and application_id in ['obd', 'obd-cmd-test']:
-        return Path(f"{base_path}/{HOST_ID}/{HOST_ID}-{boot_count_string}-{application_id}-{vin}-{counter_string}.json")
+        return Path(f"{base_path}/{HOST_ID}/{HOST_ID}-{boot_count_string}-{application_id}-{vin}-{counter_string}{file_suffix}")
 
     # - for telemetry-wthr, telemetry-gps, telemetry-imu, telemetry-trlr data
-    return Path(f"{base_path}/{HOST_ID}/{HOST_ID}-{boot_count_string}-{application_id}-{counter_string}.json")
+    return Path(f"{base_path}/{HOST_ID}/{HOST_ID}-{boot_count_string}-{application_id}-{counter_string}{file_suffix}")
 
 try:
     # Not making UltraDict a requirement.
@@ -0,0 +1,296 @@
+"""telemetry-counter/tcounter/log_writer.py: group commit log file writer used by the logger applications"""
+
+import logging
+import json
+import re
+import signal
+import sys
+from os import fsync, replace, remove
+from pathlib import Path
+from threading import Lock, Thread, Event
+from time import monotonic
+
+from .binary_log import (
+    BINARY_LOG_MAGIC,
+    BINARY_LOG_FILE_SUFFIX,
+    JSON_LOG_FILE_SUFFIX,
+    get_binary_log_valid_length,
+    json_lines_encoder,
+)
+
+# defaults
+DEFAULT_COMMIT_RECORDS = 100        # records buffered before a forced commit
+DEFAULT_COMMIT_INTERVAL = 1.0       # seconds, upper bound on uncommitted data age
+TAIL_MARKER_SUFFIX = ".tail"
+
+# tcounter.common.get_output_file_name() log file names,
+#   <hostname>-<boot_count>-<application_id>-[<vin>-]<application_count><suffix>
+LOG_FILE_NAME_PATTERN = (
+    r"^.+-\d{{10}}-{application_id}-([A-Za-z0-9_]+-)?\d{{10}}"
+    rf"({re.escape(JSON_LOG_FILE_SUFFIX)}|{re.escape(BINARY_LOG_FILE_SUFFIX)})$"
+)
+
+logger = logging.getLogger("log_writer")
+
+def get_tail_marker_path(log_file_path) -> Path:
+    """Return the path to the tail marker file belonging to a log file."""
+    log_file_path = Path(log_file_path)
+    return log_file_path.with_name(log_file_path.name + TAIL_MARKER_SUFFIX)
+
+def repair_log_file(log_file_path) -> int:
+    """
+    Repair a log file left behind by a crashed logger.
+
+    A tail marker file only exists while a log file is being written.  When one is found,
+    anything after the last complete record (a partial line) is truncated away.  Records
+    committed after the last tail marker update are kept so long as they are complete.
+    Binary log files are truncated after the last complete entry instead.
+    Returns the number of bytes removed.
+    """
+    log_file_path = Path(log_file_path)
+    tail_marker_path = get_tail_marker_path(log_file_path)
+
+    if not tail_marker_path.is_file():
+        return 0
+
+    with open(tail_marker_path, "r", encoding='utf-8') as tail_marker_file:
+        try:
+            committed_bytes = json.load(tail_marker_file)['committed_bytes']
+        except (json.decoder.JSONDecodeError, KeyError):
+            committed_bytes = 0
+
+    with open(log_file_path, "r+b") as log_file:
+        file_size = log_file.seek(0, 2)
+        end = file_size
+
+        log_file.seek(0)
+        if log_file.read(len(BINARY_LOG_MAGIC)) == BINARY_LOG_MAGIC:
+            end = get_binary_log_valid_length(log_file_path)
+            committed_bytes = end
+
+        # scan backwards for the last record separator at or after the committed offset
+        while end > committed_bytes:
+            log_file.seek(end - 1)
+            if log_file.read(1) == b"\n":
+                break
+            end -= 1
+
+        end = max(end, min(committed_bytes, file_size))
+        log_file.truncate(end)
+        log_file.flush()
+        fsync(log_file.fileno())
+
+    remove(tail_marker_path)
+
+    if file_size != end:
+        logger.warning(f"repair_log_file(): removed {file_size - end} bytes from {log_file_path}")
+
+    return file_size - end
+
+def repair_log_files(application_id:str, log_file_directory, exclude=None) -> int:
+    """
+    Repair application_id's log files in log_file_directory that still have tail markers,
+    left behind by earlier runs that crashed (see repair_log_file()).  Only safe at application
+    start-up, when no earlier run of the same application can still be writing.
+    exclude is a log file path to leave alone, e.g. the one just opened.
+    Returns the number of log files repaired.
+    """
+    log_file_name_pattern = re.compile(LOG_FILE_NAME_PATTERN.format(application_id=re.escape(application_id)))
+    exclude_name = Path(exclude).name if exclude else None
+    repaired = 0
+
+    for tail_marker_path in Path(log_file_directory).glob(f"*{TAIL_MARKER_SUFFIX}"):
+        log_file_path = tail_marker_path.with_name(tail_marker_path.name[:-len(TAIL_MARKER_SUFFIX)])
+        if log_file_path.name == exclude_name or not log_file_name_pattern.match(log_file_path.name):
+            continue
+
+        try:
+            if log_file_path.is_file():
+                repair_log_file(log_file_path)
+                logger.info(f"repair_log_files(): repaired {log_file_path}")
+                repaired += 1
+            else:
+                # the log file was moved or removed, the tail marker is of no use
+                remove(tail_marker_path)
+        except OSError as e:
+            # never keep a logger from starting
+            logger.error(f"repair_log_files(): {log_file_path}: {e}")
+
+    return repaired
+
+def exit_on_sigterm():
+    """
+    Make SIGTERM (kill, system shutdown) raise SystemExit in the main thread like
+    KeyboardInterrupt does for SIGINT, so loggers close their DurableLogWriter and
+    waiting records get committed.
+    """
+    def sigterm_handler(signal_number, frame):
+        sys.exit(128 + signal_number)
+
+    signal.signal(signal.SIGTERM, sigterm_handler)
+
+class DurableLogWriter():
+    """
+    Group commit writer for JSON lines and binary log files.
+
+    Instead of flush() and fsync() after every record, records are buffered and committed
+    to disk together when either commit_records records are waiting or the oldest waiting
+    record is commit_interval seconds old.  A background thread makes sure waiting records
+    get committed on time even when the application stops writing, so at most
+    commit_interval seconds of data is lost on power failure.
+
+    After each commit, the committed byte count is saved in a tail marker file next to
+    the log file (see repair_log_file()).  The tail marker is removed on close().
+
+    A commit_interval of 0 commits every record, the same as flush()/fsync() per record.
+
+    With repair_application_id, that application's log files in the same directory left
+    behind by crashed earlier runs are repaired first (see repair_log_files()).
+
+    With background_commit False no thread is started and the application calls
+    commit_if_due() at least every commit_interval / 2 seconds instead, e.g. from an
+    event loop writing several log files.
+
+    write_record() encodes records with encoder, JSON lines by default.  Pass a
+    binary_log.BinaryRecordEncoder() and a file handle opened in binary mode for binary log files.
+    """
+    log_file_handle = None
+    commit_records = DEFAULT_COMMIT_RECORDS
+    commit_interval = DEFAULT_COMMIT_INTERVAL
+    record_count = 0
+    commit_count = 0
+
+    def __init__(
+        self,
+        log_file_handle,
+        commit_records:int=DEFAULT_COMMIT_RECORDS,
+        commit_interval:float=DEFAULT_COMMIT_INTERVAL,
+        encoder=json_lines_encoder,
+        background_commit:bool=True,
+        repair_application_id:str=None,
+    ):
+        """
+        DurableLogWriter constructor
+        arguments
+            log_file_handle
+                file handle opened for writing, usually in 'x' mode
+            commit_records
+                maximum number of records waiting for commit
+            commit_interval
+                maximum number of seconds a record waits for commit
+            encoder
+                callable converting a record dictionary to str (text mode) or bytes (binary mode)
+            background_commit
+                commit waiting records from a background thread, otherwise see commit_if_due()
+            repair_application_id
+                application id whose crashed log files are repaired, None repairs nothing
+        """
+        if repair_application_id:
+            repair_log_files(repair_application_id, Path(log_file_handle.name).parent, exclude=log_file_handle.name)
+
+        self.log_file_handle = log_file_handle
+        self.commit_records = max(1, commit_records)
+        self.commit_interval = max(0.0, commit_interval)
+        self.encoder = encoder
+        self._empty = b"" if 'b' in getattr(log_file_handle, 'mode', '') else ""
+        self.tail_marker_path = get_tail_marker_path(log_file_handle.name)
+        self.committed_bytes = log_file_handle.tell()
+        self._buffer = []
+        self._oldest = None
+        self._lock = Lock()
+        self._closed = Event()
+        self._committer = None
+
+        if background_commit and self.commit_interval > 0 and self.commit_records > 1:
+            self._committer = Thread(target=self._commit_loop, name="log_writer", daemon=True)
+            self._committer.start()
+
+    @property
+    def name(self) -> str:
+        """Log file name."""
+        return self.log_file_handle.name
+
+    def write_record(self, record:dict):
+        """Encode and buffer one record."""
+        self.write(self.encoder(record))
+
+    def write(self, record):
+        """Buffer one encoded record (e.g. a complete line) and commit when a commit budget is used up."""
+        with self._lock:
+            if not self._buffer:
+                self._oldest = monotonic()
+            self._buffer.append(record)
+            self.record_count += 1
+
+            if (
+                len(self._buffer) >= self.commit_records or
+                monotonic() - self._oldest >= self.commit_interval
+            ):
+                self._commit()
+
+    def commit(self):
+        """Write all waiting records to disk."""
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        """Write waiting records, flush, fsync and update the tail marker.  Caller holds the lock."""
+        if not self._buffer:
+            return
+
+        self.log_file_handle.write(self._empty.join(self._buffer))
+        self.log_file_handle.flush()
+        fsync(self.log_file_handle.fileno())
+
+        self.committed_bytes = self.log_file_handle.tell()
+        self.commit_count += 1
+        self._buffer = []
+        self._oldest = None
+
+        self._save_tail_marker()
+
+    def _save_tail_marker(self):
+        """Atomically replace the tail marker with the current committed byte count."""
+        temporary_path = self.tail_marker_path.with_name(self.tail_marker_path.name + ".tmp")
+        with open(temporary_path, "w", encoding='utf-8') as tail_marker_file:
+            tail_marker_file.write(json.dumps({
+                'committed_bytes': self.committed_bytes,
+                'committed_records': self.record_count,
+            }))
+        replace(temporary_path, self.tail_marker_path)
+
+    def commit_if_due(self):
+        """Write waiting records to disk when the oldest has waited commit_interval seconds."""
+        with self._lock:
+            if self._buffer and monotonic() - self._oldest >= self.commit_interval:
+                self._commit()
+
+    def _commit_loop(self):
+        """Background thread committing records that have waited commit_interval seconds."""
+        while not self._closed.wait(self.commit_interval / 2):
+            self.commit_if_due()
+
+    def close(self):
+        """Commit waiting records, close the log file and remove the tail marker."""
+        if self._closed.is_set():
+            return
+
+        self._closed.set()
+        if self._committer:
+            self._committer.join()
+
+        with self._lock:
+            self._commit()
+            self.log_file_handle.close()
+
+        if self.tail_marker_path.is_file():
+            remove(self.tail_marker_path)
+
+        logger.info(f"close(): {self.name} {self.record_count} records in {self.commit_count} commits")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -1,11 +1,26 @@
 # telemetry-analysis/telemetry_analysis/common.py
 
 from pathlib import Path
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from itertools import islice
+from itertools import islice, repeat
 from numpy import arctan2, sin, cos
+import pandas as pd
 from private.vehicles import vehicles
-from csv import DictReader
+from csv import DictReader, DictWriter
+
+from obd_log_to_csv.columnar import (
+    CSV_FILE_SUFFIX,
+    PARQUET_FILE_SUFFIX,
+    ParquetDictWriter,
+    is_parquet_file,
+    read_parquet_rows,
+    read_parquet_columns,
+    read_parquet_data_frames,
+    get_parquet_column_names,
+)
+
+from obd_log_to_csv.build_manifest import get_build_manifest, normalized_parameters
 
 from u_tools.file_system_info import get_file_system_mount_points
 
@@ -149,11 +164,15 @@ def get_column_names_in_csv_file(file_name:str):
     Assumes
         - column names are on the first line of the CSV file
         - column names are comma separated.
+    Parquet files get their column names and row count from the file's metadata.
     
     Returns sequence of
         - list of column names
         - number of data rows in the file
     """
+    if is_parquet_file(file_name):
+        return get_parquet_column_names(file_name)
+
     record_count = 0
     column_names = None
     with open(file_name) as fd:
@@ -166,6 +185,182 @@ def get_column_names_in_csv_file(file_name:str):
 
     return column_names, record_count
 
+def glob_study_files(directory:str, pattern:str) -> list:
+    """
+    Sorted list of CSV and Parquet files in directory matching the glob pattern (without suffix).
+    When both a CSV and a Parquet version of a file exist, only the Parquet file is listed.
+    """
+    study_files = {}
+    for suffix in [CSV_FILE_SUFFIX, PARQUET_FILE_SUFFIX, ]:
+        for study_file in Path(directory).glob(pattern + suffix):
+            study_files[study_file.with_suffix('')] = study_file
+
+    return [study_files[stem] for stem in sorted(study_files)]
+
+def read_study_file_rows(file_name):
+    """
+    Generator returning the rows of a CSV file or a Parquet file as dictionaries.
+    CSV values are strings while Parquet values keep their types (None for missing values).
+    """
+    if is_parquet_file(file_name):
+        yield from read_parquet_rows(file_name)
+        return
+
+    with open(file_name, "r") as csv_file:
+        yield from DictReader(csv_file)
+
+def read_study_file_columns(file_name, columns:list) -> dict:
+    """
+    Dictionary of column name: sequence of values for those of columns in a CSV or Parquet file.
+    As with read_study_file_rows(), CSV values are strings ('' when missing) while Parquet
+    values keep their types (None for missing values).
+    """
+    if is_parquet_file(file_name):
+        return read_parquet_columns(file_name, columns)
+
+    csv_data = pd.read_csv(file_name, usecols=lambda column: column in columns, dtype=str, na_filter=False)
+    return {column: csv_data[column].to_numpy(dtype=object) for column in csv_data.columns}
+
+def read_study_data(file_name:str, columns:list=None, parse_dates:list=None) -> pd.DataFrame:
+    """
+    Read a CSV or Parquet study data file into a DataFrame, only reading columns when given.
+    Parquet columns are already typed so parse_dates only applies to CSV files.
+    """
+    if is_parquet_file(file_name):
+        return pd.read_parquet(file_name, columns=columns)
+
+    # ISO8601 since timestamps without fractional seconds are written without them
+    return pd.read_csv(file_name, usecols=columns, parse_dates=parse_dates,
+                        date_format='ISO8601' if parse_dates else None)
+
+def read_study_data_chunks(file_name:str, columns:list=None, chunk_rows:int=100000):
+    """
+    Generator returning a CSV or Parquet study data file as DataFrames of up to chunk_rows rows,
+    only reading columns when given.
+    """
+    if is_parquet_file(file_name):
+        yield from read_parquet_data_frames(file_name, columns=columns, batch_rows=chunk_rows)
+        return
+
+    with pd.read_csv(file_name, usecols=columns, chunksize=chunk_rows) as reader:
+        yield from reader
+
+class StudyDataCSVWriter(DictWriter):
+    """csv.DictWriter with the writecolumns() and checkpoint() methods of ParquetDictWriter."""
+    def __init__(self, f, *args, **kwargs):
+        """Init function."""
+        super().__init__(f, *args, **kwargs)
+        self.output = f
+
+    def writecolumns(self, columns:dict):
+        """
+        Write a dictionary of column name: sequence of values (all the same length) as rows.
+        Columns not in the dictionary are written as restval.
+        """
+        self.writer.writerows(zip(*(
+            columns[fieldname] if fieldname in columns else repeat(self.restval)
+            for fieldname in self.fieldnames
+        )))
+
+    def checkpoint(self) -> int:
+        """File position after the rows written so far, for study_data_writer() resume."""
+        self.output.flush()
+        return self.output.tell()
+
+@contextmanager
+def study_data_writer(file_name:str, fieldnames:list, int_columns:list=(), resume:int=None):
+    """
+    Context manager returning a StudyDataCSVWriter (csv.DictWriter) with the header already written or,
+    when file_name ends in ".parquet", a ParquetDictWriter with int_columns as int64,
+    'iso_ts_pre' and 'iso_ts_post' as timestamps and all other columns as float64.
+    resume is a writer.checkpoint() value from an earlier write of file_name.  The rows written
+    before that checkpoint are kept and new rows are written after them.
+    """
+    if is_parquet_file(file_name):
+        with ParquetDictWriter(file_name, fieldnames, int_columns=int_columns, resume_rows=resume) as writer:
+            yield writer
+        return
+
+    if resume is not None:
+        with open(file_name, "r+") as csv_output:
+            csv_output.seek(resume)
+            csv_output.truncate()
+            yield StudyDataCSVWriter(csv_output, fieldnames=fieldnames, escapechar="\\")
+        return
+
+    with open(file_name, "w") as csv_output:
+        writer = StudyDataCSVWriter(csv_output, fieldnames=fieldnames, escapechar="\\")
+        writer.writeheader()
+        yield writer
+
+def update_study_file(
+    output_file_name,
+    fieldnames:list,
+    int_columns:list,
+    input_files:list,
+    parameters,
+    file_columns,
+    force_save=False,
+    report_file=None,
+) -> tuple:
+    """
+    Create or bring up to date a study file made of one route per input file.
+
+    file_columns(input_files) returns, in order, a dictionary of column name: sequence of values
+    for each of the input files given to it, without the 'i' (row number) and 'route' columns.
+    report_file(route, input_file, row_count), when given, is called after each file is written.
+
+    The output file's build manifest (see obd_log_to_csv.build_manifest) records the input files
+    and parameters the output was made from.  When parameters are unchanged, the rows of the
+    leading input files that haven't changed are kept and only the rest are computed and added,
+    so adding new (later) input files only computes the new files.
+    An existing output file missing from the manifest is left alone unless force_save is set,
+    force_save always rebuilds the whole file.
+
+    Returns (total row count, route count, routes kept), None when the output file was left alone.
+    """
+    manifest = get_build_manifest(Path(output_file_name).parent)
+    entry = manifest.entry(output_file_name)
+
+    if entry is None and Path(output_file_name).is_file() and not force_save and not manifest.is_recorded(output_file_name):
+        return None
+
+    kept_sources = []
+    updatable = entry is not None and not force_save and entry['parameters'] == normalized_parameters(parameters)
+    if updatable:
+        kept_sources = entry['sources'][:manifest.unchanged_sources(output_file_name, entry, input_files)]
+
+    details = [{'rows': source['rows'], 'checkpoint': source['checkpoint'], } for source in kept_sources]
+    route_counter = len(details)
+    row_counter = sum(detail['rows'] for detail in details)
+
+    if updatable and route_counter == len(input_files) == len(entry['sources']):
+        return row_counter, route_counter, route_counter
+
+    # stamped before computing, an input file changing meanwhile is computed again next time
+    source_stamps = manifest.source_stamps(output_file_name, input_files)
+
+    resume = details[-1]['checkpoint'] if details else None
+    with study_data_writer(output_file_name, fieldnames, int_columns=int_columns, resume=resume) as writer:
+        for input_file, columns in zip(input_files[route_counter:], file_columns(input_files[route_counter:])):
+            route_counter += 1
+            line_number = len(next(iter(columns.values()))) if columns else 0
+
+            # each row in the union of all input files has a unique row number 'i'
+            columns['i'] = list(range(row_counter + 1, row_counter + line_number + 1))
+            columns['route'] = [route_counter] * line_number
+            row_counter += line_number
+
+            writer.writecolumns(columns)
+            details.append({'rows': line_number, 'checkpoint': writer.checkpoint(), })
+
+            if report_file is not None:
+                report_file(route_counter, input_file, line_number)
+
+    manifest.record(output_file_name, source_stamps, parameters, details=details)
+
+    return row_counter, route_counter, len(kept_sources)
+
 def within_timeframe(td:timedelta, datetime1:datetime, datetime2:datetime) -> bool:
     """
     Return true if datetime1 is within td of datetime2 otherwise false
@@ -8,6 +8,10 @@ from private.vehicles import vehicles
 from .common import data_file_base_directory, work_product_file_path, temporary_file_base_directory
 from .vins import fake_vin
 
+from tcounter.binary_log import strip_log_file_suffix
+from obd_log_to_csv.data_file_catalog import get_data_file_catalog
+from obd_log_to_csv.build_manifest import get_build_manifest
+from obd_log_to_csv.columnar import CSV_FILE_SUFFIX, output_file_suffix
 from obd_log_to_csv.obd_log_evaluation import input_file as obd_log_evaluation_input_file
 from obd_log_to_csv.obd_log_evaluation import rich_output as obd_log_evaluation_rich_output
 from obd_log_to_csv.obd_log_to_csv import main as obd_log_to_csv_main
@@ -24,57 +28,71 @@ def sort_key_on_timestamp(file_path:str) -> str:
     file_name = (file_path.split('/'))[-1]
     return ((file_name.split('-'))[-2:-1])[0]
 
-def obd_to_csv_file_name(obd_file_name:str)->str:
+def obd_to_csv_file_name(obd_file_name:str, suffix:str=CSV_FILE_SUFFIX)->str:
     # convert OBD data file name into csv file name
     # from TEST form "../../telemetry-obd/data/{vin}/{vin}-TEST-20221102183723-utc.json"
     #   to TEST form "{vin}-TEST-20221102183723-utc.json"
     # from Normal form "../../telemetry-obd/data/{vin}/{vin}-20221030145832-utc.json"
     #   to Normal form "{vin}-20221030145832-utc.json"
+    # suffix is ".csv" or ".parquet"
     obd_file = (obd_file_name.split('/'))[-1]
-    return obd_file.replace('.json', '.csv')
+    return strip_log_file_suffix(obd_file) + suffix
 
 def quotes_around_string(command:str, single_quote="'")->str:
     return (single_quote + command + single_quote)
 
-def obd_to_csv(vin:str, columns:list, study="gear", verbose=False):
+def obd_to_csv(vin:str, columns:list, study="gear", verbose=False, output_format='csv'):
     # make temporary directory
     temporary_file_directory = f"{temporary_file_base_directory}/{vin}/{study}"
     Path(temporary_file_directory).mkdir(parents=True, exist_ok=True)
     create_count = 0
+    replace_count = 0
     skip_count = 0
 
     console.print(f"{vehicles[vin]['name']} Generating CSV Files in {temporary_file_directory}")
 
     # Make a list of OBD data files.
-    # directory where "*.json" OBD data files are held
-    root = Path(data_file_base_directory)
-    obd_files = [str(rp) for rp in root.rglob(f"*{vin}*.json") if rp.is_file() and 'integrated' not in rp.name]    
+    # directory where "*.json" and "*.vtsb" OBD data files are held
+    obd_files = [str(rp) for rp in get_data_file_catalog(data_file_base_directory).files(vin=vin)]
 
     # Make a sorted list of OBD data files.
     # obd_files = sorted(obd_files, key=sort_key_on_timestamp)
 
+    # CSV files are rebuilt when their OBD data file or columns change
+    manifest = get_build_manifest(temporary_file_directory)
+    parameters = {'columns': columns, 'output_format': output_format, }
+
     for obd_file in obd_files:
         # generate CSV version of OBD data file
-        output_file_name = Path(temporary_file_directory) / Path(obd_to_csv_file_name(obd_file)).name
+        output_file_name = Path(temporary_file_directory) / Path(obd_to_csv_file_name(obd_file, output_file_suffix(output_format))).name
 
-        # Only (re)generate when the file doesn't already exist
-        if (Path(output_file_name)).is_file():
+        # Only (re)generate when the file doesn't already exist or is out of date
+        if manifest.is_current(output_file_name, [obd_file, ], parameters):
             if verbose:
                 fake_name = (str(output_file_name)).replace(vin, fake_vin)
                 console.print(f"CSV file for {vehicles[vin]['name']} {fake_name} already exists - skipping...")
             skip_count += 1
             continue
 
-        obd_log_to_csv_main(json_input_files=[obd_file, ], csv_output_file_name=output_file_name, commands=columns)
+        if (Path(output_file_name)).is_file():
+            replace_count += 1
+        else:
+            create_count += 1
+
+        # stamped before converting, an OBD file still being written is converted again next time
+        source_stamps = manifest.source_stamps(output_file_name, [obd_file, ])
+        obd_log_to_csv_main(json_input_files=[obd_file, ], csv_output_file_name=output_file_name, commands=columns,
+                            output_format=output_format)
+        manifest.record(output_file_name, source_stamps, parameters)
         if verbose:
             fake_name = (str(output_file_name)).replace(vin, fake_vin)
             console.print(f"CSV file for {vehicles[vin]['name']} {fake_name} created")
-        create_count +=1
 
-    console.print(f"\tCreated {create_count}\n\tSkipped {skip_count}\n")
+    console.print(f"\tCreated {create_count}\n\tReplaced {replace_count}\n\tSkipped {skip_count}\n")
 
 
-def integrated_to_csv(vin:str, columns:list, study:str ="fuel", integrated_files:list | None =None, verbose=False):
+def integrated_to_csv(vin:str, columns:list, study:str ="fuel", integrated_files:list | None =None, verbose=False,
+                      output_format:str ='csv'):
     """
     Transforms lists of JSON "integrated" files into CSV files using obd_log_to_csv
     The output CSV file name is based on "study" variable.
@@ -82,6 +100,7 @@ def integrated_to_csv(vin:str, columns:list, study:str ="fuel", integrated_files
     Otherwise, the list of files used to create the CSV file is limited to "integrated_files".
     "integrated_files should include the full path to each file.
     Output CSV records are defined by the "columns" list.  This list would include all "command_name"s.
+    When "output_format" is 'parquet', typed Parquet files are written instead of CSV files.
     """
 
     # make temporary directory
@@ -95,37 +114,39 @@ def integrated_to_csv(vin:str, columns:list, study:str ="fuel", integrated_files
 
     # make list of integrated files
     if not integrated_files:
-        integrated_files = list(
-            Path(data_file_base_directory).glob(f"**/*integrated-{vin}.json")
-        )
-
-    for integrated_file in integrated_files:
-        csv_integrated_file = Path(temporary_file_directory) / Path(obd_to_csv_file_name(integrated_file.name))
+        integrated_files = get_data_file_catalog(data_file_base_directory).files(vin=vin, integrated=True)
 
-        if not csv_integrated_file.exists():
-            # create CSV file
-            create_count += 1
-            if verbose:
-                console.print(
-                    f"Converting {integrated_file.name.replace(vin, '<vin>')} to {csv_integrated_file.name.replace(vin, '<vin>')}"
-                )
-            obd_log_to_csv_main(json_input_files=[integrated_file, ], csv_output_file_name=csv_integrated_file, commands=columns)
+    # CSV files are rebuilt when their integrated file or columns change
+    manifest = get_build_manifest(temporary_file_directory)
+    parameters = {'columns': columns, 'output_format': output_format, }
 
-        elif integrated_file.stat().st_mtime > csv_integrated_file.stat().st_mtime:
-            # JSON file changed, need to update CSV file
-            replace_count += 1
-            if verbose:
-                console.print(
-                    f"Converting {integrated_file.name.replace(vin, '<vin>')} to {csv_integrated_file.name.replace(vin, '<vin>')}"
-                )
-            obd_log_to_csv_main(json_input_files=[integrated_file, ], csv_output_file_name=csv_integrated_file, commands=columns)
+    for integrated_file in integrated_files:
+        csv_integrated_file = Path(temporary_file_directory) / Path(obd_to_csv_file_name(integrated_file.name, output_file_suffix(output_format)))
 
-        else:
+        if manifest.is_current(csv_integrated_file, [integrated_file, ], parameters):
             # no need to recreate
             skip_count += 1
             if verbose:
                 console.print(
                     f"Skipping {integrated_file.name.replace(vin, '<vin>')} to {csv_integrated_file.name.replace(vin, '<vin>')}"
                 )
+            continue
+
+        if not csv_integrated_file.exists():
+            # create CSV file
+            create_count += 1
+        else:
+            # JSON file or columns changed, need to update CSV file
+            replace_count += 1
+
+        if verbose:
+            console.print(
+                f"Converting {integrated_file.name.replace(vin, '<vin>')} to {csv_integrated_file.name.replace(vin, '<vin>')}"
+            )
+        # stamped before converting, see obd_to_csv()
+        source_stamps = manifest.source_stamps(csv_integrated_file, [integrated_file, ])
+        obd_log_to_csv_main(json_input_files=[integrated_file, ], csv_output_file_name=csv_integrated_file, commands=columns,
+                            output_format=output_format)
+        manifest.record(csv_integrated_file, source_stamps, parameters)
 
     console.print(f"\tCreated {create_count}\n\tReplaced {replace_count}\n\tSkipped {skip_count}\n")
@@ -4,15 +4,17 @@
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-import csv
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from os import cpu_count
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from rich.console import Console
 from rich.jupyter import print
 from rich.pretty import pprint
 from rich.table import Table
-from math import sqrt, atan2, tan, pi, radians, ceil
+from math import sqrt, atan2, tan, pi, ceil
 from haversine import haversine
 
 import pandas as pd
@@ -26,6 +28,7 @@ from telemetry_analysis.theta import (
     generate_theta_data_from_vehicle,
     write_theta_data_file,
     signed_point_to_theta_line_distance,
+    classify_gears,
 )
 from telemetry_analysis.reports import (
     basic_stats_table_generator,
@@ -46,6 +49,10 @@ from telemetry_analysis.common import (
     heading,
     fuel_grams_to_milliliters,
     get_column_names_in_csv_file,
+    glob_study_files,
+    read_study_file_columns,
+    study_data_writer,
+    update_study_file,
 )
 from private.vehicles import vehicles
 
@@ -166,6 +173,13 @@ input_float_columns = [
     "WTHR_rapid_wind-wind_direction",                             # degrees (north @ 0 degrees in car's forward direction)
 ]
 
+# fuel_study_output_columns stored as integers in Parquet files, all others are floats or timestamps
+fuel_study_int_columns = [
+    'i',                                                          # row number
+    'closest_gear',                                               # ordinal gear number, integer 1 through 6
+    'route',                                                      # source file number
+] + input_int_columns
+
 fuel_study_output_columns = [
     'i',                                                          # row number
     "AMBIANT_AIR_TEMP",                                           # Celsius 
@@ -212,6 +226,8 @@ fuel_study_output_columns = [
     'mps',                                                        # meters per second
     'theta',                                                      # radians
     'closest_gear',                                               # ordinal gear number, integer 1 through 6
+    'theta_error',                                                # closest gear theta minus theta, radians
+    'distance_error',                                             # signed distance from closest gear theta line
     'acceleration',                                               # meters per second squared
     'route',                                                      # source file number
     'duration',                                                   # seconds
@@ -272,9 +288,8 @@ def save_fuel_study_data_to_csv(vin:str, output_file_name:str, obd_fuel_study:li
     if Path(output_file_name).is_file() and not force_save:
         console.print(f"\tCSV file for {vehicles[vin]['name']} already exists - skipping...")
     else:
-        with open(output_file_name, "w") as csv_output:
-            writer = csv.DictWriter(csv_output, fieldnames=fuel_study_output_columns, escapechar="\\")
-            writer.writeheader()
+        # output_file_name ending in ".parquet" writes a Parquet file
+        with study_data_writer(output_file_name, fuel_study_output_columns, int_columns=fuel_study_int_columns) as writer:
             for row in obd_fuel_study:
                 writer.writerow(row)
 
@@ -282,15 +297,193 @@ def save_fuel_study_data_to_csv(vin:str, output_file_name:str, obd_fuel_study:li
 
     return
 
-def generate_fuel_study_data(vin:str, output_file_name:str, csv_file_dir:str, force_save=False, verbose=False)->int:
+# fuel_study_file_columns() helpers
+# float_column() and int_column() convert the way float() and int() do, with NaN and None for values
+# that don't convert, so results match converting values one row at a time.
+def float_column(values)->np.ndarray:
+    """Sequence of values as a float64 array, NaN where float(value) fails."""
+    values = np.array(values, dtype=object)
+    values[values == ''] = None
+    try:
+        # object to float64 conversion calls float() on each value, None becomes NaN
+        return values.astype(np.float64)
+    except (TypeError, ValueError):
+        return np.array([to_float(value) for value in values], dtype=np.float64)
+
+def to_float(value)->float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def int_column(values)->list:
+    """Sequence of values as a list of int(value), None where int(value) fails."""
+    column = []
+    for value in values:
+        try:
+            column.append(int(value))
+        except (TypeError, ValueError):
+            column.append(None)
+    return column
+
+def datetime_column(values)->list:
+    """Sequence of ISO format date/time strings (or datetime values from Parquet files) as datetimes."""
+    return [datetime.fromisoformat(value) if isinstance(value, str) else value for value in values]
+
+def scalar_function_column(function, *columns)->np.ndarray:
+    """
+    function applied to the elements of float64 columns one at a time, NaN where any element is NaN.
+    Used for the math module and haversine functions so results are bit for bit the same as the
+    scalar functions, NumPy's vectorized arctan2() and arcsin() can differ in the last bit.
+    """
+    valid = ~np.isnan(np.vstack(columns)).any(axis=0)
+    result = np.full(len(valid), np.nan)
+    result[valid] = np.fromiter(
+        map(function, *(column[valid].tolist() for column in columns)),
+        dtype=np.float64,
+        count=int(valid.sum()),
+    )
+    return result
+
+def previous_values(column:np.ndarray)->np.ndarray:
+    """Column of the values in the rows before, NaN for the first row."""
+    previous = np.empty_like(column)
+    previous[:1] = np.nan
+    previous[1:] = column[:-1]
+    return previous
+
+def column_values(column:np.ndarray)->list:
+    """float64 column as a list of floats, None for NaN."""
+    return [None if value != value else value for value in column.tolist()]
+
+def haversine_distance(lat1:float, lon1:float, lat2:float, lon2:float)->float:
+    return haversine((lat1, lon1), (lat2, lon2))
+
+# columns = fuel_study_file_columns(vin, csv_data_file, theta_data)
+# where
+#       columns is a dictionary of fuel_study_output_columns names: list of values for one
+#       integrated CSV or Parquet file, all but 'i' and 'route', with None for missing values.
+# Runs in worker processes when generate_fuel_study_data() jobs > 1.
+def fuel_study_file_columns(vin:str, csv_data_file, theta_data:dict)->dict:
+    raw = read_study_file_columns(
+        csv_data_file,
+        input_float_columns + input_int_columns + ['iso_ts_pre', 'iso_ts_post', ]
+    )
+    row_count = len(next(iter(raw.values()))) if raw else 0
+    missing = [None] * row_count
+
+    # convert floats
+    c = {column: float_column(raw.get(column, missing)) for column in input_float_columns}
+
+    # Column names changed midway through data collection
+    #   "NMEA_GNGNS-alt" to "GNGNS-alt"
+    #   "NMEA_GNGNS-lat" to "GNGNS-lat"
+    #   "NMEA_GNGNS-lon" to "GNGNS-lon"
+    for column in ['NMEA_GNGNS-alt', 'NMEA_GNGNS-lat', 'NMEA_GNGNS-lon', ]:
+        nmea = c.pop(column)
+        present = ~np.isnan(nmea) & (nmea != 0.0)
+        c[column.replace('NMEA_', '')][present] = nmea[present]
+
+    # convert date/time
+    # Parquet timestamps are already datetime values
+    iso_ts_pre = datetime_column(raw.get('iso_ts_pre', missing))
+    iso_ts_post = datetime_column(raw.get('iso_ts_post', missing))
+    c['duration'] = np.array(
+        [(post - pre).total_seconds() for pre, post in zip(iso_ts_pre, iso_ts_post)],
+        dtype=np.float64
+    )
+    duration = c['duration']
+
+    # create modify fields
+    c['rps'] = c['RPM'] / 60.0
+    c['mps'] = c['SPEED'] * 0.44704
+    c['theta'] = scalar_function_column(atan2, c['mps'], c['rps'])
+
+    # acceleration is missing after a missing SPEED and for zero durations
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c['acceleration'] = ((c['SPEED'] - previous_values(c['SPEED'])) * 0.44704) / duration
+    c['acceleration'][duration == 0.0] = np.nan
+
+    # GPS
+    previous_lat = previous_values(c['GNGNS-lat'])
+    previous_lon = previous_values(c['GNGNS-lon'])
+    c['gps_distance'] = scalar_function_column(
+        haversine_distance, previous_lat, previous_lon, c['GNGNS-lat'], c['GNGNS-lon']
+    )
+    c['gps_heading'] = heading((previous_lat, previous_lon), (c['GNGNS-lat'], c['GNGNS-lon']))
+
+    c['gps_rise'] = c['GNGNS-alt'] - previous_values(c['GNGNS-alt'])
+
+    # USA Grade Definition
+    # https://en.wikipedia.org/wiki/Grade_(slope)
+    c['gps_pitch'] = scalar_function_column(atan2, c['gps_rise'], c['gps_distance'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c['gps_road_grade'] = np.abs(100.0 * c['gps_rise'] / c['gps_distance'])
+    c['gps_road_grade'][c['gps_distance'] == 0.0] = np.nan
+
+    c['gps_yaw'] = c['gps_heading'] - previous_values(c['gps_heading'])
+
+    # Weather - Wind Direction to Radians, math.radians() multiplies by pi / 180.0
+    c['WTHR_rapid_wind-wind_direction'] = c['WTHR_rapid_wind-wind_direction'] * (pi / 180.0)
+    c['WTHR_obs_st-wind_direction'] = c['WTHR_obs_st-wind_direction'] * (pi / 180.0)
+
+    # FUEL_RATE_2
+    # grams per second
+    # see fuel_grams_to_milliliters() in common.py for info.
+    c['engine_fuel_grams'] = c['FUEL_RATE_2-engine_fuel_rate'] * duration
+    c['engine_fuel_milliliters'] = fuel_grams_to_milliliters(vin, c['engine_fuel_grams'])
+
+    c['vehicle_fuel_grams'] = c['FUEL_RATE_2-vehicle_fuel_rate'] * duration
+    c['vehicle_fuel_milliliters'] = fuel_grams_to_milliliters(vin, c['vehicle_fuel_grams'])
+
+    # FUEL_RATE
+    # liters per hour to milliliters per second
+    # divide the volume / time value by 3.6
+    # This is not volume/temperature corrected.
+    c['fuel_rate'] = c['FUEL_RATE'] / 3.6
+    c['fuel_milliliters'] = c['fuel_rate'] * duration
+
+    # fuel usage based on MAF alone
+    #   - https://www.windmill.co.uk/fuel.html
+    #       - "chemically ideal value of 14.7 grams of air to every gram of gasoline"
+    #   - SAE J1979DA Standard shows ideal value of 14.64
+    c['fuel_maf_rate_milliliters'] = (c['MAF'] / 14.64)
+    c['fuel_maf_grams'] = (c['MAF'] / 14.64) * duration
+    c['fuel_maf_milliliters'] = fuel_grams_to_milliliters(vin, c['fuel_maf_grams'])
+
+    # fuel usage based on MAF and Lambda, Air/Fuel mixture ratio
+    #   - SAE J1979DA Standard for 0x44 COMMANDED_EQUIV_RATIO
+    c['fuel_lambda_maf_rate_milliliters'] = (c['MAF'] / (14.64 * c['COMMANDED_EQUIV_RATIO']))
+    c['fuel_lambda_maf_grams'] = (c['MAF'] / (14.64 * c['COMMANDED_EQUIV_RATIO'])) * duration
+    c['fuel_lambda_maf_milliliters'] = fuel_grams_to_milliliters(vin, c['fuel_lambda_maf_grams'])
+
+    # closest gear assignment, rows without theta (or theta of 0.0) get closest_gear 0
+    theta = np.where(c['theta'] == 0.0, np.nan, c['theta'])
+    closest_gears, c['theta_error'], c['distance_error'] = classify_gears(theta_data, vin, c['rps'], c['mps'], theta)
+
+    columns = {column: column_values(values) for column, values in c.items()}
+    columns.update({column: int_column(raw.get(column, missing)) for column in input_int_columns})
+    columns['closest_gear'] = closest_gears.tolist()
+    columns['iso_ts_pre'] = iso_ts_pre
+    columns['iso_ts_post'] = iso_ts_post
+
+    return columns
+
+def generate_fuel_study_data(vin:str, output_file_name:str, csv_file_dir:str, force_save=False, verbose=False, jobs=1)->int:
     """
     open output CSV for writing
     for each input CSV file associated with a single VIN
         increment route_counter
-        for each line in input CSV file
-            calculate additional fields
-            write new fields to output CSV
+        calculate additional fields for all of the file's rows as columns
+        write new fields to output CSV
     returns total number of rows processed
+
+    jobs is the number of processes computing input files at the same time, 0 for one per CPU.
+    Routes and row numbers are assigned in input file name order, whatever jobs is.
+
+    An output file made by an earlier call is updated rather than regenerated: the rows of
+    unchanged input files are kept and only new or changed input files are computed, see
+    common.update_study_file().  force_save regenerates the whole file.
     """
     Path(csv_file_dir).mkdir(parents=True, exist_ok=True)
 
@@ -301,218 +494,51 @@ def generate_fuel_study_data(vin:str, output_file_name:str, csv_file_dir:str, fo
 
     theta_data = read_theta_data_file(theta_file_name)
 
-    # each raw JSON data file, after transformation into a CSV file, will have a
-    # unique 'route_counter' value assigned to it.
-    route_counter = 0
-    row_counter = 0
+    # CSV or Parquet files generated by data_files.integrated_to_csv()
+    csv_data_files = glob_study_files(csv_file_dir, f"**/*integrated-{vin}")
+
+    if jobs == 0:
+        jobs = cpu_count()
+
+    def file_columns(input_files:list):
+        if jobs > 1 and len(input_files) > 1:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            try:
+                # results come back in input_files order
+                yield from executor.map(fuel_study_file_columns, repeat(vin), input_files, repeat(theta_data))
+            finally:
+                executor.shutdown(cancel_futures=True)
+        else:
+            for csv_data_file in input_files:
+                yield fuel_study_file_columns(vin, csv_data_file, theta_data)
+
+    def report_file(route_counter:int, csv_data_file, line_number:int):
+        if verbose:
+            print(f"{route_counter}: {str(csv_data_file).replace(vin, '<VIN>')}: {line_number} ")
+
+    # output changes whenever any of these do
+    parameters = {
+        'theta_data': theta_data.get(vin) if theta_data else None,
+        'fuel_type': vehicles[vin].get('fuel_type'),
+        'columns': fuel_study_output_columns,
+    }
+
+    # output_file_name ending in ".parquet" writes a Parquet file
+    counts = update_study_file(
+        output_file_name, fuel_study_output_columns, fuel_study_int_columns, csv_data_files, parameters,
+        file_columns, force_save=force_save, report_file=report_file,
+    )
 
-    if Path(output_file_name).is_file() and not force_save:
+    if counts is None:
         console.print(f"\tCSV file for {vehicles[vin]['name']} already exists - skipping...")
+        row_counter, route_counter, kept_count = 0, 0, 0
     else:
-        with open(output_file_name, "w") as csv_output:
-            writer = csv.DictWriter(csv_output, fieldnames=fuel_study_output_columns, escapechar="\\")
-            writer.writeheader()
-
-            # each row in the union of all CSV files has a unique row number 'i'
-            i = 0
-
-            for csv_data_file in (Path(csv_file_dir).glob(f"**/*integrated-{vin}.csv")):
-                with open(csv_data_file, "r") as csv_file:
-                    route_counter += 1
-                    line_number = 0
-
-                    # previous value setup
-                    previous = {column: None for column in previous_input_columns}
-
-                    reader = csv.DictReader(csv_file)
-                    for row in reader:
-                        i += 1
-                        line_number += 1
-                        row_counter += 1
-                        record = {}
-
-                        # convert floats
-                        for column in input_float_columns:
-                            try:
-                                record[column] = float(row[column])
-                            except ValueError:
-                                record[column] = None
-
-                        # Column names changed midway through data collection
-                        #   "NMEA_GNGNS-alt" to "GNGNS-alt"
-                        #   "NMEA_GNGNS-lat" to "GNGNS-lat"
-                        #   "NMEA_GNGNS-lon" to "GNGNS-lon"
-                        for column in ['NMEA_GNGNS-alt', 'NMEA_GNGNS-lat', 'NMEA_GNGNS-lon', ]:
-                            if record[column]:
-                                record[column.replace('NMEA_', '')] = record[column]
-
-                        # convert ints
-                        for column in input_int_columns:
-                            try:
-                                record[column] = int(row[column])
-                            except ValueError:
-                                record[column] = None
-
-                        # "rotation_vector-vector" is list
-                        # if isinstance(record["rotation_vector-rotation_vector"], list):
-                        #     record["rotation_vector-vector-w"] = record['rotation_vector'][0]
-                        #     record["rotation_vector-vector-x"] = record['rotation_vector'][1]
-                        #     record["rotation_vector-vector-y"] = record['rotation_vector'][2]
-                        #     record["rotation_vector-vector-z"] = record['rotation_vector'][3]
-
-                        # convert date/time
-                        if isinstance(row['iso_ts_pre'], str):
-                            record['iso_ts_pre'] = datetime.fromisoformat(row['iso_ts_pre'])
-
-                        if isinstance(row['iso_ts_post'], str):
-                            record['iso_ts_post'] = datetime.fromisoformat(row['iso_ts_post'])
-
-                        record['duration'] = record['iso_ts_post'] - record['iso_ts_pre']
-                        record['duration'] = record['duration'].total_seconds()
-
-                        record['i'] = i
-                        record['route'] = route_counter
-
-                        # create modify fields
-                        record['mps'] = None
-                        record['rps'] = None
-                        record['theta'] = None
-                        if record['RPM'] is not None:
-                            record['rps'] = record['RPM'] / 60.0
-                        if record['SPEED'] is not None:
-                            record['mps'] = record['SPEED'] * 0.44704
-                        if record['mps'] is not None and record['rps'] is not None:
-                            record['theta'] = atan2(record['mps'], record['rps'])
-
-                        try:
-                            record['acceleration'] = (((record['SPEED'] - previous['SPEED']) * 0.44704)
-                                                        / record['duration'])
-                        except Exception:
-                            record['acceleration'] = None
-
-                        # GPS
-                        record['gps_distance'] = None
-                        record['gps_heading'] = None
-                        if (previous['GNGNS-lat'] is not None and
-                                record['GNGNS-lat'] is not None and
-                            previous['GNGNS-lon'] is not None and
-                                record['GNGNS-lon'] is not None):
-
-                            record['gps_distance'] = haversine(
-                                (previous['GNGNS-lat'], previous['GNGNS-lon']),
-                                (record['GNGNS-lat'], record['GNGNS-lon'])
-                            )
-                            record['gps_heading'] = heading(
-                                (previous['GNGNS-lat'], previous['GNGNS-lon']),
-                                (record['GNGNS-lat'], record['GNGNS-lon'])
-                            )
-
-                        record['gps_rise'] = None
-                        if previous['GNGNS-alt'] is not None and record['GNGNS-alt'] is not None:
-                            record['gps_rise'] = record['GNGNS-alt'] - previous['GNGNS-alt']
-
-                        # USA Grade Definition
-                        # https://en.wikipedia.org/wiki/Grade_(slope)
-                        record['gps_pitch'] = None
-                        record['gps_road_grade'] = None
-                        if record['gps_rise'] is not None and record['gps_distance'] is not None:
-                            record['gps_pitch'] = atan2(record['gps_rise'], record['gps_distance'])
-                            if record['gps_distance'] != 0.0:
-                                record['gps_road_grade'] = abs(100.0 * record['gps_rise'] / record['gps_distance'])
-
-                        record['gps_yaw'] = None
-                        if record['gps_heading'] is not None and previous['gps_heading'] is not None:
-                            record['gps_yaw'] = record['gps_heading'] - previous['gps_heading']
-
-                        # Weather - Wind Direction to Radians
-                        if record['WTHR_rapid_wind-wind_direction'] is not None:
-                            record['WTHR_rapid_wind-wind_direction'] = radians(record['WTHR_rapid_wind-wind_direction'])
-
-                        if record['WTHR_obs_st-wind_direction'] is not None:
-                            record['WTHR_obs_st-wind_direction'] = radians(record['WTHR_obs_st-wind_direction'])
-
-                        # FUEL_RATE_2
-                        # grams per second
-                        # see fuel_grams_to_milliliters() in common.py for info.
-                        record['engine_fuel_grams'] = None
-                        record['engine_fuel_milliliters'] = None
-                        if record['FUEL_RATE_2-engine_fuel_rate'] is not None:
-                            record['engine_fuel_grams'] = record['FUEL_RATE_2-engine_fuel_rate'] * record['duration']
-                            record['engine_fuel_milliliters'] = fuel_grams_to_milliliters(vin, record['engine_fuel_grams'])
-
-                        record['vehicle_fuel_grams'] = None
-                        record['vehicle_fuel_milliliters'] = None
-                        if record['FUEL_RATE_2-vehicle_fuel_rate'] is not None:
-                            record['vehicle_fuel_grams'] = record['FUEL_RATE_2-vehicle_fuel_rate'] * record['duration']
-                            record['vehicle_fuel_milliliters'] = fuel_grams_to_milliliters(vin, record['vehicle_fuel_grams'])
-
-                        # FUEL_RATE
-                        # liters per hour to milliliters per second
-                        # divide the volume / time value by 3.6
-                        # This is not volume/temperature corrected.
-                        record['fuel_milliliters'] = None
-                        record['fuel_rate'] = None
-                        if record['FUEL_RATE'] is not None:
-                            record['fuel_rate'] = record['FUEL_RATE'] / 3.6
-                            record['fuel_milliliters'] = record['fuel_rate'] * record['duration']
-
-                        # fuel usage based on MAF alone
-                        #   - https://www.windmill.co.uk/fuel.html
-                        #       - "chemically ideal value of 14.7 grams of air to every gram of gasoline"
-                        #   - SAE J1979DA Standard shows ideal value of 14.64
-                        record['fuel_maf_grams'] = None
-                        record['fuel_maf_milliliters'] = None
-                        record['fuel_maf_rate_milliliters'] = None
-                        if record['MAF'] is not None:
-                            record['fuel_maf_rate_milliliters'] = (record['MAF'] / 14.64)
-                            record['fuel_maf_grams'] = (record['MAF'] / 14.64) * record['duration']
-                            record['fuel_maf_milliliters'] = fuel_grams_to_milliliters(vin, record['fuel_maf_grams'])
-
-                        # fuel usage based on MAF and Lambda, Air/Fuel mixture ratio
-                        #   - SAE J1979DA Standard for 0x44 COMMANDED_EQUIV_RATIO
-                        record['fuel_lambda_maf_grams'] = None
-                        record['fuel_lambda_maf_milliliters'] = None
-                        record['fuel_lambda_maf_rate_milliliters'] = None
-                        if record['MAF'] is not None and record['COMMANDED_EQUIV_RATIO'] is not None:
-                            record['fuel_lambda_maf_rate_milliliters'] = (record['MAF'] / (14.64 * record['COMMANDED_EQUIV_RATIO']))
-                            record['fuel_lambda_maf_grams'] = (record['MAF'] / (14.64 * record['COMMANDED_EQUIV_RATIO'])) * record['duration']
-                            record['fuel_lambda_maf_milliliters'] = fuel_grams_to_milliliters(vin, record['fuel_lambda_maf_grams'])
-
-                        # closest_gear assignment
-                        if theta_data and vin in theta_data and record['theta']:
-                            # find closest gear using theta_data[vin][gear]['theta'] being compared to record['theta']
-                            gear_distance = None
-                            closest_gear = 1
-                            for gear in theta_data[vin]:
-                                # sourcery skip: merge-nested-ifs
-                                if gear:
-                                    gear_distance = abs(theta_data[vin][gear]['theta'] - record['theta'])
-                                    # sourcery skip: merge-nested-ifs
-                                    if gear != closest_gear:
-                                        if gear_distance < last_gear_distance:
-                                            closest_gear = gear
-                                    last_gear_distance = gear_distance
-
-                            record['closest_gear'] = closest_gear
-                        else:
-                            record['closest_gear'] = 0
-
-                        # need previous[column] to track all of the previous things
-                        previous = {column: record[column] for column in previous_input_columns}
-
-                        # The column names that changed midway through data collection
-                        # need to be removed from the dictionary.
-                        #   "NMEA_GNGNS-alt" to "GNGNS-alt"
-                        #   "NMEA_GNGNS-lat" to "GNGNS-lat"
-                        #   "NMEA_GNGNS-lon" to "GNGNS-lon"
-                        for column in ['NMEA_GNGNS-alt', 'NMEA_GNGNS-lat', 'NMEA_GNGNS-lon', ]:
-                            del record[column]
-
-                        writer.writerow(record)
-
-                if verbose:
-                    print(f"{route_counter}: {str(csv_data_file).replace(vin, '<VIN>')}: {line_number} ")
+        row_counter, route_counter, kept_count = counts
+
+    if kept_count:
+        console.print(f"\tKept {kept_count} unchanged file(s), computed {route_counter - kept_count} file(s)")
 
     console.print(f"{vehicles[vin]['name']} rows: {row_counter} file count: {route_counter}")
 
     return row_counter
+
@@ -4,11 +4,10 @@
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-import csv
 import json
 import subprocess
 from pathlib import Path
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from rich.console import Console
 from rich.jupyter import print
 from rich.pretty import pprint
@@ -27,7 +26,16 @@ from telemetry_analysis.theta import (
     theta_file_name,
     generate_theta_data_from_vehicle,
     write_theta_data_file,
-    signed_point_to_theta_line_distance,
+    signed_point_to_theta_line_distance_array,
+    classify_gears,
+)
+from telemetry_analysis.video import (
+    FRAME_DPI,
+    route_frame_data,
+    render_frames,
+    frame_image_file_name,
+    ffmpeg_command_line,
+    stream_frames_to_ffmpeg,
 )
 from telemetry_analysis.reports import (
     basic_stats_table_generator,
@@ -44,7 +52,9 @@ from telemetry_analysis.common import (
     base_ffmpeg_file_path,
     ffmpeg_program_path,
     image_file_extn,
-    timedelta_to_hhmmss_str,
+    glob_study_files,
+    read_study_file_rows,
+    study_data_writer,
 )
 from private.vehicles import vehicles
 
@@ -67,6 +77,8 @@ gear_study_output_columns = [
    'm_per_r',                                                    # meters per rotation
    'r_per_m',                                                    # rotations per meter
    'closest_gear',                                               # ordinal gear number, integer 1 through 6
+   'theta_error',                                                # closest gear theta minus theta, radians
+   'distance_error',                                             # signed distance from closest gear theta line
    'acceleration',                                               # meters per second squared
    'route',                                                      # source file number
    'duration',                                                   # seconds
@@ -74,6 +86,13 @@ gear_study_output_columns = [
    'iso_ts_post',                                                # UTC timestamp (after)
 ]
 
+# gear_study_output_columns stored as integers in Parquet files, all others are floats or timestamps
+gear_study_int_columns = [
+   'i',
+   'closest_gear',
+   'route',
+]
+
 gear_colors = {
 1: 'blue',
 2: 'orange',
@@ -102,9 +121,8 @@ def save_gear_study_data_to_csv(vin:str, output_file_name:str, obd_gear_study:li
     if Path(output_file_name).is_file() and not force_save:
         console.print(f"\tCSV file for {vehicles[vin]['name']} already exists - skipping...")
     else:
-        with open(output_file_name, "w") as csv_output:
-            writer = csv.DictWriter(csv_output, fieldnames=gear_study_output_columns, escapechar="\\")
-            writer.writeheader()
+        # output_file_name ending in ".parquet" writes a Parquet file
+        with study_data_writer(output_file_name, gear_study_output_columns, int_columns=gear_study_int_columns) as writer:
             for row in obd_gear_study:
                 writer.writerow(row)
 
@@ -127,96 +145,93 @@ def generate_gear_study_data(csv_file_dir:str, vin:str)->list:
     # each row in the union of all CSV files has a unique row number 'i'
     i = 0
 
-    for csv_data_file in (Path(csv_file_dir).glob(f"*{vin}*.csv")):
-        with open(csv_data_file, "r") as csv_file:
-            route_counter += 1
-            previous_iso_ts_post = None
-            previous_SPEED = 0
-            line_number = 0
-
-            # reader = csv.DictReader(csv_file, restkey="extra-junk", fieldnames=gear_study_input_columns)
-            reader = csv.DictReader(csv_file)
-            try:
-                for row in reader:
-                    i += 1
-                    line_number += 1
-                    record = {}
-                    if (
-                        row['SPEED'] is None or
-                        len(row['SPEED']) == 0 or
-                        row['RPM'] is None or
-                        len(row['RPM']) == 0
-                   ):
-                        previous_iso_ts_post = None
-                        previous_SPEED = 0.0
-                        bad_row_counter += 1
-                        continue
-
-                    record['SPEED'] = float(row['SPEED'])
-                    record['RPM'] = float(row['RPM'])
-
-                    if (
-                        record['SPEED'] <= 0.0 or
-                        record['SPEED'] > 130.0 or
-                        record['RPM'] < 400.0 or
-                        record['RPM'] > 5000.0
-                    ):
-                        previous_iso_ts_post = None
-                        previous_SPEED = 0.0
-                        bad_row_counter += 1
-                        continue
-
-                    record['i'] = i
-                    record['rps'] = record['RPM'] / 60.0
-                    record['mps'] = record['SPEED'] * 0.277778
-                    record['theta'] = atan2(record['mps'], record['rps'])
-                    record['radius'] = sqrt((record['rps'] * record['rps']) + (record['mps'] * record['mps']))
-                    if isinstance(row['iso_ts_pre'], str):
-                        record['iso_ts_pre'] = datetime.fromisoformat(row['iso_ts_pre'])
-                    if isinstance(row['iso_ts_post'], str):
-                        record['iso_ts_post'] = datetime.fromisoformat(row['iso_ts_post'])
-                    record['duration'] = record['iso_ts_post'] - record['iso_ts_pre']
-                    record['duration'] = record['duration'].total_seconds()
-                    record['acceleration'] = 0.0
-
-                    if previous_iso_ts_post is not None:
-                        # route is current
-                        record['acceleration'] = ((record['SPEED'] - previous_SPEED) * 0.277778) / record['duration']
-                    record['route'] = route_counter
-                    previous_iso_ts_post = record['iso_ts_post']
-                    previous_SPEED = record['SPEED']
-
-                    # ratio: meters per revolution
-                    record['m_per_r'] = record['mps'] / record['rps']
-                    # ratio: revolutions per meter
-                    record['r_per_m'] = record['rps'] / record['mps']
-
-                    if theta_data and vin in theta_data:
-                        # find closest gear using theta_data[vin][gear]['theta'] being compared to row['theta']
-                        gear_distance = None
-                        closest_gear = 1
-                        for gear in theta_data[vin]:
-                            if not gear:
-                                continue
-                            gear_distance = abs(theta_data[vin][gear]['theta'] - record['theta'])
-                            if gear != closest_gear and gear_distance < last_gear_distance:
-                                closest_gear = gear
-                            last_gear_distance = gear_distance
-
-                        record['closest_gear'] = closest_gear
-
-                    else:
-
-                        record['closest_gear'] = 0
-
-                    obd_gear_study.append(record)
-
-            except Exception as e:
-                console.print(
-                    f"oops {vehicles[vin]['name']}:\n{csv_data_file}\nline {line_number}\n{str(e)}"
-                )
-                pprint(row)
-                pprint(record)
+    # CSV or Parquet files generated by data_files.obd_to_csv()
+    for csv_data_file in glob_study_files(csv_file_dir, f"*{vin}*"):
+        route_counter += 1
+        previous_iso_ts_post = None
+        previous_SPEED = 0
+        line_number = 0
+
+        # reader = csv.DictReader(csv_file, restkey="extra-junk", fieldnames=gear_study_input_columns)
+        reader = read_study_file_rows(csv_data_file)
+        try:
+            for row in reader:
+                i += 1
+                line_number += 1
+                record = {}
+                if (
+                    row['SPEED'] is None or
+                    row['SPEED'] == '' or
+                    row['RPM'] is None or
+                    row['RPM'] == ''
+               ):
+                    previous_iso_ts_post = None
+                    previous_SPEED = 0.0
+                    bad_row_counter += 1
+                    continue
+
+                record['SPEED'] = float(row['SPEED'])
+                record['RPM'] = float(row['RPM'])
+
+                if (
+                    record['SPEED'] <= 0.0 or
+                    record['SPEED'] > 130.0 or
+                    record['RPM'] < 400.0 or
+                    record['RPM'] > 5000.0
+                ):
+                    previous_iso_ts_post = None
+                    previous_SPEED = 0.0
+                    bad_row_counter += 1
+                    continue
+
+                record['i'] = i
+                record['rps'] = record['RPM'] / 60.0
+                record['mps'] = record['SPEED'] * 0.277778
+                record['theta'] = atan2(record['mps'], record['rps'])
+                record['radius'] = sqrt((record['rps'] * record['rps']) + (record['mps'] * record['mps']))
+                # Parquet timestamps are already datetime values
+                record['iso_ts_pre'] = row['iso_ts_pre']
+                if isinstance(row['iso_ts_pre'], str):
+                    record['iso_ts_pre'] = datetime.fromisoformat(row['iso_ts_pre'])
+                record['iso_ts_post'] = row['iso_ts_post']
+                if isinstance(row['iso_ts_post'], str):
+                    record['iso_ts_post'] = datetime.fromisoformat(row['iso_ts_post'])
+                record['duration'] = record['iso_ts_post'] - record['iso_ts_pre']
+                record['duration'] = record['duration'].total_seconds()
+                record['acceleration'] = 0.0
+
+                if previous_iso_ts_post is not None:
+                    # route is current
+                    record['acceleration'] = ((record['SPEED'] - previous_SPEED) * 0.277778) / record['duration']
+                record['route'] = route_counter
+                previous_iso_ts_post = record['iso_ts_post']
+                previous_SPEED = record['SPEED']
+
+                # ratio: meters per revolution
+                record['m_per_r'] = record['mps'] / record['rps']
+                # ratio: revolutions per meter
+                record['r_per_m'] = record['rps'] / record['mps']
+
+                obd_gear_study.append(record)
+
+        except Exception as e:
+            console.print(
+                f"oops {vehicles[vin]['name']}:\n{csv_data_file}\nline {line_number}\n{str(e)}"
+            )
+            pprint(row)
+            pprint(record)
+
+    # closest gear for all rows in one pass, see classify_gears()
+    closest_gears, theta_errors, distance_errors = classify_gears(
+        theta_data, vin,
+        [record['rps'] for record in obd_gear_study],
+        [record['mps'] for record in obd_gear_study],
+        [record['theta'] for record in obd_gear_study],
+    )
+    for record, closest_gear, theta_error, distance_error in zip(obd_gear_study, closest_gears, theta_errors, distance_errors):
+        record['closest_gear'] = int(closest_gear)
+        record['theta_error'] = float(theta_error) if closest_gear else None
+        record['distance_error'] = float(distance_error) if closest_gear else None
 
     console.print(f"{vehicles[vin]['name']} good rows: {len(obd_gear_study)} bad rows: {bad_row_counter} file count: {route_counter}")
 
@@ -635,27 +650,21 @@ def gear_study_kde_plot_overlays_for_each_gear(vin:str, df:pd.DataFrame):
 #   - an error that is the difference between the theta gear line and the theta value calculated from the (rps, mps) point.for vin in vins:
 def error_rate_estimation(vin:str, df:pd.DataFrame)->pd.DataFrame:
     theta_data = read_theta_data_file(theta_file_name)
-    if not theta_data and vin not in theta_data:
+    if not theta_data or vin not in theta_data:
         console.print(f"theta data not available for {vin}")
         return None
 
     df = df.reset_index()
 
-    distance_errors = [
-                            signed_point_to_theta_line_distance(
-                                row['rps'], row['mps'], theta_data[vin][row['closest_gear']]['theta']
-                            ) if row['closest_gear'] else None
-                            for index, row in df.iterrows()
-                        ]
+    # closest gear theta for every row, NaN where there is no closest gear (0 or missing)
+    gear_thetas = {gear: data['theta'] for gear, data in theta_data[vin].items() if gear}
+    closest_gear_theta = df['closest_gear'].map(gear_thetas).to_numpy(dtype=np.float64, na_value=np.nan)
 
-    df['distance_error'] = distance_errors
-
-    theta_errors = [
-                        (theta_data[vin][row['closest_gear']]['theta'] - row['theta']) if row['closest_gear'] else None
-                        for index, row in df.iterrows()
-                    ]
+    df['distance_error'] = signed_point_to_theta_line_distance_array(
+        df['rps'].to_numpy(dtype=np.float64), df['mps'].to_numpy(dtype=np.float64), closest_gear_theta
+    )
 
-    df['theta_error'] = theta_errors
+    df['theta_error'] = closest_gear_theta - df['theta'].to_numpy(dtype=np.float64)
 
     return df
 
@@ -923,32 +932,26 @@ def generate_images_for_video(
     create_video=False,
     video_frame_rate=4,
     trailing_points=10,
-    verbose=False
+    verbose=False,
+    jobs=1,
+    stream_to_ffmpeg=False,
+    dpi=FRAME_DPI,
 ):
-    # set create_video=True when your system (not Windows) is able to run ffmpeg 
+    # set create_video=True when your system (not Windows) is able to run ffmpeg
+    # jobs is the number of frame rendering processes, 0 for one per CPU
+    # stream_to_ffmpeg=True (with create_video=True) pipes frames into ffmpeg without writing image files
     theta_data = read_theta_data_file(theta_file_name)
 
-    # video creation parameters
-    xspeed = 2.0
-    yspeed = 55.0
-    xrpm = 70.0
-    yrpm = 2.0
-    xgear = xspeed
-    ygear = yspeed - 5.0
-    xfps = xgear              # frames per second x coordinate
-    yfps = ygear - 5.0        # frames per second y coordinate
-    xsecs = xfps              # seconds into video (reflects drive time) x coordinate
-    ysecs = yfps - 5.0        # seconds into video (reflects drive time) y coordinate
-
     vin = get_vin_from_vehicle_name(name)
 
     if not vin:
         console.print(f"Vehicle name <{name}> not found in private.vehicles.py")
         return
 
-    console.print(f"\t# ('{name}', {route}),\t# count: {(df[df['route'] == route]).shape[0]}")
+    # route sliced out of df once, see video.route_frame_data()
+    frame_data = route_frame_data(df, route, trailing_points)
+    console.print(f"\t# ('{name}', {route}),\t# count: {len(frame_data['i'])}")
 
-    elapsed_time = None
     vehicle_name = (vehicles[vin]['name']).replace(' ', '-')
 
     image_file_full_path = f"{base_image_file_path}/{vehicle_name}/{route}"
@@ -956,108 +959,46 @@ def generate_images_for_video(
 
     mp4_file_full_path = f"{base_ffmpeg_file_path}/{vehicle_name}"
     Path(mp4_file_full_path).mkdir(parents=True, exist_ok=True)
+    mp4_file_name = f"{mp4_file_full_path}/{vehicle_name}-{route}-fps{video_frame_rate:02}.mp4"
 
     if verbose:
         console.print(f"image file full path {image_file_full_path}")
 
-    imin = (df[df['route'] == route])['i'].min(skipna=True)
-    imax = (df[df['route'] == route])['i'].max()
+    gear_line_points = {}
+    for gear in vehicles[vin]['forward_gear_ratios']:
+        if gear in theta_data[vin] and 'theta' in theta_data[vin][gear] and theta_data[vin][gear]['theta']:
+            gear_line_points[gear] = (gear_lines(0.0, 80.0, 0.0, 60.0, theta_data[vin][gear]['theta']), gear_colors[gear])
+
+    renderer_args = (
+        frame_data,
+        gear_line_points,
+        f"{vehicles[vin]['name']} 'rps', 'mps' video with 'theta_data' gear lines",
+        video_frame_rate,
+        trailing_points,
+        image_file_extn,
+        dpi,
+    )
 
-    for i in range(imin, imax + 1):
-        image_file_name = f"{i:010}.{image_file_extn}"
-    
+    if create_video and stream_to_ffmpeg:
+        command_line = ffmpeg_command_line(ffmpeg_program_path, video_frame_rate, mp4_file_name)
+        console.print(f"{' '.join(command_line).replace(vin, fake_vin)}")
+        frames = render_frames(list(range(len(frame_data['i']))), None, renderer_args, jobs=jobs)
+        console.print(stream_frames_to_ffmpeg(command_line, frames))
+        return
+
+    frames = []
+    for frame in range(len(frame_data['i'])):
+        image_file_name = frame_image_file_name(frame_data, frame, image_file_extn)
         if Path(f"{image_file_full_path}/{image_file_name}").is_file():
             # No need to recreate image file if it already exists.
-            # Memory error/leak in matplotlib/seaborn causes out of memory errors
-            # so restarts might be required.
             if verbose:
                 console.print(f"Image file already exists, skipping: {image_file_name}")
             continue
+        frames.append(frame)
 
-        df_route_i = df[(df['i'] <= i) & (df['i'] >= (i - trailing_points))]
-
-        current_row = (df[(df['i'] == i)]).to_dict(orient='records')
-
-        if len(current_row) == 0:
-            if verbose:
-                console.print(f"Current row length 0, skipping: {image_file_name}")
-            continue
-
-        if elapsed_time is None:
-            elapsed_time = timedelta(seconds=current_row[0]['duration'])
-        else:
-            elapsed_time += timedelta(seconds=current_row[0]['duration'])
-
-        kph = current_row[0]['SPEED']
-        rpm = current_row[0]['RPM']
-        mph = kph * 0.621371
-
-        closest_gear = current_row[0]['closest_gear']
-
-        fig, ax = plt.subplots(figsize=(12,6))
-        sns.set_theme(style="ticks")
-        kde_plot = sns.scatterplot(
-            data=df_route_i,
-            x='rps', y='mps',
-            hue='i', palette='Blues', legend=False, hue_norm=(i-trailing_points, i), s=200
-        )
-
-        ax.set_xlim(0.0, 80.0)
-        ax.set_ylim(0.0, 60.0)
-
-        fig.text(
-                x=xspeed,                       # x-coordinate position of data label
-                y=yspeed,                       # y-coordinate position of data label, adjusted '-' below, '+' abovee the data point
-                transform=ax.transData,         # gets the positioning relative to the plot axis
-                # s=f"KPH:{kph:4.0f}",          # kilometers per hour data label, formatted to ignore decimals
-                s=f"MPH:{mph:5.1f}",            # miles per hour data label, formatted to ignore decimals
-                color="blue"                    # set text color
-        )
-        fig.text(
-            x=xrpm,                             # x-coordinate position of data label
-            y=yrpm,                             # y-coordinate position of data label, adjusted '-' below, '+' above the data point
-            transform=ax.transData,             # gets the positioning relative to the plot axis
-            s=f"RPM:{rpm:5.0f}",                # revolutions per minute data label, formatted to ignore decimals
-            color="blue"                        # set text color
-        )
-        fig.text(
-            x=xfps,                             # x-coordinate position of data label
-            y=yfps,                             # y-coordinate position of data label, adjusted '-' below, '+' above the data point
-            transform=ax.transData,             # gets the positioning relative to the plot axis
-            s=f"FPS:{video_frame_rate:8}",      # frames per second data label, formatted to ignore decimals
-            color="blue"                        # set text color
-        )
-        fig.text(
-            x=xsecs,                            # x-coordinate position of data label
-            y=ysecs,                            # y-coordinate position of data label, adjusted '-' below, '+' above the data point
-            transform=ax.transData,             # gets the positioning relative to the plot axis
-            s=f"{timedelta_to_hhmmss_str(elapsed_time)}",  # hh:mm:ss data label, formatted to ignore decimals
-            color="blue"                        # set text color
-        )
-        fig.text(
-            x=xgear,                            # x-coordinate position of data label
-            y=ygear,                            # y-coordinate position of data label, adjusted '-' below, '+' above the data point
-            transform=ax.transData,             # gets the positioning relative to the plot axis
-            s=f"gear:{closest_gear:8}",        # hh:mm:ss data label, formatted to ignore decimals
-            color="blue"                        # set text color
-        )
-
-        for gear in vehicles[vin]['forward_gear_ratios']:
-            if gear in theta_data[vin] and 'theta' in theta_data[vin][gear] and theta_data[vin][gear]['theta']:
-                points = gear_lines(0.0, 80.0, 0.0, 60.0, theta_data[vin][gear]['theta'])
-                df_points = pd.DataFrame(points, columns=['rps', 'mps'])
-                if gear == closest_gear:
-                    axn = plt.plot( 'rps', 'mps', data=df_points, color='black', linewidth=2.0)
-                else:
-                    axn = plt.plot( 'rps', 'mps', data=df_points, color=gear_colors[gear])
-
-        ax.set(title=f"{vehicles[vin]['name']} 'rps', 'mps' video with 'theta_data' gear lines")
-
+    for frame, _ in zip(frames, render_frames(frames, image_file_full_path, renderer_args, jobs=jobs)):
         if verbose:
-            console.print(f"- {image_file_full_path}/{image_file_name}")
-
-        plt.savefig(f"{image_file_full_path}/{image_file_name}", dpi=300)
-        plt.close()
+            console.print(f"- {image_file_full_path}/{frame_image_file_name(frame_data, frame, image_file_extn)}")
 
     # !ffmpeg -framerate 30 -pattern_type glob -i '*.jpg' -c:v libx264 -pix_fmt yuv420p Jeep-12-fr30.mp4
     # !ffmpeg -framerate 2 -pattern_type glob -i '*.jpg' -c:v libx264 -pix_fmt yuv420p Jeep-12-fr02.mp4
@@ -1065,16 +1006,12 @@ def generate_images_for_video(
 
     # Windows command line ffmpeg doesn't support globbing
     # I'm running ffmpeg in Ubuntu on WSL (Windows Subsystem for Linux)
-    command_line = [
+    command_line = ffmpeg_command_line(
         ffmpeg_program_path,
-        '-framerate', f"{video_frame_rate}",
-        # following works well for small to large numbers of image files but doesn't work on Windows
-        '-pattern_type', 'glob', '-i', f"{base_image_file_path}/{vehicle_name}/{route}/'*.jpg'",
-        # on windows, doing following might result in overflowing shell buffers
-        # '-i', f"{base_image_file_path}/*.jpg",
-        '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
-        f"{mp4_file_full_path}/{vehicle_name}-{route}-fps{video_frame_rate:02}.mp4"
-    ]
+        video_frame_rate,
+        mp4_file_name,
+        image_glob=f"{image_file_full_path}/*.{image_file_extn}",
+    )
 
     console.print(f"{' '.join(command_line).replace(vin, fake_vin)}")
 
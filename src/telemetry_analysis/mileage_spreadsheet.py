@@ -13,16 +13,19 @@ See telemetry-analysis/docs/mileage_spreadsheet.md for more info.
 if __name__ == "__main__":
     import nbimporter
 
-import json
 from pathlib import Path
 from argparse import ArgumentParser
 from itertools import count
+from bisect import bisect_left
 from datetime import datetime, timedelta
 from pytz import timezone
 from openpyxl import load_workbook
 from rich.pretty import pprint
 from rich.console import Console
 
+from tcounter.binary_log import read_log_records
+from obd_log_to_csv.data_file_catalog import get_data_file_catalog
+
 from .pictures import image_directory_to_exif
 from .common import day_matches, within_timeframe
 
@@ -158,47 +161,31 @@ def gps_file_information(file_name, verbose=False)->tuple:
     first_location = None
     last_location = None
 
-    with open(file_name, "r") as json_input:
-        for line_number, json_record in enumerate(json_input, start=1):
-            try:
-                record = json.loads(json_record)
-            except json.decoder.JSONDecodeError as e:
-                # improperly closed JSON file
-                if verbose:
-                    print(f"Corrupted GPS JSON info at line {line_number}: {e}")
-                return iso_ts_pre, iso_ts_post, first_location, last_location
-            # {
-            #   "command_name": "NMEA_GNGNS",
-            #   "obd_response_value": {
-            #       "time": "18:14:57",
-            #       "lat": "29.51983417",
-            #       "NS": "N",
-            #       "lon": "-98.573058",
-            #       "EW": "W",
-            #       "posMode": "AA     ",
-            #       "numSV": "13",
-            #       "HDOP": "1.96",
-            #       "alt": "292.4",
-            #       "sep": "-22.8",
-            #       "diffAge": null,
-            #       "diffStation": null
-            #   },
-            #   "iso_ts_pre": "2023-03-24T22:39:33.542856+00:00",
-            #   "iso_ts_post": "2023-03-24T22:39:33.554321+00:00"
-            # }
-            if record['command_name'] == 'NMEA_GNGNS' and record['obd_response_value']['lat']:
-                if not iso_ts_pre:
-                    iso_ts_pre = datetime.fromisoformat(record['iso_ts_pre'])
-                    first_location = {
-                        'time': record['obd_response_value']['time'],
-                        'lat': record['obd_response_value']['lat'],
-                        'NS': record['obd_response_value']['NS'],
-                        'lon': record['obd_response_value']['lon'],
-                        'EW': record['obd_response_value']['EW'],
-                        'alt': record['obd_response_value']['alt'],
-                    }
-                iso_ts_post = datetime.fromisoformatisoformat(record['iso_ts_post'])
-                last_location = {
+    # stops at the first corrupted record (improperly closed file)
+    for record in read_log_records(file_name, verbose=verbose):
+        # {
+        #   "command_name": "NMEA_GNGNS",
+        #   "obd_response_value": {
+        #       "time": "18:14:57",
+        #       "lat": "29.51983417",
+        #       "NS": "N",
+        #       "lon": "-98.573058",
+        #       "EW": "W",
+        #       "posMode": "AA     ",
+        #       "numSV": "13",
+        #       "HDOP": "1.96",
+        #       "alt": "292.4",
+        #       "sep": "-22.8",
+        #       "diffAge": null,
+        #       "diffStation": null
+        #   },
+        #   "iso_ts_pre": "2023-03-24T22:39:33.542856+00:00",
+        #   "iso_ts_post": "2023-03-24T22:39:33.554321+00:00"
+        # }
+        if record['command_name'] == 'NMEA_GNGNS' and record['obd_response_value']['lat']:
+            if not iso_ts_pre:
+                iso_ts_pre = datetime.fromisoformat(record['iso_ts_pre'])
+                first_location = {
                     'time': record['obd_response_value']['time'],
                     'lat': record['obd_response_value']['lat'],
                     'NS': record['obd_response_value']['NS'],
@@ -206,6 +193,15 @@ def gps_file_information(file_name, verbose=False)->tuple:
                     'EW': record['obd_response_value']['EW'],
                     'alt': record['obd_response_value']['alt'],
                 }
+            iso_ts_post = datetime.fromisoformat(record['iso_ts_post'])
+            last_location = {
+                'time': record['obd_response_value']['time'],
+                'lat': record['obd_response_value']['lat'],
+                'NS': record['obd_response_value']['NS'],
+                'lon': record['obd_response_value']['lon'],
+                'EW': record['obd_response_value']['EW'],
+                'alt': record['obd_response_value']['alt'],
+            }
 
 
     return iso_ts_pre, iso_ts_post, first_location, last_location
@@ -218,9 +214,9 @@ def gps_logger_data(data_directory=DEFAULT_DATA_DIRECTORY, verbose=False)->dict:
     dictionary key is the tuple (first_location_record_iso_ts_pre, last_location_record_iso_ts_post)
     dictionary data is the dictionary of file_name, first_location_record, last_location_record
     """
-    root = Path(data_directory)
-    gps_files = [ str(gps_file) for gps_file in root.rglob("NMEA-[0-9]*-utc.json") if gps_file.is_file()]
-    gps_files += [ str(gps_file) for gps_file in root.rglob("*[0-9]-gps-[0-9]*.json") if gps_file.is_file()]
+    data_file_catalog = get_data_file_catalog(data_directory, verbose=verbose)
+    gps_files = [ str(gps_file) for gps_file in data_file_catalog.files(application='gps', flavor='original')]
+    gps_files += [ str(gps_file) for gps_file in data_file_catalog.files(application='gps', flavor='counter')]
 
     gps_data = {}
 
@@ -246,11 +242,12 @@ def strip_units_from_value(obd_response_value: str, verbose=False):
     """
     OBD Logger response values often look like string "58373.3 mile"
     Transform the value into a float 58373.3
+    obd_logger --compact_values logs plain numbers (e.g. 58373.3) which are returned as floats.
     """
     try:
         if isinstance(obd_response_value, str):
             return float((obd_response_value.split(' '))[0])
-        elif isinstance(obd_response_value, int):
+        elif isinstance(obd_response_value, (int, float)) and not isinstance(obd_response_value, bool):
             return float(obd_response_value)
     except ValueError:
         if verbose:
@@ -280,37 +277,29 @@ def obd_file_information(file_name:Path, verbose=False) -> tuple:
     first_FUEL_LEVEL = None
     last_FUEL_LEVEL = None
 
-    with open(file_name, "r") as json_input:
-        for line_number, json_record in enumerate(json_input, start=1):
-            try:
-                record = json.loads(json_record)
-            except json.decoder.JSONDecodeError as e:
-                # improperly closed JSON file
-                if verbose:
-                    print(f"Corrupted OBD JSON info at line {line_number}: {e}")
-                return iso_ts_pre, iso_ts_post, first_ODOMETER, last_ODOMETER, first_FUEL_LEVEL, last_FUEL_LEVEL
-
-            if record['command_name'] in ['ODOMETER', 'FUEL_LEVEL', ]:
-                if not iso_ts_pre:
-                    iso_ts_pre = datetime.fromisoformat(record['iso_ts_pre'])
-
-                iso_ts_post = datetime.fromisoformat(record['iso_ts_post'])
-
-            if record['command_name'] == 'ODOMETER' and record['obd_response_value']:
-                if not first_ODOMETER:
-                    first_ODOMETER = strip_units_from_value(record['obd_response_value'])
-                if temporary_last_ODOMETER := strip_units_from_value(
-                    record['obd_response_value']
-                ):
-                    last_ODOMETER = temporary_last_ODOMETER
-
-            if record['command_name'] == 'FUEL_LEVEL' and record['obd_response_value']:
-                if not first_FUEL_LEVEL:
-                    first_FUEL_LEVEL = strip_units_from_value(record['obd_response_value'])
-                if temporary_last_FUEL_LEVEL := strip_units_from_value(
-                    record['obd_response_value']
-                ):
-                    last_FUEL_LEVEL = temporary_last_FUEL_LEVEL
+    # stops at the first corrupted record (improperly closed file)
+    for record in read_log_records(file_name, verbose=verbose):
+        if record['command_name'] in ['ODOMETER', 'FUEL_LEVEL', ]:
+            if not iso_ts_pre:
+                iso_ts_pre = datetime.fromisoformat(record['iso_ts_pre'])
+
+            iso_ts_post = datetime.fromisoformat(record['iso_ts_post'])
+
+        if record['command_name'] == 'ODOMETER' and record['obd_response_value']:
+            if not first_ODOMETER:
+                first_ODOMETER = strip_units_from_value(record['obd_response_value'])
+            if temporary_last_ODOMETER := strip_units_from_value(
+                record['obd_response_value']
+            ):
+                last_ODOMETER = temporary_last_ODOMETER
+
+        if record['command_name'] == 'FUEL_LEVEL' and record['obd_response_value']:
+            if not first_FUEL_LEVEL:
+                first_FUEL_LEVEL = strip_units_from_value(record['obd_response_value'])
+            if temporary_last_FUEL_LEVEL := strip_units_from_value(
+                record['obd_response_value']
+            ):
+                last_FUEL_LEVEL = temporary_last_FUEL_LEVEL
 
     return iso_ts_pre, iso_ts_post, first_ODOMETER, last_ODOMETER, first_FUEL_LEVEL, last_FUEL_LEVEL
 
@@ -324,12 +313,12 @@ def obd_logger_data(vins:list, data_directory=DEFAULT_DATA_DIRECTORY, verbose=Fa
     dictionary data is the dictionary of file_name, first_ODOMETER_record, last_ODOMETER_record,
     first_FUEL_LEVEL_record, last_FUEL_LEVEL_record
     """
-    root = Path(data_directory)
+    data_file_catalog = get_data_file_catalog(data_directory, verbose=verbose)
 
     obd_data = {}
 
     for vin in vins:
-        obd_files = [str(gps_file) for gps_file in root.rglob(f"*{vin}*.json") if gps_file.is_file() if 'integrated' not in str(gps_file)]
+        obd_files = [str(obd_file) for obd_file in data_file_catalog.files(vin=vin)]
 
 
         for obd_file in obd_files:
@@ -493,8 +482,51 @@ def combined_data_filter(cd:dict, verbose=False)->dict:
     # filtered_combined_data = 
     return {k: combined_data_item_filter(v, verbose=verbose) for k, v in cd.items()}
 
+class TimeIntervalIndex():
+    """
+    Index of records from obd_logger_data() or gps_logger_data() sorted by time, for finding
+    the records closest to a datetime in O(log n).  Records are dictionary keys ending in
+    (iso_ts_pre, iso_ts_post).
+    """
+    def __init__(self, records):
+        # records ending before a datetime are looked up by iso_ts_post
+        self.by_post = sorted(records, key=lambda key: key[-1])
+        self.posts = [key[-1] for key in self.by_post]
+        # records starting around a datetime are looked up by iso_ts_pre
+        self.by_pre = sorted(records, key=lambda key: key[-2])
+        self.pres = [key[-2] for key in self.by_pre]
+
+    def before(self, aware:datetime, max_time_difference:timedelta):
+        """Key of the record ending last before aware, less than max_time_difference before it, or None."""
+        index = bisect_left(self.posts, aware) - 1
+        if index >= 0 and aware - self.posts[index] < max_time_difference:
+            return self.by_post[index]
+        return None
+
+    def after(self, aware:datetime, max_time_difference:timedelta):
+        """
+        Key of the record not ended before aware that starts closest to aware, less than
+        max_time_difference before or after it, or None.
+        """
+        index = bisect_left(self.pres, aware)
+
+        after_key = None
+        if index < len(self.pres) and self.pres[index] - aware < max_time_difference:
+            after_key = self.by_pre[index]
+
+        # records started shortly before aware and still going at aware
+        for earlier in range(index - 1, -1, -1):
+            if aware - self.pres[earlier] >= max_time_difference:
+                break
+            if self.by_pre[earlier][-1] >= aware:
+                if after_key is None or aware - self.pres[earlier] < after_key[-2] - aware:
+                    after_key = self.by_pre[earlier]
+                break
+
+        return after_key
+
 def match_engine_by_datetime(
-        aware:datetime, engine_records:dict,
+        aware:datetime, engine_records,
         max_time_difference=DEFAULT_MAXIMUM_FUEL_STOP_TIME_DIFFERENCE,
         verbose=False)->tuple:
     """
@@ -502,46 +534,36 @@ def match_engine_by_datetime(
     the engine data (key) collected just before the aware datetime as 'before' and the
     engine data (key) collected just after or within the first few minutes of the engine data
     as 'after'; returning 'before' and 'after' as a tuple. 
+    engine_records is a dictionary or, when matching many datetimes, a TimeIntervalIndex of it.
     """
-    before_key = None
-    after_key = None
-    for vin, iso_ts_pre, iso_ts_post in engine_records:
-        if iso_ts_post < aware and (aware - iso_ts_post) < max_time_difference:  # default 30 minutes
-            before_key = (vin, iso_ts_pre, iso_ts_post)
-        elif iso_ts_pre > aware and (iso_ts_pre - aware) < max_time_difference:  # default 30 minutes
-            after_key = (vin, iso_ts_pre, iso_ts_post)
-        elif iso_ts_pre < aware and aware - iso_ts_pre < max_time_difference:  # default 30 minutes
-            after_key = (vin, iso_ts_pre, iso_ts_post)
-        
-        if before_key and after_key:
-            return (before_key, after_key)
-
-    return (before_key, after_key)
+    if not isinstance(engine_records, TimeIntervalIndex):
+        engine_records = TimeIntervalIndex(engine_records)
+
+    # default 30 minutes
+    return (
+        engine_records.before(aware, max_time_difference),
+        engine_records.after(aware, max_time_difference),
+    )
 
 def match_location_by_datetime(
-        aware:datetime, location_records:dict,
+        aware:datetime, location_records,
         max_time_difference=DEFAULT_MAXIMUM_FUEL_STOP_TIME_DIFFERENCE,
-        verbose=False) -> tuple:  # sourcery skip: missing-dict-items
+        verbose=False) -> tuple:
     """
-    Given an aware datetime (aware) and engine records from obd_logger_data() return
-    the engine data (key) collected just before the aware datetime as 'before' and the
-    engine data (key) collected just after or within the first few minutes of the engine data
+    Given an aware datetime (aware) and location records from gps_logger_data() return
+    the location data (key) collected just before the aware datetime as 'before' and the
+    location data (key) collected just after or within the first few minutes of the location data
     as 'after'; returning 'before' and 'after' as a tuple. 
+    location_records is a dictionary or, when matching many datetimes, a TimeIntervalIndex of it.
     """
-    before_key = None
-    after_key = None
-    for iso_ts_pre, iso_ts_post in location_records:
-        if iso_ts_post < aware and (aware - iso_ts_post) < max_time_difference:  # default 30 minutes
-            before_key = (iso_ts_pre, iso_ts_post)
-        elif iso_ts_pre > aware and (iso_ts_pre - aware) < max_time_difference:  # default 30 minutes
-            after_key = (iso_ts_pre, iso_ts_post)
-        elif iso_ts_pre < aware and aware - iso_ts_pre < max_time_difference:    # default 30 minutes
-            after_key = (iso_ts_pre, iso_ts_post)
-
-        if before_key and after_key:
-            return (before_key, after_key)
+    if not isinstance(location_records, TimeIntervalIndex):
+        location_records = TimeIntervalIndex(location_records)
 
-    return (before_key, after_key)
+    # default 30 minutes
+    return (
+        location_records.before(aware, max_time_difference),
+        location_records.after(aware, max_time_difference),
+    )
 
 def combine_data(
         vins, spreadsheet_data, location_data, engine_data, fuel_fill_picture_data,
@@ -609,6 +631,7 @@ def combine_data(
         #        ],
 
         engine = {k: v for k, v in engine_data.items() if k[0] == vin}
+        engine_index = TimeIntervalIndex(engine)
         # engine
         # ('<VIN>', <iso_ts_pre>, <iso_ts_post>): {
         #       'vin': '<VIN>',
@@ -628,7 +651,7 @@ def combine_data(
                 spreadsheet['engine_after'] = None
                 continue
 
-            engine_before_key, engine_after_key = match_engine_by_datetime(aware_datetime, engine, verbose=verbose)
+            engine_before_key, engine_after_key = match_engine_by_datetime(aware_datetime, engine_index, verbose=verbose)
 
             if engine_before_key:
                 spreadsheet['engine_before'] = engine[engine_before_key]
@@ -641,6 +664,7 @@ def combine_data(
                 spreadsheet['engine_after'] = None
 
         location = dict(location_data.items())
+        location_index = TimeIntervalIndex(location)
         #    (datetime.datetime(2000, 1, 1, 0, 0, 35, 881668, tzinfo=tzutc()), datetime.datetime(2000, 1, 1, 0, 6, 30, 852010, tzinfo=tzutc())): {
         #        'iso_ts_pre': datetime.datetime(2000, 1, 1, 0, 0, 35, 881668, tzinfo=tzutc()),
         #        'iso_ts_post': datetime.datetime(2000, 1, 1, 0, 6, 30, 852010, tzinfo=tzutc()),
@@ -656,7 +680,7 @@ def combine_data(
                 spreadsheet['location_after'] = None
                 continue
 
-            location_before_key, location_after_key = match_location_by_datetime(aware_datetime, location, verbose=verbose)
+            location_before_key, location_after_key = match_location_by_datetime(aware_datetime, location_index, verbose=verbose)
 
             if location_before_key:
                 spreadsheet['location_before'] = location[location_before_key]
@@ -6,7 +6,11 @@ from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
 from pathlib import Path
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from os import path as os_path
+import pickle
+import sqlite3
 import pytz
 from rich.console import Console
 from rich.pretty import pprint
@@ -15,6 +19,26 @@ DEFAULT_HOME_TIMEZONE = pytz.timezone('US/Central')
 DEFAULT_IMAGE_DIRECTORY = Path.home() / Path("telemetry-data/fuel-images")
 DEFAULT_IMAGE_SUFFIX = '.jpg'
 
+# image_directory_to_exif() keeps the EXIF data of each image in this file in the image directory
+EXIF_CACHE_FILE_NAME = ".exif_cache.sqlite3"
+EXIF_CACHE_TIMEOUT = 60.0       # seconds to wait for another process updating the cache
+
+EXIF_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    exif BLOB
+);
+"""
+
+# JPEG markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, }
+JPEG_SOS_MARKER = 0xDA          # start of scan, compressed image data follows
+JPEG_EOI_MARKER = 0xD9          # end of image
+JPEG_APP1_MARKER = 0xE1         # EXIF (or XMP) segment
+EXIF_HEADER = b"Exif\x00\x00"
+
 # In this case, available_timezones are limited to the ones in the USA.
 # Also, timezone ordering is important.  Use the following commented line
 # to retrieve timezones and then order them as needed.
@@ -181,14 +205,56 @@ def exif_to_location(ie:dict, gps_info='GPSInfo')->dict:
         "alt": altitude,                            # meters above (positive values) sea level
     }
 
+def read_jpeg_exif_segment(image_path:str)->bytes:
+    """
+    Return a JPEG file's EXIF (APP1) segment, reading only the segments in front of it.
+    Returns None when the file isn't a JPEG file or has no EXIF segment.
+    """
+    with open(image_path, "rb") as image_file:
+        if image_file.read(2) != b"\xff\xd8":
+            return None
+
+        while True:
+            marker = image_file.read(2)
+            # markers may be padded with extra 0xFF bytes
+            while marker == b"\xff\xff":
+                marker = b"\xff" + image_file.read(1)
+            if len(marker) < 2 or marker[0] != 0xFF or marker[1] in (JPEG_SOS_MARKER, JPEG_EOI_MARKER):
+                return None
+            if marker[1] in JPEG_STANDALONE_MARKERS:
+                continue
+
+            length = int.from_bytes(image_file.read(2), "big")
+            if length < 2:
+                return None
+            if marker[1] == JPEG_APP1_MARKER:
+                segment = image_file.read(length - 2)
+                if segment.startswith(EXIF_HEADER):
+                    return segment
+            else:
+                image_file.seek(length - 2, 1)
+
+def image_to_raw_exif(image_path:str)->dict:
+    """
+    The image's EXIF tags (tag number: value) in the form returned by PIL's Image._getexif().
+    JPEG files are read only up to their EXIF segment, other images are opened with PIL.
+    """
+    exif_segment = read_jpeg_exif_segment(image_path)
+    if exif_segment is None:
+        with Image.open(image_path) as image:
+            return image._getexif()
+
+    exif = Image.Exif()
+    exif.load(exif_segment)
+    return exif._get_merged_dict()
+
 def image_to_exif(image_path:str, verbose=False)->dict:
     # sourcery skip: assign-if-exp, dict-comprehension, use-next
     """
     Extract image data and return a dictionary (which may include dictionaries)
     containing the image's EXIF data. 
     """
-    image = Image.open(image_path)
-    raw_exif_data = image._getexif()
+    raw_exif_data = image_to_raw_exif(image_path)
     return_value = {}
 
     for k, v in raw_exif_data.items():
@@ -233,7 +299,111 @@ def image_to_exif(image_path:str, verbose=False)->dict:
 
     return return_value
 
-def image_directory_to_exif(image_directory=DEFAULT_IMAGE_DIRECTORY, image_suffix=DEFAULT_IMAGE_SUFFIX, verbose=False) -> dict:
+class ExifCache():
+    """
+    SQLite cache of image_to_exif() results for the images in a directory, by image path
+    (relative to the directory), size and modification time.
+    """
+
+    def __init__(self, image_directory, verbose=False):
+        """Init function."""
+        self.image_directory = Path(image_directory)
+        self.cache_file_path = self.image_directory / EXIF_CACHE_FILE_NAME
+        self.verbose = verbose
+
+        self.connection = sqlite3.connect(self.cache_file_path, timeout=EXIF_CACHE_TIMEOUT)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(EXIF_CACHE_SCHEMA)
+
+    def relative_path(self, image_path) -> str:
+        """Cache paths are relative to the image directory."""
+        return os_path.relpath(image_path, self.image_directory)
+
+    def get(self, image_path) -> dict:
+        """Cached EXIF data for image_path, None when not cached or the image changed since."""
+        row = self.connection.execute(
+            "SELECT * FROM images WHERE path = ?", (self.relative_path(image_path), )
+        ).fetchone()
+        if row is None:
+            return None
+
+        stat = Path(image_path).stat()
+        if stat.st_size != row['size'] or stat.st_mtime_ns != row['mtime_ns']:
+            return None
+
+        return pickle.loads(row['exif'])
+
+    def put(self, exif_by_image:dict):
+        """Cache a dictionary of image path: EXIF data."""
+        with self.connection:
+            for image_path, exif_data in exif_by_image.items():
+                stat = Path(image_path).stat()
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)",
+                    (self.relative_path(image_path), stat.st_size, stat.st_mtime_ns, pickle.dumps(exif_data))
+                )
+
+    def keep_only(self, image_paths:list):
+        """Forget the images not in image_paths."""
+        keep = {self.relative_path(image_path) for image_path in image_paths}
+        with self.connection:
+            for row in self.connection.execute("SELECT path FROM images").fetchall():
+                if row['path'] not in keep:
+                    self.connection.execute("DELETE FROM images WHERE path = ?", (row['path'], ))
+
+    def close(self):
+        """Close the cache database."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def images_to_exif(images:list, image_directory, use_cache=True, jobs=0, verbose=False)->dict:
+    """
+    Return a dictionary of image: image_to_exif(image) for images in image_directory.
+    With use_cache, results are kept in image_directory's ExifCache and only images that are
+    new or changed since are read.  Those are read by up to jobs threads at once
+    (0 uses the ThreadPoolExecutor default, 1 reads them one at a time).
+    """
+    exif_by_image = {}
+    cache = ExifCache(image_directory, verbose=verbose) if use_cache else None
+
+    try:
+        if cache is not None:
+            for image in images:
+                if (exif_data := cache.get(image)) is not None:
+                    exif_by_image[image] = exif_data
+
+        misses = [image for image in images if image not in exif_by_image]
+        if verbose:
+            console.print(f"EXIF data cached for {len(exif_by_image)} images, reading {len(misses)} images")
+
+        if jobs == 1 or len(misses) <= 1:
+            read_exif_data = {image: image_to_exif(image, verbose=verbose) for image in misses}
+        else:
+            with ThreadPoolExecutor(max_workers=jobs or None) as executor:
+                read_exif_data = dict(zip(
+                    misses, executor.map(lambda image: image_to_exif(image, verbose=verbose), misses)
+                ))
+        exif_by_image.update(read_exif_data)
+
+        # cache updates stay in this thread
+        if cache is not None:
+            cache.put(read_exif_data)
+            cache.keep_only(images)
+
+    finally:
+        if cache is not None:
+            cache.close()
+
+    return exif_by_image
+
+def image_directory_to_exif(image_directory=DEFAULT_IMAGE_DIRECTORY, image_suffix=DEFAULT_IMAGE_SUFFIX, verbose=False,
+                            use_cache=True, jobs=0) -> dict:
     """
     Given an image_directory, find all images in the directory (and sub-directories)
     matching the image_suffix.
@@ -241,12 +411,16 @@ def image_directory_to_exif(image_directory=DEFAULT_IMAGE_DIRECTORY, image_suffi
     Return a dictionary with
         key - (DateTime, image_file_name)
         value - exif data
+
+    EXIF data is cached in the image directory (see images_to_exif()), so only new or
+    changed images are read again.
     """
     root = Path(image_directory)
     images = [ str(image) for image in root.rglob(f"*{image_suffix}") if image.is_file()]
+    exif_by_image = images_to_exif(images, root, use_cache=use_cache, jobs=jobs, verbose=verbose)
     image_exif_data = {}
     for image in images:
-        exif_data = image_to_exif(image, verbose=verbose)
+        exif_data = exif_by_image[image]
         # Use local or naive datetime to enable matching to spreadsheet data
         if 'LocalDateTimeOriginal' in exif_data:
             LocalDateTime = exif_data['LocalDateTimeOriginal']
@@ -2,7 +2,6 @@
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from os import linesep as LF
 from math import sqrt, atan2, tan, pi, radians, ceil
@@ -18,7 +17,8 @@ from rich.jupyter import print
 
 # import telemetry-analysis modules
 from private.vehicles import vehicles
-from telemetry_analysis.common import data_file_base_directory
+from telemetry_analysis.common import data_file_base_directory, read_study_data_chunks
+from obd_log_to_csv.data_file_catalog import get_data_file_catalog
 
 # import external telemetry modules
 from obd_log_to_csv.obd_log_evaluation import input_file as obd_log_evaluation_input_file
@@ -32,9 +32,8 @@ def quotes_around_string(command:str)->str:
 
 def obd_log_evaluation_report(vin, console, width=None, verbose=False):
     # Make a list of OBD data files.
-    # directory where "*.json" OBD data files are held
-    root = Path(data_file_base_directory)
-    obd_files = [ str(rp) for rp in root.rglob(f"*{vin}*.json") if rp.is_file() ]
+    # directory where "*.json" and "*.vtsb" OBD data files are held
+    obd_files = [ str(rp) for rp in get_data_file_catalog(data_file_base_directory).files(vin=vin, integrated=None) ]
 
     console.print(f"OBD Log Evaluation Report: {vehicles[vin]['name']} OBD data file count {len(obd_files)}\n")
 
@@ -86,23 +85,113 @@ def basic_stats_table_generator(vin:str, basic_statistics:dict):
     console.print(f"{'=' * 80}\n{vehicles[vin]['name']}")
     console.print(table)
 
+STATISTICS_CHUNK_ROWS = 100000      # rows read at a time by low_memory_basic_statistics()
+
+class StreamingStatistics():
+    """
+    Single pass max, min, mean, standard deviation and null row counts for one column.
+
+    Each chunk of column values is summarized with pandas and then merged into the running
+    totals using the parallel form of Welford's algorithm (Chan, Golub and LeVeque).
+    Accumulators for different chunks, files or processes can be combined with merge().
+    The standard deviation is the sample standard deviation, same as pandas.Series.std().
+    """
+    def __init__(self):
+        """Init function."""
+        self.count = 0              # not null values
+        self.null_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0               # sum of squared differences from the mean
+        self.max = None
+        self.min = None
+        self.numeric = True         # False once non-numeric values (e.g. strings) are seen
+        self.comparable = True      # False once values can't be compared (e.g. strings and numbers)
+
+    def update(self, series:pd.Series):
+        """Add a chunk of column values."""
+        values = series[series.notnull()]
+
+        chunk = StreamingStatistics()
+        chunk.count = len(values)
+        chunk.null_count = len(series) - chunk.count
+
+        if chunk.count:
+            try:
+                chunk.max = values.max()
+                chunk.min = values.min()
+            except TypeError:
+                chunk.comparable = False
+
+            if pd.api.types.is_numeric_dtype(values):
+                chunk.mean = values.mean()
+                chunk.m2 = ((values - chunk.mean) ** 2).sum()
+            else:
+                chunk.numeric = False
+
+        self.merge(chunk)
+
+    def merge(self, other:'StreamingStatistics'):
+        """Combine another accumulator's values with this one."""
+        self.null_count += other.null_count
+        self.numeric = self.numeric and other.numeric
+        self.comparable = self.comparable and other.comparable
+
+        if other.count == 0:
+            return
+
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.max, self.min = other.max, other.min
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+        if self.comparable:
+            try:
+                self.max = max(self.max, other.max)
+                self.min = min(self.min, other.min)
+            except TypeError:
+                self.comparable = False
+
+    def to_dict(self) -> dict:
+        """Statistics in the form used by basic_stats_table_generator()."""
+        nan = float('nan')
+        return {
+            'max': (self.max if self.count else nan) if self.comparable else "NaN",
+            'min': (self.min if self.count else nan) if self.comparable else "NaN",
+            'mean': (self.mean if self.count else nan) if self.numeric else "NaN",
+            'std': (sqrt(self.m2 / (self.count - 1)) if self.count > 1 else nan) if self.numeric else "NaN",
+            'not_null_rows': self.count,
+            'null_rows': self.null_count,
+        }
+
 def basic_statistics(vin:str, columns:list, df:pd.DataFrame) -> dict:
+    """
+    Statistics for columns of a dataframe already in memory, computed by pandas so that
+    datetime and object columns get the same mean and std as pandas gives them.
+    StreamingStatistics is only used when accumulating across chunks or files.
+    """
     return_dict = {}
     for column in columns:
+        values = df[column][df[column].notnull()]
         try:
-            return_max = (df[df[column].notnull()])[column].max()
+            return_max = values.max()
         except TypeError:
             return_max = "NaN"
         try:
-            return_min = (df[df[column].notnull()])[column].min()
+            return_min = values.min()
         except TypeError:
             return_min = "NaN"
         try:
-            return_mean = (df[df[column].notnull()])[column].mean()
+            return_mean = values.mean()
         except TypeError:
             return_mean = "NaN"
         try:
-            return_std = (df[df[column].notnull()])[column].std()
+            return_std = values.std()
         except TypeError:
             return_std = "NaN"
 
@@ -111,8 +200,8 @@ def basic_statistics(vin:str, columns:list, df:pd.DataFrame) -> dict:
             'min': return_min,
             'mean': return_mean,
             'std': return_std,
-            'not_null_rows': (df[df[column].notnull()])[column].shape[0],
-            'null_rows': df.shape[0] - (df[df[column].notnull()])[column].shape[0],
+            'not_null_rows': values.shape[0],
+            'null_rows': df.shape[0] - values.shape[0],
         }
 
     return return_dict
@@ -126,22 +215,33 @@ def generate_basic_stats_report(vin:str, df:pd.DataFrame, columns:list)->dict:
 
     return df_basic_statistics
 
-def low_memory_basic_statistics(vin:str, columns:list, csv_file)->dict:
-    df_basic_statistics = {}
+def file_statistics(file_name, columns:list, chunk_rows:int=STATISTICS_CHUNK_ROWS) -> dict:
+    """
+    StreamingStatistics for each column of a CSV or Parquet file.
+    The file is read once, chunk_rows rows at a time.
+    """
+    columns = list(dict.fromkeys(columns))
+    statistics = {column: StreamingStatistics() for column in columns}
 
-    for column in columns:
-        df = pd.read_csv(csv_file, usecols=[column, ])
-        df_basic_statistics[column] = {
-            'max': (df[df[column].notnull()])[column].max(),
-            'min': (df[df[column].notnull()])[column].min(),
-            'mean': (df[df[column].notnull()])[column].mean(),
-            'std': (df[df[column].notnull()])[column].std(),
-            'not_null_rows': (df[df[column].notnull()])[column].shape[0],
-            'null_rows': df.shape[0] - (df[df[column].notnull()])[column].shape[0],
-        }
-        del df
+    for df in read_study_data_chunks(file_name, columns=columns, chunk_rows=chunk_rows):
+        for column in columns:
+            statistics[column].update(df[column])
 
-    return df_basic_statistics
+    return statistics
+
+def low_memory_basic_statistics(vin:str, columns:list, csv_file, chunk_rows:int=STATISTICS_CHUNK_ROWS)->dict:
+    """
+    Same statistics as basic_statistics() without loading whole files into memory.
+    csv_file is one CSV or Parquet file or a list of them, each read once for all columns.
+    """
+    csv_files = csv_file if isinstance(csv_file, (list, tuple)) else [csv_file, ]
+    statistics = {column: StreamingStatistics() for column in columns}
+
+    for file_name in csv_files:
+        for column, column_statistics in file_statistics(file_name, columns, chunk_rows=chunk_rows).items():
+            statistics[column].merge(column_statistics)
+
+    return {column: statistics[column].to_dict() for column in columns}
 
 def generate_low_memory_basic_stats_report(vin:str, csv_file, columns:list):
     """
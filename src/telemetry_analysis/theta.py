@@ -6,6 +6,7 @@ from pathlib import Path
 from rich.console import Console
 from rich.jupyter import print
 from math import sqrt, atan2, tan, pi, radians, ceil
+import numpy as np
 
 from .common import work_product_file_path, temporary_file_base_directory, data_file_base_directory
 from private.vehicles import vehicles
@@ -115,3 +116,92 @@ def signed_point_to_line_distance(x0:float, y0:float, a:float, b:float, c:float)
 def signed_point_to_theta_line_distance(x: float, y:float, theta:float)->float:
     return signed_point_to_line_distance(x, y, tan(theta), -1.0, 0.0)
 
+# NumPy array versions of the distance functions above.
+# x, y, theta, a, b and c may be arrays or scalars, results are arrays of float64.
+# Results are bit for bit the same as the scalar versions: the same operations are done in the
+# same order, and tan() of each distinct theta is computed with math.tan() (see theta_line_slopes()).
+
+# slopes = theta_line_slopes(theta)
+# where
+#       slopes is tan(theta) computed with math.tan() once for each distinct theta value.
+#       Theta lines are gear lines, so there are only a handful of distinct values.
+def theta_line_slopes(theta)->np.ndarray:
+    theta = np.asarray(theta, dtype=np.float64)
+    unique_thetas, inverse = np.unique(theta, return_inverse=True)
+    unique_slopes = np.array([tan(t) for t in unique_thetas], dtype=np.float64)
+    return unique_slopes[inverse].reshape(theta.shape)
+
+def point_to_line_distance_array(x0, y0, a, b, c)->np.ndarray:
+    return np.abs(signed_point_to_line_distance_array(x0, y0, a, b, c))
+
+def point_to_theta_line_distance_array(x, y, theta)->np.ndarray:
+    return point_to_line_distance_array(x, y, theta_line_slopes(theta), -1.0, 0.0)
+
+def signed_point_to_line_distance_array(x0, y0, a, b, c)->np.ndarray:
+    x0 = np.asarray(x0, dtype=np.float64)
+    y0 = np.asarray(y0, dtype=np.float64)
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return ((a*x0) + (b*y0) + c) / np.sqrt((a*a) + (b*b))
+
+def signed_point_to_theta_line_distance_array(x, y, theta)->np.ndarray:
+    return signed_point_to_line_distance_array(x, y, theta_line_slopes(theta), -1.0, 0.0)
+
+# gears, gear_thetas = sorted_gear_thetas(theta_data, vin)
+# where
+#       gears are the gear numbers and gear_thetas their theta values as NumPy arrays sorted by theta.
+#       Gear 0 (no gear) and gears without a theta value are left out.
+def sorted_gear_thetas(theta_data:dict, vin:str)->tuple:
+    gear_list = [
+        (data['theta'], gear)
+        for gear, data in theta_data[vin].items()
+        if gear and data['theta'] is not None
+    ]
+    gear_list.sort()
+    return (
+        np.array([gear for theta, gear in gear_list], dtype=np.int64),
+        np.array([theta for theta, gear in gear_list], dtype=np.float64),
+    )
+
+# closest_gear, theta_error, distance_error = classify_gears(theta_data, vin, rps, mps, theta)
+# where
+#       rps, mps and theta are equal length array-likes of (rps, mps) points and their theta values
+#       closest_gear is the gear whose theta line is nearest to theta (0 when theta is missing or
+#           no theta data is available for vin)
+#       theta_error is the closest gear's theta minus theta
+#       distance_error is signed_point_to_theta_line_distance(rps, mps, closest gear theta)
+#       theta_error and distance_error are NaN where closest_gear is 0
+# The nearest gear for every point is found at once with a binary search (numpy.searchsorted)
+# of the sorted gear thetas, comparing the gears just below and just above each theta.
+def classify_gears(theta_data:dict, vin:str, rps, mps, theta)->tuple:
+    rps = np.asarray(rps, dtype=np.float64)
+    mps = np.asarray(mps, dtype=np.float64)
+    theta = np.asarray(theta, dtype=np.float64)
+
+    closest_gear = np.zeros(theta.shape, dtype=np.int64)
+    theta_error = np.full(theta.shape, np.nan)
+    distance_error = np.full(theta.shape, np.nan)
+
+    if not theta_data or vin not in theta_data:
+        return closest_gear, theta_error, distance_error
+
+    gears, gear_thetas = sorted_gear_thetas(theta_data, vin)
+    valid = ~np.isnan(theta)
+    if len(gears) == 0 or not valid.any():
+        return closest_gear, theta_error, distance_error
+
+    # index of the first gear theta >= theta, clipped to the gears below and above
+    above = np.minimum(np.searchsorted(gear_thetas, theta[valid]), len(gear_thetas) - 1)
+    below = np.maximum(above - 1, 0)
+    nearest = np.where(
+        np.abs(gear_thetas[below] - theta[valid]) <= np.abs(gear_thetas[above] - theta[valid]),
+        below,
+        above,
+    )
+
+    nearest_theta = gear_thetas[nearest]
+    closest_gear[valid] = gears[nearest]
+    theta_error[valid] = nearest_theta - theta[valid]
+    distance_error[valid] = signed_point_to_theta_line_distance_array(rps[valid], mps[valid], nearest_theta)
+
+    return closest_gear, theta_error, distance_error
@@ -0,0 +1,227 @@
+# telemetry-analysis/telemetry_analysis/video.py
+#
+# Renders the frames of the gear study (rps, mps) videos made by gears.generate_images_for_video()
+# and turns them into MP4 files with ffmpeg.
+#
+# A route is sliced out of the gear study DataFrame once into NumPy arrays.  Each renderer draws
+# one matplotlib figure and then only updates its artists (points, labels and gear line colors)
+# from frame to frame, which avoids the memory growth of creating a figure per frame.
+# With jobs > 1, frames are split across worker processes, each with its own renderer.
+# Frames are either written as image files or piped straight into ffmpeg's standard input.
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from os import cpu_count
+from pathlib import Path
+from threading import Thread
+import subprocess
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
+from matplotlib.colors import Normalize
+
+from telemetry_analysis.common import timedelta_to_hhmmss_str
+
+FRAME_FIGSIZE = (12, 6)         # inches
+FRAME_DPI = 300
+FRAME_XLIM = (0.0, 80.0)        # rps
+FRAME_YLIM = (0.0, 60.0)        # mps
+FRAME_POINT_SIZE = 200
+FRAME_CHUNK_SIZE = 16           # frames handed to a worker process at a time
+
+# data label positions in (rps, mps) plot coordinates
+XSPEED = 2.0
+YSPEED = 55.0
+XRPM = 70.0
+YRPM = 2.0
+XGEAR = XSPEED
+YGEAR = YSPEED - 5.0
+XFPS = XGEAR                    # frames per second x coordinate
+YFPS = YGEAR - 5.0              # frames per second y coordinate
+XSECS = XFPS                    # seconds into video (reflects drive time) x coordinate
+YSECS = YFPS - 5.0              # seconds into video (reflects drive time) y coordinate
+
+# frame_data = route_frame_data(df, route, trailing_points)
+# where
+#       frame_data is a dictionary of NumPy arrays, one element per frame (gear study row) in route,
+#       sorted by row number 'i':
+#           'i', 'rps', 'mps', 'mph', 'rpm', 'closest_gear',
+#           'elapsed' (seconds of driving since the start of the route) and
+#           'first' (index of the first point shown with the frame, trailing_points rows back)
+def route_frame_data(df:pd.DataFrame, route:int, trailing_points:int)->dict:
+    df_route = (df[df['route'] == route]).sort_values('i')
+    i = df_route['i'].to_numpy()
+
+    return {
+        'i': i,
+        'rps': df_route['rps'].to_numpy(dtype=np.float64),
+        'mps': df_route['mps'].to_numpy(dtype=np.float64),
+        'mph': df_route['SPEED'].to_numpy(dtype=np.float64) * 0.621371,
+        'rpm': df_route['RPM'].to_numpy(dtype=np.float64),
+        'closest_gear': df_route['closest_gear'].to_numpy(),
+        'elapsed': np.cumsum(df_route['duration'].to_numpy(dtype=np.float64)),
+        'first': np.searchsorted(i, i - trailing_points, side='left'),
+    }
+
+class GearVideoFrameRenderer():
+    """
+    Draws gear study video frames on one reusable matplotlib figure.
+    gear_lines is a dictionary of gear: (list of (rps, mps) line end points, color).
+    render(frame) returns the frame as image file bytes.
+    """
+    def __init__(
+        self,
+        frame_data:dict,
+        gear_lines:dict,
+        title:str,
+        video_frame_rate:int,
+        trailing_points:int,
+        image_format:str='jpg',
+        dpi:int=FRAME_DPI,
+    ):
+        self.frame_data = frame_data
+        self.trailing_points = trailing_points
+        self.image_format = image_format
+        self.dpi = dpi
+
+        sns.set_theme(style="ticks")
+        # Figure (not pyplot) figures aren't tracked by pyplot and are freed with the renderer
+        self.fig = Figure(figsize=FRAME_FIGSIZE)
+        self.ax = self.fig.subplots()
+        self.ax.set_xlim(*FRAME_XLIM)
+        self.ax.set_ylim(*FRAME_YLIM)
+        self.ax.set(title=title, xlabel='rps', ylabel='mps')
+
+        # same look as seaborn.scatterplot(hue='i', palette='Blues', s=FRAME_POINT_SIZE)
+        self.points = self.ax.scatter(
+            [], [], c=[], cmap='Blues', s=FRAME_POINT_SIZE,
+            edgecolors='white', linewidths=0.08 * np.sqrt(FRAME_POINT_SIZE),
+        )
+
+        self.gear_lines = {}
+        for gear, (points, color) in gear_lines.items():
+            (line, ) = self.ax.plot([x for x, y in points], [y for x, y in points], color=color)
+            self.gear_lines[gear] = (line, color, line.get_linewidth())
+
+        def text(x, y):
+            return self.fig.text(x=x, y=y, s="", transform=self.ax.transData, color="blue")
+
+        self.mph_text = text(XSPEED, YSPEED)
+        self.rpm_text = text(XRPM, YRPM)
+        self.fps_text = text(XFPS, YFPS)
+        self.elapsed_text = text(XSECS, YSECS)
+        self.gear_text = text(XGEAR, YGEAR)
+        self.fps_text.set_text(f"FPS:{video_frame_rate:8}")
+
+    def render(self, frame:int)->bytes:
+        """Update the figure to show frame and return it as image file bytes."""
+        data = self.frame_data
+        i = data['i'][frame]
+        first = data['first'][frame]
+
+        self.points.set_offsets(np.column_stack((data['rps'][first:frame + 1], data['mps'][first:frame + 1])))
+        self.points.set_array(data['i'][first:frame + 1])
+        self.points.set_norm(Normalize(i - self.trailing_points, i))
+
+        closest_gear = data['closest_gear'][frame]
+        self.mph_text.set_text(f"MPH:{data['mph'][frame]:5.1f}")
+        self.rpm_text.set_text(f"RPM:{data['rpm'][frame]:5.0f}")
+        self.elapsed_text.set_text(timedelta_to_hhmmss_str(timedelta(seconds=float(data['elapsed'][frame]))))
+        self.gear_text.set_text(f"gear:{closest_gear:8}")
+
+        for gear, (line, color, linewidth) in self.gear_lines.items():
+            if gear == closest_gear:
+                line.set_color('black')
+                line.set_linewidth(2.0)
+            else:
+                line.set_color(color)
+                line.set_linewidth(linewidth)
+
+        image = BytesIO()
+        self.fig.savefig(image, format=self.image_format, dpi=self.dpi)
+        return image.getvalue()
+
+# Worker process state for render_frames(), set by init_worker_renderer()
+worker_renderer = None
+worker_image_file_path = None
+
+def init_worker_renderer(image_file_path, *renderer_args):
+    global worker_renderer, worker_image_file_path
+    worker_renderer = GearVideoFrameRenderer(*renderer_args)
+    worker_image_file_path = image_file_path
+
+def render_worker_frame(frame:int):
+    """Render frame in a worker process.  Writes the image file or returns the image bytes."""
+    return write_or_return_frame(worker_renderer, worker_image_file_path, frame)
+
+def write_or_return_frame(renderer:GearVideoFrameRenderer, image_file_path, frame:int):
+    image = renderer.render(frame)
+    if image_file_path is None:
+        return image
+    with open(Path(image_file_path) / frame_image_file_name(renderer.frame_data, frame, renderer.image_format), "wb") as image_file:
+        image_file.write(image)
+    return None
+
+def frame_image_file_name(frame_data:dict, frame:int, image_format:str)->str:
+    return f"{frame_data['i'][frame]:010}.{image_format}"
+
+# Generator returning frame image bytes (image_file_path None) or None after writing each frame
+# to image_file_path, in frame order.
+#       frames is the list of frame indexes into frame_data to render
+#       renderer_args are the GearVideoFrameRenderer() arguments
+#       jobs is the number of worker processes, 0 for one per CPU, 1 renders in this process
+def render_frames(frames:list, image_file_path, renderer_args:tuple, jobs:int=1):
+    if jobs == 0:
+        jobs = cpu_count()
+
+    if jobs > 1 and len(frames) > 1:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=init_worker_renderer,
+            initargs=(image_file_path, *renderer_args),
+        ) as executor:
+            yield from executor.map(render_worker_frame, frames, chunksize=FRAME_CHUNK_SIZE)
+    else:
+        renderer = GearVideoFrameRenderer(*renderer_args)
+        for frame in frames:
+            yield write_or_return_frame(renderer, image_file_path, frame)
+
+# command_line = ffmpeg_command_line(ffmpeg_program_path, video_frame_rate, mp4_file_name, image_glob)
+# where
+#       image_glob is the image files to read, None reads images piped to standard input
+def ffmpeg_command_line(ffmpeg_program_path:str, video_frame_rate:int, mp4_file_name:str, image_glob:str=None)->list:
+    if image_glob is None:
+        image_input = ['-f', 'image2pipe', '-i', '-']
+    else:
+        # following works well for small to large numbers of image files but doesn't work on Windows
+        image_input = ['-pattern_type', 'glob', '-i', image_glob]
+
+    return [
+        ffmpeg_program_path,
+        '-y',
+        '-framerate', f"{video_frame_rate}",
+        *image_input,
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+        mp4_file_name,
+    ]
+
+# Pipe rendered frames into ffmpeg's standard input, returns ffmpeg's output
+def stream_frames_to_ffmpeg(command_line:list, frames)->bytes:
+    output = []
+    with subprocess.Popen(command_line, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as child:
+        # ffmpeg output is read in a thread so a full stdout pipe can't block writes to stdin
+        reader = Thread(target=lambda: output.extend(iter(lambda: child.stdout.read(65536), b"")), daemon=True)
+        reader.start()
+        try:
+            for image in frames:
+                child.stdin.write(image)
+        finally:
+            child.stdin.close()
+            reader.join()
+
+    if child.returncode:
+        raise subprocess.CalledProcessError(child.returncode, command_line, output=b"".join(output))
+
+    return b"".join(output)
@@ -1,15 +1,23 @@
 """telemetry_obd/obd_common_functions.py: Common OBD functions."""
 
-from time import sleep
+from time import sleep, monotonic
 from typing import List
 from datetime import datetime, timezone
+from pathlib import Path
 import logging
 import configparser
+import json
+import re
 import obd
 from pint import UnitRegistry
 from obd.utils import BitArray
 from obd.codes import BASE_TESTS
-from obd.OBDResponse import Status
+from obd.OBDResponse import Status, OBDResponse
+from obd.OBDCommand import OBDCommand
+from obd.protocols import ECU
+from obd.protocols.protocol import Message
+from obd.decoders import drop
+from tcounter.common import BASE_PATH, HOST_ID
 from .add_commands import NEW_COMMANDS, ureg
 
 logger = logging.getLogger(__name__)
@@ -17,6 +25,28 @@ logger = logging.getLogger(__name__)
 CONNECTION_WAIT_DELAY = 15.0
 CONNECTION_RETRY_COUNT = 5
 
+# SkipList defaults
+NULL_RESPONSE_LIMIT = 10            # consecutive null responses before a command is skipped
+SKIP_RETRY_INTERVAL = 600.0         # seconds between retries of commands skipped for null responses
+
+# Supported PID bitmap commands, each covers the 32 PIDs following its own PID
+SUPPORTED_PIDS_COMMAND_NAMES = {
+    1: ['PIDS_A', 'PIDS_B', 'PIDS_C', 'PIDS_D', 'PIDS_E', 'PIDS_F', 'PIDS_G', ],
+    9: ['PIDS_9A', ],
+}
+
+# Multiple PID requests (SAE J1979) are limited to 6 mode 01 PIDs and ISO 15765-4 CAN protocols
+MULTI_PID_BATCH_SIZE = 6
+CAN_PROTOCOL_IDS = ["6", "7", "8", "9", ]
+
+# AdaptiveCommandNameGenerator defaults
+ADAPTIVE_CYCLE_BUDGET = 2.0         # seconds of estimated OBD query time per scheduled cycle
+ADAPTIVE_MIN_PERIOD = 0.25          # seconds, polling period for the most volatile commands
+ADAPTIVE_MAX_PERIOD = 60.0          # seconds, polling period for commands that never change
+ADAPTIVE_HOT_VOLATILITY = 0.05      # relative change per sample at or above which commands poll at ADAPTIVE_MIN_PERIOD
+ADAPTIVE_DEFAULT_LATENCY = 0.1      # seconds, latency estimate before a command has been measured
+ADAPTIVE_SMOOTHING = 0.2            # exponential moving average weight given to each new sample
+
 local_commands = {
     new_command.name: new_command for new_command in NEW_COMMANDS
 }
@@ -104,6 +134,346 @@ class CommandNameGenerator():
 
         return self.__next__()
 
+    def is_cycle_start(self, command_name:str) -> bool:
+        """True when command_name, just returned by __next__(), is the first command of a cycle."""
+        return bool(self.cycle_names) and command_name == self.cycle_names[0]
+
+    def record_response(self, command_name:str, latency:float, obd_response_value):
+        """Feedback from the logger after each command.  Not used by fixed schedules."""
+        return
+
+
+class AdaptiveCommandNameGenerator(CommandNameGenerator):
+    """
+    Iterator for providing a never ending list of OBD commands where each command's polling rate
+    adapts to how fast its value changes and how long the vehicle takes to answer.
+
+    After the startup commands run, commands from the cycle and housekeeping lists are scheduled
+    in cycles.  Each command has a target polling period somewhere between ADAPTIVE_MIN_PERIOD
+    (volatile commands like RPM and SPEED) and ADAPTIVE_MAX_PERIOD (slow commands like FUEL_LEVEL).
+    Each cycle contains the commands that are due, most overdue first, until the estimated query
+    time for the cycle reaches cycle_budget seconds.
+
+    The logger must call record_response() after each command so that latency and volatility
+    can be tracked.  Commands skip_list (a SkipList) currently skips are left out of cycles so
+    that they don't take up the cycle budget.
+    """
+    def __init__(
+        self,
+        settings_file: str,
+        cycle_budget:float=ADAPTIVE_CYCLE_BUDGET,
+        min_period:float=ADAPTIVE_MIN_PERIOD,
+        max_period:float=ADAPTIVE_MAX_PERIOD,
+        skip_list=None,
+    ):
+        """Init function."""
+        self.cycle_budget = cycle_budget
+        self.skip_list = skip_list
+        self.min_period = min_period
+        self.max_period = max_period
+        self.latency = {}
+        self.volatility = {}
+        self.last_value = {}
+        self.last_polled = {}
+        self.scheduled = []
+        self.cycle_start = False
+        super().__init__(settings_file)
+
+    def load_names(self):
+        """Load three sets of OBD command names and initialize per command statistics."""
+        super().load_names()
+
+        # cycle commands start out hot, housekeeping only commands start out cold
+        for command_name in self.housekeeping_names:
+            self.volatility[command_name] = 0.0
+        for command_name in self.cycle_names:
+            self.volatility[command_name] = ADAPTIVE_HOT_VOLATILITY
+
+        self.scheduled = []
+
+    def period(self, command_name:str) -> float:
+        """Target polling period in seconds for command_name."""
+        volatility = self.volatility.get(command_name, ADAPTIVE_HOT_VOLATILITY)
+        if volatility <= 0.0:
+            return self.max_period
+        return min(
+            self.max_period,
+            max(self.min_period, self.min_period * ADAPTIVE_HOT_VOLATILITY / volatility)
+        )
+
+    def urgency(self, command_name:str, now:float) -> float:
+        """How overdue command_name is as a multiple of its target period.  Never polled is most urgent."""
+        if command_name not in self.last_polled:
+            return float('inf')
+        return (now - self.last_polled[command_name]) / self.period(command_name)
+
+    def schedule_cycle(self) -> list:
+        """Select the commands for the next cycle within the cycle budget."""
+        now = monotonic()
+        command_names = [
+            command_name for command_name in self.volatility
+            if not (self.skip_list and self.skip_list.is_skipped(command_name))
+        ]
+        ranked = sorted(
+            # everything skipped, leave it to the logger's skip list checks
+            command_names or self.volatility,
+            key=lambda command_name: self.urgency(command_name, now),
+            reverse=True
+        )
+
+        cycle = []
+        estimated_time = 0.0
+        for command_name in ranked:
+            if cycle and (
+                self.urgency(command_name, now) < 1.0 or
+                estimated_time >= self.cycle_budget
+            ):
+                break
+            cycle.append(command_name)
+            estimated_time += self.latency.get(command_name, ADAPTIVE_DEFAULT_LATENCY)
+
+        logging.debug(f"schedule_cycle(): {len(cycle)} commands, estimated time {estimated_time:.3f} seconds")
+
+        return cycle
+
+    def __next__(self):
+        """Get the next iterable."""
+        self.cycle_start = False
+
+        if self.startup:
+            try:
+                command_name = self.startup.__next__()
+                self.last_polled[command_name] = monotonic()
+                return command_name
+            except StopIteration:
+                self.startup = None
+
+        if not self.scheduled:
+            self.scheduled = self.schedule_cycle()
+            self.full_cycles_count += 1
+            self.cycle_start = True
+
+        command_name = self.scheduled.pop(0)
+        self.last_polled[command_name] = monotonic()
+
+        return command_name
+
+    def is_cycle_start(self, command_name:str) -> bool:
+        """True when command_name, just returned by __next__(), is the first command of a scheduled cycle."""
+        return self.cycle_start
+
+    def record_response(self, command_name:str, latency:float, obd_response_value):
+        """Update latency and value volatility estimates for command_name."""
+        self.latency[command_name] = (
+            ADAPTIVE_SMOOTHING * latency +
+            (1.0 - ADAPTIVE_SMOOTHING) * self.latency.get(command_name, latency)
+        )
+
+        value = response_value_to_float(obd_response_value)
+        if value is None and obd_response_value in (None, "no response"):
+            # nothing learned about how the value changes
+            return
+
+        last_value = self.last_value.get(command_name)
+        self.last_value[command_name] = value if value is not None else obd_response_value
+
+        if last_value is None:
+            return
+
+        if value is not None and isinstance(last_value, float):
+            change = abs(value - last_value) / max(abs(last_value), abs(value), 1e-9)
+        else:
+            change = 0.0 if obd_response_value == last_value else 1.0
+
+        self.volatility[command_name] = (
+            ADAPTIVE_SMOOTHING * change +
+            (1.0 - ADAPTIVE_SMOOTHING) * self.volatility.get(command_name, change)
+        )
+
+
+def response_value_to_float(obd_response_value):
+    """Return the numeric part of a cleaned OBD response value (e.g. "35 kph") or None."""
+    if isinstance(obd_response_value, bool):
+        return float(obd_response_value)
+    if isinstance(obd_response_value, (int, float)):
+        return float(obd_response_value)
+    if isinstance(obd_response_value, str) and obd_response_value:
+        try:
+            return float(obd_response_value.split(maxsplit=1)[0])
+        except ValueError:
+            return None
+    return None
+
+
+def get_command_mode_pid(command_name:str):
+    """Return (mode, pid) integers for a python-obd or custom command name or None."""
+    command = get_obd_command(command_name)
+    if command is None:
+        return None
+
+    try:
+        return int(command.command[:2], 16), int(command.command[2:4], 16)
+    except ValueError:
+        # ELM327 AT commands and the like
+        return None
+
+def supported_pids_bitmap_to_set(mode:int, base_pid:int, obd_response) -> set:
+    """
+    Convert a supported PIDs bitmap response into a set of supported (mode, pid) pairs.
+    Bitmaps from every responding ECU are combined.
+    """
+    supported = set()
+    for message in obd_response.messages:
+        data = message.data[2:6]
+        for bit in range(8 * len(data)):
+            if data[bit // 8] & (0x80 >> (bit % 8)):
+                supported.add((mode, base_pid + 1 + bit))
+    return supported
+
+def get_supported_pids(connection:obd.OBD) -> tuple:
+    """
+    Query the supported PID bitmap commands (PIDS_A through PIDS_G and PIDS_9A).
+    Returns (supported, known) sets of (mode, pid) pairs where known holds every
+    pair covered by a bitmap that the vehicle answered.
+    """
+    supported = set()
+    known = set()
+
+    for mode, command_names in SUPPORTED_PIDS_COMMAND_NAMES.items():
+        for index, command_name in enumerate(command_names):
+            base_pid = 0x20 * index
+            if index > 0 and (mode, base_pid) not in supported:
+                # previous bitmap says this bitmap (and the ones after it) aren't supported
+                known.update((mode, base_pid + pid) for pid in range(1, 0x20 * (len(command_names) - index) + 1))
+                break
+
+            obd_response = execute_obd_command(connection, command_name)
+            if not obd_response or obd_response.is_null() or not obd_response.messages:
+                logging.info(f"get_supported_pids(): no response to {command_name}")
+                break
+
+            supported |= supported_pids_bitmap_to_set(mode, base_pid, obd_response)
+            known.update((mode, base_pid + pid) for pid in range(1, 0x21))
+
+    return supported, known
+
+def get_skip_list_file_path(vin:str, base_path=BASE_PATH) -> Path:
+    """Return path to the per VIN skip list cache file."""
+    return Path(f"{base_path}/{HOST_ID}/.{vin}-skip_list.json")
+
+class SkipList():
+    """
+    Per VIN list of OBD commands not worth sending to the vehicle.
+
+    Commands are skipped when the vehicle's supported PID bitmaps say they aren't supported
+    or after NULL_RESPONSE_LIMIT consecutive null ("no response") answers.  Commands skipped
+    for null answers are retried every SKIP_RETRY_INTERVAL seconds and come off the list
+    when they answer.  The list is cached in a hidden file next to the data files so that it
+    is available even when the bitmap commands don't answer.
+    """
+    def __init__(
+        self,
+        vin:str,
+        base_path=BASE_PATH,
+        null_response_limit:int=NULL_RESPONSE_LIMIT,
+        retry_interval:float=SKIP_RETRY_INTERVAL,
+    ):
+        """Init function."""
+        self.vin = vin
+        self.path = get_skip_list_file_path(vin, base_path=base_path)
+        self.null_response_limit = null_response_limit
+        self.retry_interval = retry_interval
+        self.unsupported = set()
+        self.no_response = {}
+        self.null_response_count = {}
+        self.load()
+
+    def load(self):
+        """Load cached skip list."""
+        if not self.path.is_file():
+            return
+
+        try:
+            with open(self.path, "r", encoding='utf-8') as skip_list_file:
+                cache = json.load(skip_list_file)
+        except (OSError, json.decoder.JSONDecodeError) as e:
+            logging.error(f"SkipList.load(): unable to read {self.path}: {e}")
+            return
+
+        now = monotonic()
+        self.unsupported = set(cache.get('unsupported', []))
+        self.no_response = {command_name: now for command_name in cache.get('no_response', [])}
+        logging.info(f"SkipList.load(): {len(self.unsupported)} unsupported, {len(self.no_response)} no response")
+
+    def save(self):
+        """Save skip list cache."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding='utf-8') as skip_list_file:
+            json.dump({
+                'vin': self.vin,
+                'unsupported': sorted(self.unsupported),
+                'no_response': sorted(self.no_response),
+            }, skip_list_file, indent=4)
+
+    def update_from_bitmaps(self, connection:obd.OBD, command_names:list):
+        """Mark command_names the vehicle's supported PID bitmaps say are unsupported."""
+        supported, known = get_supported_pids(connection)
+
+        if not known:
+            logging.info("SkipList.update_from_bitmaps(): no bitmaps, using cached skip list")
+            return
+
+        self.unsupported = set()
+        for command_name in command_names:
+            mode_pid = get_command_mode_pid(command_name)
+            if mode_pid in known and mode_pid not in supported:
+                self.unsupported.add(command_name)
+
+        logging.info(f"SkipList.update_from_bitmaps(): unsupported {sorted(self.unsupported)}")
+        self.save()
+
+    def is_skipped(self, command_name:str) -> bool:
+        """Return True when command_name is skipped now.  Unlike skip(), never starts a retry."""
+        if command_name in self.unsupported:
+            return True
+
+        return (
+            command_name in self.no_response and
+            monotonic() - self.no_response[command_name] < self.retry_interval
+        )
+
+    def skip(self, command_name:str) -> bool:
+        """Return True when command_name shouldn't be sent to the vehicle now."""
+        if self.is_skipped(command_name):
+            return True
+
+        if command_name in self.no_response:
+            # time to retry, restart the clock in case it still doesn't answer
+            self.no_response[command_name] = monotonic()
+            self.null_response_count[command_name] = self.null_response_limit - 1
+
+        return False
+
+    def record_response(self, command_name:str, obd_response_value):
+        """Learn from each cleaned OBD response value."""
+        if obd_response_value is not None and obd_response_value != "no response":
+            self.null_response_count[command_name] = 0
+            if command_name in self.no_response:
+                logging.info(f"SkipList.record_response(): {command_name} answered, no longer skipped")
+                del self.no_response[command_name]
+                self.save()
+            return
+
+        self.null_response_count[command_name] = self.null_response_count.get(command_name, 0) + 1
+
+        if (
+            self.null_response_count[command_name] >= self.null_response_limit and
+            command_name not in self.no_response
+        ):
+            logging.info(f"SkipList.record_response(): {command_name} skipped after {self.null_response_count[command_name]} null responses")
+            self.no_response[command_name] = monotonic()
+            self.save()
+
 
 def get_vin_from_vehicle(connection):
     """Get Vehicle Information Number (VIN) from vehicle."""
@@ -166,6 +536,82 @@ def list_cleaner(command_name:str, items:list)->list:
             return_value.append(item)
     return return_value
 
+# One pass over each raw message instead of one pass per error message
+OBD_ERROR_MESSAGE_PATTERN = re.compile("|".join(re.escape(m) for m in OBD_ERROR_MESSAGES))
+
+def get_obd_error_message(obd_response):
+    """Return the first OBD_ERROR_MESSAGES key found in the raw response messages or None."""
+    for message in obd_response.messages:
+        match = OBD_ERROR_MESSAGE_PATTERN.search(message.raw())
+        if match:
+            return match.group(0)
+    return None
+
+def serialize_bytearray(command_name:str, value):
+    return value.decode("utf-8")
+
+def serialize_bit_array(command_name:str, value):
+    return list(value)
+
+def serialize_status(command_name:str, value):
+    return [
+        str(value.__dict__[base_test])
+        for base_test in BASE_TESTS
+    ]
+
+# pint units container to pint formatted units string
+unit_strings = {}
+
+def get_unit_string(value) -> str:
+    """Return the pint formatted units of a pint Quantity, formatting each distinct unit only once."""
+    try:
+        return unit_strings[value._units]
+    except KeyError:
+        unit_string = unit_strings[value._units] = str(value.units)
+        return unit_string
+
+def serialize_quantity(command_name:str, value):
+    """pint Quantity object serialized the same way as str(value) does."""
+    return f"{value.magnitude} {get_unit_string(value)}"
+
+def serialize_tuple(command_name:str, value):
+    return tuple_to_list_converter(value)
+
+def serialize_unchanged(command_name:str, value):
+    return value
+
+# value type to serializer function, filled in as new types show up
+value_serializers = {}
+
+def get_value_serializer(value_type:type):
+    """
+    Return the serializer function for OBD response values of value_type.
+    The (slow) type tests run once per type, after that it is a dictionary lookup.
+    """
+    try:
+        return value_serializers[value_type]
+    except KeyError:
+        pass
+
+    if issubclass(value_type, bytearray):
+        serializer = serialize_bytearray
+    elif issubclass(value_type, BitArray):
+        serializer = serialize_bit_array
+    elif issubclass(value_type, Status):
+        serializer = serialize_status
+    elif issubclass(value_type, ureg.Quantity) or 'Quantity' in value_type.__name__:
+        # python-obd and telemetry_obd.add_commands each have their own pint unit registry
+        serializer = serialize_quantity
+    elif issubclass(value_type, list):
+        serializer = list_cleaner
+    elif issubclass(value_type, tuple):
+        serializer = serialize_tuple
+    else:
+        serializer = serialize_unchanged
+
+    value_serializers[value_type] = serializer
+    return serializer
+
 def clean_obd_query_response(command_name:str, obd_response):
     """
     fixes problems in OBD connection.query responses.
@@ -186,35 +632,31 @@ def clean_obd_query_response(command_name:str, obd_response):
         logging.debug(f"command_name {command_name}: obd_response.is_null or obd_response.value is None")
         return "no response"
 
-    for message in obd_response.messages:
-        for obd_error_message, obd_error_description in OBD_ERROR_MESSAGES.items():
-            raw_message = message.raw()
-            if obd_error_message in raw_message:
-                logging.error(f"command_name: {command_name}: OBD adapter message error: \"{obd_error_message}\": {obd_error_description}")
-                return "no response"
-
-    if isinstance(obd_response.value, bytearray):
-        return obd_response.value.decode("utf-8")
-
-    if isinstance(obd_response.value, BitArray):
-        return list(obd_response.value)
-
-    if isinstance(obd_response.value, Status):
-        return [
-            str(obd_response.value.__dict__[base_test])
-            for base_test in BASE_TESTS
-        ]
-
-    if isinstance(obd_response.value, ureg.Quantity) or 'Quantity' in obd_response.value.__class__.__name__:
-        return str(obd_response.value)
+    obd_error_message = get_obd_error_message(obd_response)
+    if obd_error_message:
+        logging.error(f"command_name: {command_name}: OBD adapter message error: \"{obd_error_message}\": {OBD_ERROR_MESSAGES[obd_error_message]}")
+        return "no response"
 
-    if isinstance(obd_response.value, list):
-        return list_cleaner(command_name, obd_response.value)
+    value = obd_response.value
+    return get_value_serializer(type(value))(command_name, value)
 
-    if isinstance(obd_response.value, tuple):
-        return tuple_to_list_converter(obd_response.value)
+def compact_obd_query_response(command_name:str, obd_response) -> tuple:
+    """
+    clean_obd_query_response() for compact output records.
+    Returns (value, units) where pint Quantity values are split into a plain number and
+    a units string, e.g. (35, 'kilometer_per_hour') instead of '35 kilometer_per_hour'.
+    units is None for everything else.
+    """
+    if (
+        obd_response and
+        obd_response.value is not None and
+        get_value_serializer(type(obd_response.value)) is serialize_quantity and
+        not obd_response.is_null() and
+        not get_obd_error_message(obd_response)
+    ):
+        return obd_response.value.magnitude, get_unit_string(obd_response.value)
 
-    return obd_response.value
+    return clean_obd_query_response(command_name, obd_response), None
 
 def get_obd_connection(fast:bool, timeout:float)->obd.OBD:
     """
@@ -266,20 +708,148 @@ def recover_lost_connection(connection:obd.OBD, fast:bool, timeout:float)->obd.O
 
     return connection
 
+def get_obd_command(command_name:str):
+    """return python-obd or custom OBDCommand given command_name or None"""
+    if obd.commands.has_name(command_name):
+        return obd.commands[command_name]
+
+    if command_name in local_commands:
+        return local_commands[command_name]
+
+    return None
+
 def execute_obd_command(connection:obd.OBD, command_name:str):
     """
     executes OBD interface query given command_name on OBD connection.
     returns list or value
     """
-    if obd.commands.has_name(command_name):
-        obd_response = connection.query(obd.commands[command_name], force=True)
+    command = get_obd_command(command_name)
 
-    elif command_name in local_commands:
-        obd_response = connection.query(local_commands[command_name], force=True)
-    else:
+    if command is None:
         # raise LookupError(f"command <{command_name}> missing from python-obd and custom commands")
         logging.warn(f"LookupError: config file has command name <{command_name}> that doesn't exist")
         return None
 
-    return obd_response
+    return connection.query(command, force=True)
+
+def is_can_protocol(connection:obd.OBD) -> bool:
+    """True when the vehicle uses an ISO 15765-4 CAN protocol supporting multiple PID requests."""
+    return connection.protocol_id() in CAN_PROTOCOL_IDS
+
+def is_multi_pid_command(command_name:str) -> bool:
+    """True when command_name can be part of a multiple PID mode 01 request."""
+    command = get_obd_command(command_name)
+
+    return (
+        command is not None and
+        command.mode == 1 and
+        len(command.command) == 4 and
+        command.bytes > 2 and
+        # supported PID bitmaps stay single
+        command.pid % 0x20 != 0
+    )
+
+def command_name_batches(command_names, batchable, batch_size:int=MULTI_PID_BATCH_SIZE):
+    """
+    Group consecutive command names from command_names (e.g. a CommandNameGenerator)
+    for which batchable(command_name) is True into lists of up to batch_size names.
+    Every other command name comes out as a single item list.
+    """
+    batch = []
+    batch_pids = set()
+
+    for command_name in command_names:
+        if not batchable(command_name):
+            if batch:
+                yield batch
+                batch, batch_pids = [], set()
+            yield [command_name]
+            continue
+
+        pid = get_obd_command(command_name).pid
+        if pid in batch_pids:
+            # a PID can only appear once per request
+            yield batch
+            batch, batch_pids = [], set()
+
+        batch.append(command_name)
+        batch_pids.add(pid)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch, batch_pids = [], set()
+
+    if batch:
+        yield batch
+
+def split_multi_pid_messages(commands:list, messages:list) -> dict:
+    """
+    Split multiple PID mode 01 response messages into per PID messages.
+    Response data looks like 41 <PID> <data bytes> <PID> <data bytes> ...
+    Returns a dictionary with PID keys and lists of messages (one per responding ECU) values.
+    """
+    commands_by_pid = {command.pid: command for command in commands}
+    split_messages = {pid: [] for pid in commands_by_pid}
+
+    for message in messages:
+        data = message.data
+        if len(data) < 2 or data[0] != 0x41:
+            continue
+
+        index = 1
+        while index < len(data):
+            pid = data[index]
+            if pid not in commands_by_pid:
+                # without a known PID, the data length of what follows is unknown
+                logging.debug(f"split_multi_pid_messages(): unexpected PID {pid:02X} in {message.hex()}")
+                break
+
+            length = commands_by_pid[pid].bytes - 2
+            pid_message = Message(message.frames)
+            pid_message.ecu = message.ecu
+            pid_message.data = bytearray([0x41, pid]) + data[index + 1:index + 1 + length]
+            split_messages[pid].append(pid_message)
+            index += 1 + length
+
+    return split_messages
+
+def execute_obd_commands(connection:obd.OBD, command_names:list) -> list:
+    """
+    executes one or more OBD interface queries on OBD connection.
+    Multiple command names are sent as one multiple PID mode 01 request and the
+    response is split back into one response per command.
+    returns list of (command_name, obd_response) tuples
+    """
+    if len(command_names) == 1:
+        return [(command_names[0], execute_obd_command(connection, command_names[0]))]
+
+    commands = [get_obd_command(command_name) for command_name in command_names]
+    multi_pid_command = OBDCommand(
+        "MULTI_PID",
+        "Multiple PID request " + " ".join(command_names),
+        b"01" + b"".join(command.command[2:4] for command in commands),
+        0,
+        drop,
+        ECU.ALL,
+        False
+    )
+
+    multi_pid_response = connection.query(multi_pid_command, force=True)
+
+    if not multi_pid_response.messages:
+        logging.info(f"execute_obd_commands(): no response to {multi_pid_command.command}, querying individually")
+        return [
+            (command_name, execute_obd_command(connection, command_name))
+            for command_name in command_names
+        ]
+
+    split_messages = split_multi_pid_messages(commands, multi_pid_response.messages)
+
+    return [
+        (
+            command_name,
+            command(split_messages[command.pid]) if split_messages[command.pid] else OBDResponse(command, [])
+        )
+        for command_name, command in zip(command_names, commands)
+    ]
 
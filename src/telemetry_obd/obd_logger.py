@@ -3,14 +3,12 @@
 telemetry_obd/obd_logger.py: Onboard Diagnostic Data Logger.
 """
 from sys import stdout, stderr
-from os import fsync
 from time import sleep
 from datetime import datetime, timezone
 from pathlib import Path
 from argparse import ArgumentParser
 from pint import OffsetUnitCalculusError
 import sys
-import json
 import logging
 from traceback import print_exc
 import obd
@@ -22,15 +20,40 @@ from tcounter.common import (
     get_next_application_counter_value,
     BASE_PATH,
 )
+from .obd_metrics import (
+    CommandMetrics,
+    get_metrics_file_path,
+    get_error_class,
+    METRICS_INTERVAL,
+)
+from tcounter.log_writer import (
+    DurableLogWriter,
+    exit_on_sigterm,
+    DEFAULT_COMMIT_RECORDS,
+    DEFAULT_COMMIT_INTERVAL,
+)
+from tcounter.binary_log import (
+    BinaryRecordEncoder,
+    json_lines_encoder,
+    BINARY_LOG_FILE_SUFFIX,
+    JSON_LOG_FILE_SUFFIX,
+)
 
 from .obd_common_functions import (
     get_vin_from_vehicle,
     get_elm_info,
     CommandNameGenerator,
+    AdaptiveCommandNameGenerator,
+    ADAPTIVE_CYCLE_BUDGET,
+    SkipList,
     clean_obd_query_response,
+    compact_obd_query_response,
     get_obd_connection,
     recover_lost_connection,
-    execute_obd_command,
+    execute_obd_commands,
+    command_name_batches,
+    is_can_protocol,
+    is_multi_pid_command,
 )
 
 logger = logging.getLogger("obd_logger")
@@ -107,6 +130,84 @@ def argument_parsing()-> dict:
         type=float,
     )
 
+    parser.add_argument(
+        "--adaptive",
+        help="Poll each command at a rate adapted to how fast its value changes " +
+        "instead of running the fixed cycle and housekeeping lists.  Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--cycle_budget",
+        help=(
+            "With --adaptive, the target number of seconds of OBD query time per scheduled cycle." +
+            f"  Default is {ADAPTIVE_CYCLE_BUDGET} seconds."
+        ),
+        default=ADAPTIVE_CYCLE_BUDGET,
+        type=float,
+    )
+
+    parser.add_argument(
+        "--multi_pid",
+        help="On CAN vehicles, request up to 6 cycle commands at a time with multiple PID requests.  Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--no_skip_list",
+        help="Send every command to the vehicle, even those the vehicle's supported PID bitmaps " +
+        "say are unsupported or that keep coming back with no response.  Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--compact_values",
+        help="Save values with units as a plain number in 'obd_response_value' and the units in 'obd_response_units' " +
+        "(e.g. 35 and \"kilometer_per_hour\") instead of a single string (\"35 kilometer_per_hour\").  Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--binary",
+        help="Write compact binary (.vtsb) output files instead of JSON lines (.json) output files.  Default is off.",
+        default=False,
+        action='store_true'
+    )
+
+    parser.add_argument(
+        "--metrics_interval",
+        help=(
+            "Seconds between updates to the command latency and error metrics file saved next to " +
+            f"the output file as '<output file>.metrics'.  0 turns metrics off.  Default is {METRICS_INTERVAL}."
+        ),
+        default=METRICS_INTERVAL,
+        type=float,
+    )
+
+    parser.add_argument(
+        "--commit_records",
+        help=(
+            "Maximum number of records buffered before being committed (fsync) to disk." +
+            f"  Default is {DEFAULT_COMMIT_RECORDS}."
+        ),
+        default=DEFAULT_COMMIT_RECORDS,
+        type=int,
+    )
+
+    parser.add_argument(
+        "--commit_interval",
+        help=(
+            "Maximum number of seconds a record waits before being committed (fsync) to disk." +
+            f"  0 commits every record.  Default is {DEFAULT_COMMIT_INTERVAL}."
+        ),
+        default=DEFAULT_COMMIT_INTERVAL,
+        type=float,
+    )
+
     parser.add_argument(
         "--verbose",
         help="Turn verbose output on. Default is off.",
@@ -123,6 +224,29 @@ def argument_parsing()-> dict:
 
     return vars(parser.parse_args())
 
+def command_name_filter(command_names, skip_list, start_cycle_delay:float):
+    """
+    Yield the command names worth sending to the vehicle from command_names
+    (a CommandNameGenerator), delaying before each cycle's first command.
+    """
+    for command_name in command_names:
+        if command_names.is_cycle_start(command_name):
+            # insert delay here
+            if start_cycle_delay > 0:
+                sleep(start_cycle_delay)
+
+        logging.info(f"command_name: {command_name}")
+
+        if '-' in command_name:
+            logging.error(f"skipping malformed command_name: {command_name}")
+            continue
+
+        if skip_list and skip_list.skip(command_name):
+            logging.debug(f"skipping unsupported command_name: {command_name}")
+            continue
+
+        yield command_name
+
 def main():
     """
     Run main function.
@@ -140,6 +264,15 @@ def main():
     debug = args['logging']
     full_cycles = args['full_cycles']
     start_cycle_delay = args['start_cycle_delay']
+    adaptive = args['adaptive']
+    cycle_budget = args['cycle_budget']
+    multi_pid = args['multi_pid']
+    no_skip_list = args['no_skip_list']
+    metrics_interval = args['metrics_interval']
+    compact_values = args['compact_values']
+    binary = args['binary']
+    commit_records = args['commit_records']
+    commit_interval = args['commit_interval']
 
     logging_level = logging.WARNING
 
@@ -151,6 +284,7 @@ def main():
 
     logging.basicConfig(stream=sys.stdout, level=logging_level)
     obd.logger.setLevel(logging_level)
+    exit_on_sigterm()
 
     logging.info(f"argument --fast: {fast}")
     logging.info(f"argument --timeout: {timeout}")
@@ -158,6 +292,15 @@ def main():
     logging.info(f"argument --full_cycles: {full_cycles}")
     logging.info(f"argument --logging: {args['logging']} ")
     logging.info(f"argument --start_cycle_delay: {start_cycle_delay}")
+    logging.info(f"argument --adaptive: {adaptive}")
+    logging.info(f"argument --cycle_budget: {cycle_budget}")
+    logging.info(f"argument --multi_pid: {multi_pid}")
+    logging.info(f"argument --no_skip_list: {no_skip_list}")
+    logging.info(f"argument --metrics_interval: {metrics_interval}")
+    logging.info(f"argument --compact_values: {compact_values}")
+    logging.info(f"argument --binary: {binary}")
+    logging.info(f"argument --commit_records: {commit_records}")
+    logging.info(f"argument --commit_interval: {commit_interval}")
     logging.debug("debug logging enabled")
 
     # OBD(portstr=None, baudrate=None, protocol=None, fast=True, timeout=0.1, check_voltage=True)
@@ -178,80 +321,140 @@ def main():
     else:
         config_path = get_config_file_path(vin)
 
-    command_name_generator = CommandNameGenerator(config_path)
+    skip_list = None
+    if not no_skip_list:
+        skip_list = SkipList(vin, base_path=BASE_PATH)
+
+    if adaptive:
+        command_name_generator = AdaptiveCommandNameGenerator(config_path, cycle_budget=cycle_budget, skip_list=skip_list)
+    else:
+        command_name_generator = CommandNameGenerator(config_path)
+
+    if skip_list:
+        skip_list.update_from_bitmaps(
+            connection,
+            command_name_generator.startup_names +
+            command_name_generator.cycle_names +
+            command_name_generator.housekeeping_names
+        )
+
+    if multi_pid and not is_can_protocol(connection):
+        logging.info(f"--multi_pid ignored, protocol {connection.protocol_name()} isn't ISO 15765-4 CAN")
+        multi_pid = False
 
     first_command_name = command_name_generator.cycle_names[0]
     last_command_name = command_name_generator.cycle_names[-1]
     logging.info(f"first_command_name: {first_command_name}")
     logging.info(f"last_command_name: {last_command_name}")
 
+    cycle_names = set(command_name_generator.cycle_names)
+    command_name_batch_generator = command_name_batches(
+        command_name_filter(command_name_generator, skip_list, start_cycle_delay),
+        lambda command_name: multi_pid and command_name in cycle_names and is_multi_pid_command(command_name)
+    )
+
     while command_name_generator:
-        output_file_path = get_output_file_name('obd', vin=vin)
+        output_file_path = get_output_file_name(
+            'obd', vin=vin,
+            file_suffix=BINARY_LOG_FILE_SUFFIX if binary else JSON_LOG_FILE_SUFFIX
+        )
         logging.info(f"output file: {output_file_path}")
 
         try:
             # x - open for exclusive creation, failing if the file already exists
-            with open(output_file_path, mode='x', encoding='utf-8') as out_file:
+            with DurableLogWriter(
+                open(output_file_path, mode='xb') if binary else open(output_file_path, mode='x', encoding='utf-8'),
+                commit_records=commit_records,
+                commit_interval=commit_interval,
+                encoder=BinaryRecordEncoder() if binary else json_lines_encoder,
+                repair_application_id='obd',
+            ) as out_file:
 
-                for command_name in command_name_generator:
-                    if first_command_name == command_name:
-                        # insert delay here
-                        if start_cycle_delay > 0:
-                            sleep(start_cycle_delay)
+                metrics = None
+                if metrics_interval > 0:
+                    metrics = CommandMetrics(get_metrics_file_path(output_file_path), interval=metrics_interval)
 
-                    logging.info(f"command_name: {command_name}")
+                for command_names in command_name_batch_generator:
+                    logging.info(f"command_names: {command_names}")
 
-                    if '-' in command_name:
-                        logging.error(f"skipping malformed command_name: {command_name}")
-                        continue
+                    ts_pre = datetime.now(tz=timezone.utc)
+                    iso_ts_pre = datetime.isoformat(ts_pre)
 
-                    iso_ts_pre = datetime.isoformat(
-                        datetime.now(tz=timezone.utc)
-                    )
+                    obd_responses = [(command_name, None) for command_name in command_names]
+                    exception_name = None
 
                     try:
 
-                        obd_response = execute_obd_command(connection, command_name)
+                        obd_responses = execute_obd_commands(connection, command_names)
 
                     except OffsetUnitCalculusError as e:
                         logging.exception(f"Exception: {e.__class__.__name__}: {e}")
-                        logging.exception(f"OffsetUnitCalculusError on {command_name}, decoder must be fixed")
+                        logging.exception(f"OffsetUnitCalculusError on {command_names}, decoder must be fixed")
                         print_exc()
+                        exception_name = e.__class__.__name__
 
                     except Exception as e:
                         logging.exception(f"Exception: {e}")
                         print_exc()
+                        exception_name = e.__class__.__name__
                         if not connection.is_connected():
-                            logging.info(f"connection failure on {command_name}, reconnecting")
+                            logging.info(f"connection failure on {command_names}, reconnecting")
                             connection.close()
                             connection = get_obd_connection(fast=fast, timeout=timeout)
 
-                    iso_ts_post = datetime.isoformat(
-                        datetime.now(tz=timezone.utc)
-                    )
+                    ts_post = datetime.now(tz=timezone.utc)
+                    iso_ts_post = datetime.isoformat(ts_post)
+
+                    latency = (ts_post - ts_pre).total_seconds()
+
+                    for command_name, obd_response in obd_responses:
+                        if compact_values:
+                            obd_response_value, obd_response_units = compact_obd_query_response(command_name, obd_response)
+                        else:
+                            obd_response_value, obd_response_units = clean_obd_query_response(command_name, obd_response), None
 
-                    obd_response_value = clean_obd_query_response(command_name, obd_response)
+                        command_name_generator.record_response(
+                            command_name,
+                            latency / len(obd_responses),
+                            obd_response_value
+                        )
 
-                    logging.info(f"saving: {command_name}, {obd_response_value}, {iso_ts_pre}, {iso_ts_post}")
+                        if metrics:
+                            metrics.record(
+                                command_name,
+                                latency / len(obd_responses),
+                                get_error_class(obd_response, obd_response_value, latency, timeout, exception_name)
+                            )
 
-                    out_file.write(json.dumps({
-                                'command_name': command_name,
-                                'obd_response_value': obd_response_value,
-                                'iso_ts_pre': iso_ts_pre,
-                                'iso_ts_post': iso_ts_post,
-                            }) + "\n"
-                    )
-                    out_file.flush()
-                    fsync(out_file.fileno())
+                        if skip_list:
+                            skip_list.record_response(command_name, obd_response_value)
+
+                        logging.info(f"saving: {command_name}, {obd_response_value}, {iso_ts_pre}, {iso_ts_post}")
+
+                        record = {
+                            'command_name': command_name,
+                            'obd_response_value': obd_response_value,
+                            'iso_ts_pre': iso_ts_pre,
+                            'iso_ts_post': iso_ts_post,
+                        }
+                        if obd_response_units:
+                            record['obd_response_units'] = obd_response_units
+
+                        out_file.write_record(record)
 
                     if not connection.is_connected():
-                        logging.error(f"connection lost, retrying after {command_name}")
+                        logging.error(f"connection lost, retrying after {command_names}")
                         connection = recover_lost_connection(connection, fast=fast, timeout=timeout)
 
+                    if metrics:
+                        metrics.save_if_due(command_name_generator.full_cycles_count)
+
                     if (
                         command_name_generator.full_cycles_count >
                         full_cycles
                     ):
+                        if metrics:
+                            metrics.save(command_name_generator.full_cycles_count)
                         command_name_generator.full_cycles_count = 0
                         break
 
@@ -0,0 +1,137 @@
+# telemetry_obd/obd_metrics.py: OBD command latency and error metrics.
+"""
+telemetry_obd/obd_metrics.py: OBD command latency and error metrics.
+
+Tracks round trip time histograms and error counts for each OBD command along with
+cycles per minute.  Metrics are saved to a sidecar file next to the OBD data file,
+e.g. "telemetry2-0000000072-obd-C4HJWCG9DL9999-0000000039.json.metrics",
+which the data file tools ignore because it doesn't end in ".json".
+"""
+import json
+import logging
+from os import replace
+from pathlib import Path
+from time import monotonic
+from datetime import datetime, timezone
+
+from .obd_common_functions import get_obd_error_message
+
+logger = logging.getLogger("obd_logger")
+
+METRICS_FILE_SUFFIX = ".metrics"
+METRICS_INTERVAL = 60.0             # seconds between metrics file updates
+
+# histogram bucket upper bounds in seconds, the last bucket holds everything slower
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, ]
+
+# error classes other than OBD_ERROR_MESSAGES keys and exception class names
+OK = "ok"
+NO_RESPONSE = "no response"
+TIMEOUT = "timeout"
+UNKNOWN_COMMAND = "unknown command"
+
+def get_metrics_file_path(output_file_path) -> Path:
+    """Return the metrics sidecar file path for an OBD data file."""
+    output_file_path = Path(output_file_path)
+    return output_file_path.with_name(output_file_path.name + METRICS_FILE_SUFFIX)
+
+def get_error_class(obd_response, obd_response_value, latency:float, timeout:float, exception_name:str=None) -> str:
+    """
+    Classify the outcome of one OBD command as
+    - OK
+    - the exception class name when the query raised an exception
+    - UNKNOWN_COMMAND when the command name isn't known to python-obd or custom commands
+    - the OBD adapter error message, e.g. "NO DATA" or "CAN ERROR"
+    - TIMEOUT when nothing came back after at least timeout seconds
+    - NO_RESPONSE
+    """
+    if exception_name:
+        return exception_name
+
+    if obd_response is None:
+        return UNKNOWN_COMMAND
+
+    if obd_response.messages:
+        obd_error_message = get_obd_error_message(obd_response)
+        if obd_error_message:
+            return obd_error_message
+
+    if obd_response_value is None or obd_response_value == "no response":
+        return TIMEOUT if latency >= timeout else NO_RESPONSE
+
+    return OK
+
+class CommandMetrics():
+    """Per command round trip time histograms, error counts and cycles per minute."""
+
+    def __init__(self, metrics_file_path, interval:float=METRICS_INTERVAL):
+        """Init function."""
+        self.metrics_file_path = Path(metrics_file_path)
+        self.interval = interval
+        self.start = monotonic()
+        self.iso_ts_start = datetime.isoformat(datetime.now(tz=timezone.utc))
+        self.last_save = self.start
+        self.commands = {}
+
+    def record(self, command_name:str, latency:float, error_class:str):
+        """Add one command outcome."""
+        if command_name not in self.commands:
+            self.commands[command_name] = {
+                'count': 0,
+                'latency_total': 0.0,
+                'latency_max': 0.0,
+                'latency_histogram': [0] * (len(LATENCY_BUCKETS) + 1),
+                'errors': {},
+            }
+
+        metrics = self.commands[command_name]
+        metrics['count'] += 1
+        metrics['latency_total'] += latency
+        metrics['latency_max'] = max(metrics['latency_max'], latency)
+
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        metrics['latency_histogram'][bucket] += 1
+
+        if error_class != OK:
+            metrics['errors'][error_class] = metrics['errors'].get(error_class, 0) + 1
+
+    def to_dict(self, full_cycles_count:int) -> dict:
+        """Metrics summary suitable for json.dumps()."""
+        elapsed = monotonic() - self.start
+
+        commands = {}
+        for command_name, metrics in sorted(self.commands.items()):
+            commands[command_name] = {
+                'count': metrics['count'],
+                'latency_mean': metrics['latency_total'] / metrics['count'],
+                'latency_max': metrics['latency_max'],
+                'latency_histogram': metrics['latency_histogram'],
+                'errors': metrics['errors'],
+            }
+
+        return {
+            'iso_ts_start': self.iso_ts_start,
+            'iso_ts_save': datetime.isoformat(datetime.now(tz=timezone.utc)),
+            'elapsed_seconds': elapsed,
+            'full_cycles': full_cycles_count,
+            'cycles_per_minute': (60.0 * full_cycles_count / elapsed) if elapsed > 0 else None,
+            'latency_buckets': LATENCY_BUCKETS,
+            'commands': commands,
+        }
+
+    def save(self, full_cycles_count:int):
+        """Atomically replace the metrics file with the current metrics."""
+        temporary_path = self.metrics_file_path.with_name(self.metrics_file_path.name + ".tmp")
+        with open(temporary_path, "w", encoding='utf-8') as metrics_file:
+            json.dump(self.to_dict(full_cycles_count), metrics_file, indent=4)
+        replace(temporary_path, self.metrics_file_path)
+
+        self.last_save = monotonic()
+        logger.debug(f"CommandMetrics.save(): {self.metrics_file_path}")
+
+    def save_if_due(self, full_cycles_count:int):
+        """Save the metrics file when interval seconds have passed since the last save."""
+        if self.interval > 0 and monotonic() - self.last_save >= self.interval:
+            self.save(full_cycles_count)
@@ -62,6 +62,12 @@ class TrailerConnector(object):
         # message is type bytes, JSON encoded
         # ip_address_info is list [Sender IP Address:str, Sender Port Number int]
         message, ip_address_info = self.trailer_connector.recvfrom(BUFFER_SIZE)
+        return self.decode(message, ip_address_info)
+
+    def decode(self, message:bytes, ip_address_info) -> tuple:
+        """
+        Decode one received message.  Returns tuple which contains both raw and processed data dictionaries.
+        """
         self.message_count += 1
 
         self.logger.debug(f"{self.message_count} address: {ip_address_info}")
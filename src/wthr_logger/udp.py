@@ -57,6 +57,12 @@ class WeatherReports(object):
         # message is type bytes, JSON encoded
         # ip_address_info is list [Sender IP Address:str, Sender Port Number int]
         message, ip_address_info = self.weather_station.recvfrom(BUFFER_SIZE)
+        return self.decode(message, ip_address_info)
+
+    def decode(self, message:bytes, ip_address_info) -> tuple:
+        """
+        Decode one received message.  returns raw_weather_report and weather_report
+        """
         self.message_count += 1
 
         self.logger.debug(f"{self.message_count} address: {ip_address_info}")
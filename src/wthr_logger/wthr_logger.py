@@ -6,17 +6,26 @@ from argparse import ArgumentParser
 import logging
 from sys import stdout, stderr
 from datetime import datetime, timezone
-from os import fsync
 from pathlib import Path
 from datetime import datetime, timezone
-from os import fsync
-import json
 
 from tcounter.common import (
     get_output_file_name,
     get_next_application_counter_value,
     BASE_PATH,
 )
+from tcounter.log_writer import (
+    DurableLogWriter,
+    exit_on_sigterm,
+    DEFAULT_COMMIT_RECORDS,
+    DEFAULT_COMMIT_INTERVAL,
+)
+from tcounter.binary_log import (
+    BinaryRecordEncoder,
+    json_lines_encoder,
+    BINARY_LOG_FILE_SUFFIX,
+    JSON_LOG_FILE_SUFFIX,
+)
 
 from .__init__ import __version__
 from .udp import WeatherReports, WEATHER_REPORT_EXCLUDE_LIST
@@ -39,6 +48,25 @@ def argument_parsing()-> dict:
         default=BASE_PATH,
         help=f"Place log files into this directory - defaults to {BASE_PATH}"
     )
+    parser.add_argument(
+        "--commit_records",
+        default=DEFAULT_COMMIT_RECORDS,
+        type=int,
+        help=f"Maximum number of records buffered before being committed (fsync) to disk. Default is {DEFAULT_COMMIT_RECORDS}."
+    )
+    parser.add_argument(
+        "--commit_interval",
+        default=DEFAULT_COMMIT_INTERVAL,
+        type=float,
+        help=f"Maximum number of seconds a record waits before being committed (fsync) to disk. 0 commits every record. Default is {DEFAULT_COMMIT_INTERVAL}."
+    )
+    parser.add_argument(
+        "--binary",
+        default=False,
+        action='store_true',
+        help="Write compact binary (.vtsb) log files instead of JSON lines (.json) log files. Default is False."
+    )
+
     parser.add_argument(
         "--verbose",
         default=False,
@@ -87,20 +115,24 @@ def get_directory(base_path) -> Path:
     path.mkdir(parents=True, exist_ok=True)
     return path
 
-def get_log_file_handle(base_path:str, base_name="wthr"):
-    """return a file handle opened for writing to a log file"""
-    full_path = get_directory(base_path) / get_output_file_name(base_name, base_path=base_path)
+def get_log_file_handle(base_path:str, base_name="wthr", binary:bool=False):
+    """return a file handle opened for writing to a JSON lines or binary log file"""
+    file_suffix = BINARY_LOG_FILE_SUFFIX if binary else JSON_LOG_FILE_SUFFIX
+    full_path = get_directory(base_path) / get_output_file_name(base_name, base_path=base_path, file_suffix=file_suffix)
 
     logger.info(f"log file full path: {full_path}")
 
     try:
-        log_file_handle = open(full_path, mode='x', encoding='utf-8')
+        if binary:
+            log_file_handle = open(full_path, mode='xb')
+        else:
+            log_file_handle = open(full_path, mode='x', encoding='utf-8')
 
     except FileExistsError:
         logger.error(f"get_log_file_handle(): FileExistsError: {full_path}")
         wthr_counter = get_next_application_counter_value(base_name)
         logger.error(f"get_log_file_handle(): Incremented '{base_name}' counter to {wthr_counter}")
-        return get_log_file_handle(base_path, base_name=base_name)
+        return get_log_file_handle(base_path, base_name=base_name, binary=binary)
 
     return log_file_handle
 
@@ -118,45 +150,56 @@ def main():
     logging_level = logging.DEBUG if verbose else logging.INFO
 
     logging.basicConfig(stream=stderr, level=logging_level)
+    exit_on_sigterm()
 
     logger.debug(f"argument --verbose: {verbose}")
+    logger.info(f"argument --binary: {args['binary']}")
+
+    # reads Weather input
+    weather_reports = WeatherReports(logger)
 
     if log_file_directory:
         logger.info(f"log_file_directory: {log_file_directory}")
-        log_file_handle = get_log_file_handle(log_file_directory)
+        log_file_handle = DurableLogWriter(
+            get_log_file_handle(log_file_directory, binary=args['binary']),
+            commit_records=args['commit_records'],
+            commit_interval=args['commit_interval'],
+            encoder=BinaryRecordEncoder() if args['binary'] else json_lines_encoder,
+            repair_application_id='wthr',
+        )
     else:
         log_file_handle = None
 
-    # reads Weather input
-    weather_reports = WeatherReports(logger)
-
     iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-    for raw_weather_report, weather_report in weather_reports:
-        if not weather_report:
-            # skipping invalid (None value) data
-            continue
+    try:
+        for raw_weather_report, weather_report in weather_reports:
+            if not weather_report:
+                # skipping invalid (None value) data
+                continue
 
-        if weather_report['type'] in WEATHER_REPORT_EXCLUDE_LIST:
-            # skipping unwanted weather report types
-            logger.debug(f"skipping Message_Type {weather_report['type']}")
-            iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
-            continue
+            if weather_report['type'] in WEATHER_REPORT_EXCLUDE_LIST:
+                # skipping unwanted weather report types
+                logger.debug(f"skipping Message_Type {weather_report['type']}")
+                iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
+                continue
 
-        log_value = dict_to_log_format(weather_report)
+            log_value = dict_to_log_format(weather_report)
 
-        log_value['iso_ts_pre'] = iso_ts_pre
-        log_value['iso_ts_post'] = datetime.isoformat(datetime.now(tz=timezone.utc))
+            log_value['iso_ts_pre'] = iso_ts_pre
+            log_value['iso_ts_post'] = datetime.isoformat(datetime.now(tz=timezone.utc))
 
-        logger.debug(f"logging: {log_value}")
+            logger.debug(f"logging: {log_value}")
 
-        if log_file_handle:
-            log_file_handle.write(json.dumps(log_value) + "\n")
-            # want a command line option to disable forced buffer write to disk with default on
-            log_file_handle.flush()
-            fsync(log_file_handle.fileno())
+            if log_file_handle:
+                log_file_handle.write_record(log_value)
 
-        iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
+            iso_ts_pre = datetime.isoformat(datetime.now(tz=timezone.utc))
+
+    finally:
+        # commits waiting records and removes the tail marker
+        if log_file_handle:
+            log_file_handle.close()
 
 if __name__ == "__main__":
     main()